@@ -1,8 +1,18 @@
+import io
+import os
+import json
+import itertools
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
 import warnings
+from tdx_cache import load_tail_bars
+from feature_store import FEATURES, attach_features
+from prefetch import prefetch
+from chart_render import get_pyplot
+from profiling import PROFILER, stage, add_profile_argument, start_profiling, finish_profiling
+from scan_state import load_scan_state, save_scan_state, first_new_index, stock_state
 warnings.filterwarnings('ignore')
 
 # ===================== 自动计算目标月份 =====================
@@ -31,6 +41,7 @@ CONFIG = {
     "目标年份": TARGET_YEAR,    # 自动计算目标年份（当前系统时间减一天）
     "分析周期月数": 1            # 分析最近N个月的K线数据
 }
+MA_VOLUME_WINDOW = FEATURES['volume_ma5'][1]  # 均量窗口（放量/缩量判定用5日均量）
 
 # ===================== 数据预处理函数 =====================
 def load_and_clean_data(file_path):
@@ -38,221 +49,196 @@ def load_and_clean_data(file_path):
     读取日线CSV数据并标准化字段名
     支持常见字段名：日期/Date, 开盘/Open, 最高/High, 最低/Low, 收盘/Close, 成交量/Volume
     """
-    # 读取数据（尝试多种编码和分隔符）
-    encodings = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312']
-    separators = ['\t', ',']  # 优先尝试制表符
-    df = None
-    last_error = None
-    skip_rows = 0
-    temp_df = None
-    
-    # 首先尝试读取文件，检测是否需要跳过第一行（股票信息行）
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                temp_df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, nrows=2)
-                # 检查第一行的第一列是否为日期格式
-                first_col_value = str(temp_df.iloc[0, 0])
-                import re
-                date_pattern = r'^\d{4}[/\-]\d{2}[/\-]\d{2}$'
-                if not re.match(date_pattern, first_col_value):
-                    # 第一行不是日期，说明是股票信息，需要跳过
-                    skip_rows = 1
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if temp_df is not None:
-            break
-    
-    # 正式读取数据（使用检测到的skip_rows）
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, skiprows=skip_rows)
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if df is not None:
-            break
-    
-    if df is None:
-        raise ValueError(f"无法读取文件。尝试了以下编码：{encodings}，分隔符：{separators}。最后错误：{last_error}")
-    
-    # 清理列名：去除前后空格
-    df.columns = df.columns.str.strip()
-    
-    # 标准化字段名（兼容中英文）
-    col_mapping = {
-        '日期': 'date', 'Date': 'date',
-        '开盘': 'open', 'Open': 'open',
-        '最高': 'high', 'High': 'high',
-        '最低': 'low', 'Low': 'low',
-        '收盘': 'close', 'Close': 'close',
-        '成交量': 'volume', 'Volume': 'volume'
-    }
-    df.rename(columns=col_mapping, inplace=True)
+    # 只读取最近N个月的K线，并向前多读 MA_VOLUME_WINDOW-1 根供5日均量使用（见 tdx_loader.read_tdx_tail）
+    df = load_tail_bars(file_path, months=CONFIG['分析周期月数'], lookback=MA_VOLUME_WINDOW - 1,
+                        required_cols=['date', 'high', 'low', 'volume'])
     
-    # 必要字段检查
-    required_cols = ['date', 'high', 'low', 'volume']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        raise ValueError(f"数据缺少必要字段：{missing_cols}，请检查CSV格式")
+    # 5日均量（用于放量缩量判定）取自指标存储（见 feature_store），区间第一根K线起就有完整的5日数据
+    df = attach_features(file_path, df, ['volume_ma5'], tail=True).rename(columns={'volume_ma5': 'ma5_volume'})
     
-    # 日期格式转换 & 排序
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    # 筛选最近N个月的K线数据
+    # 去掉回看部分，只保留最近N个月
     if len(df) > 0:
-        last_date = df['date'].max()
-        start_date = last_date - pd.DateOffset(months=CONFIG['分析周期月数'])
+        start_date = df['date'].iloc[-1] - pd.DateOffset(months=CONFIG['分析周期月数'])
         df = df[df['date'] >= start_date].reset_index(drop=True)
     
-    # 计算5日均量（用于放量缩量判定）
-    df['ma5_volume'] = df['volume'].rolling(window=5).mean()
-    
     return df
 
-# ===================== N型识别核心函数 =====================
-def identify_n_pattern(df, pattern_type='positive'):
+# ===================== N型特征（向量化） =====================
+def _window_sum(cum_volume, start_idx, end_idx):
+    """闭区间 [start_idx, end_idx] 的成交量之和（区间为空时为0，与切片求和一致）"""
+    total = cum_volume[end_idx + 1] - cum_volume[start_idx]
+    empty = end_idx < start_idx
+    if empty.any():
+        total = np.where(empty.reshape(empty.shape + (1,) * (total.ndim - 1)), 0, total)
+    return total
+
+def compute_n_pattern_features(low, high, close, volume, ma5_volume, dates, pattern_type='positive', verify_days=None, min_idx=0):
     """
-    识别正N型（positive）/反N型（negative）结构
-    返回：包含N型信息的DataFrame
+    计算所有候选窗口的N型特征（沿第0轴向量化，支持一维单股或二维多股数组）
+    min_idx：只计算确认点索引≥min_idx的窗口（增量模式用）
+    返回：dict，包含各关键点位索引/价格、回调幅度、量能、突破幅度、验证期极值等
     """
-    n_patterns = []
-    df_len = len(df)
-    
-    # 滑动窗口遍历（预留验证天数）
-    for i in range(CONFIG['验证天数'] + 2, df_len - CONFIG['验证天数']):
-        # 定义关键点位（三波结构）
-        # 正N型：S1(波谷1) → H1(波峰1) → S2(波谷2) → H2(波峰2)
-        # 反N型：H1(波峰1) → S1(波谷1) → H2(波峰2) → S2(波谷2)
-        if pattern_type == 'positive':
-            S1_idx = i - CONFIG['验证天数'] - 2
-            H1_idx = i - CONFIG['验证天数'] - 1
-            S2_idx = i - CONFIG['验证天数']
-            H2_idx = i
-        else:  # negative
-            H1_idx = i - CONFIG['验证天数'] - 2
-            S1_idx = i - CONFIG['验证天数'] - 1
-            H2_idx = i - CONFIG['验证天数']
-            S2_idx = i
-        
-        # 跳过索引越界
-        if min(S1_idx, H1_idx, S2_idx, H2_idx) < 0:
-            continue
-        
-        # 提取关键点位数据
-        S1 = df.iloc[S1_idx]['low'] if pattern_type == 'positive' else df.iloc[S1_idx]['low']
-        H1 = df.iloc[H1_idx]['high'] if pattern_type == 'positive' else df.iloc[H1_idx]['high']
-        S2 = df.iloc[S2_idx]['low'] if pattern_type == 'positive' else df.iloc[S2_idx]['low']
-        H2 = df.iloc[H2_idx]['high'] if pattern_type == 'positive' else df.iloc[H2_idx]['high']
-        
-        # 计算时间间隔（回调/反抽阶段天数）
-        days_interval = (df.iloc[S2_idx]['date'] - df.iloc[H1_idx]['date']).days
-        
-        # ===================== 第一步：高低点规则判定 =====================
+    if verify_days is None:
+        verify_days = CONFIG['验证天数']
+    n = len(low)
+    idx = np.arange(max(verify_days + 2, min_idx), n - verify_days)
+    
+    # 定义关键点位（三波结构）
+    # 正N型：S1(波谷1) → H1(波峰1) → S2(波谷2) → H2(波峰2)
+    # 反N型：H1(波峰1) → S1(波谷1) → H2(波峰2) → S2(波谷2)
+    if pattern_type == 'positive':
+        S1_idx, H1_idx, S2_idx, H2_idx = idx - verify_days - 2, idx - verify_days - 1, idx - verify_days, idx
+    else:
+        H1_idx, S1_idx, H2_idx, S2_idx = idx - verify_days - 2, idx - verify_days - 1, idx - verify_days, idx
+    
+    S1, H1, S2, H2 = low[S1_idx], high[H1_idx], low[S2_idx], high[H2_idx]
+    
+    # 时间间隔（回调/反抽阶段天数）
+    # dates 可以是一维（各股共用交易日历）或与价格同形的二维数组
+    day_numbers = dates.astype('datetime64[D]').astype(np.int64)
+    days_interval = day_numbers[S2_idx] - day_numbers[H1_idx]
+    if days_interval.ndim < H1.ndim:
+        days_interval = days_interval[:, None]
+    
+    # 幅度
+    first_wave = H1 - S1
+    with np.errstate(divide='ignore', invalid='ignore'):
         if pattern_type == 'positive':
-            # 正N型：S2 > S1 且 H2 > H1
-            if not (S2 > S1 and H2 > H1):
-                continue
-            # 第一波涨幅 & 回调幅度
-            first_wave = H1 - S1
-            if first_wave <= 0:  # 第一波非上涨，跳过
-                continue
             retracement = (H1 - S2) / first_wave
+            break_rate = (H2 - H1) / H1
         else:
-            # 反N型：H2 < H1 且 S2 < S1
-            if not (H2 < H1 and S2 < S1):
-                continue
-            # 第一波跌幅 & 反抽幅度
-            first_wave = H1 - S1
-            if first_wave <= 0:  # 第一波非下跌，跳过
-                continue
             retracement = (H2 - S1) / first_wave
-        
-        # ===================== 第二步：幅度+时间规则 =====================
-        if not (retracement <= CONFIG['回调/反抽幅度阈值'] and days_interval <= CONFIG['最大回调/反抽天数']):
-            continue
-        
-        # ===================== 第三步：量能规则 =====================
-        # 第一波成交量（放量）
-        vol1 = df.iloc[S1_idx:H1_idx+1]['volume'].sum()
-        ma5_vol1 = df.iloc[H1_idx]['ma5_volume']
-        if vol1 < ma5_vol1 * CONFIG['放量倍数']:
-            continue
-        
-        # 回调/反抽阶段成交量（缩量）
-        vol2 = df.iloc[H1_idx:S2_idx+1]['volume'].sum()
-        if vol2 > vol1 * CONFIG['缩量倍数']:
-            continue
-        
-        # 第二波成交量（再次放量）
-        vol3 = df.iloc[S2_idx:H2_idx+1]['volume'].sum()
-        if vol3 < vol1:
-            continue
-        
-        # ===================== 第四步：突破/跌破幅度判定 =====================
-        if pattern_type == 'positive':
-            # 正N型：H2突破H1的幅度≥3%
-            break_through_rate = (H2 - H1) / H1
-            if break_through_rate < CONFIG['突破确认幅度']:
-                continue
-        else:
-            # 反N型：S2跌破S1的幅度≥3%
-            break_down_rate = (S1 - S2) / S1
-            if break_down_rate < CONFIG['突破确认幅度']:
-                continue
-        
-        # ===================== 第五步：验证（站稳3个交易日） =====================
-        verify_end_idx = H2_idx + CONFIG['验证天数'] if pattern_type == 'positive' else S2_idx + CONFIG['验证天数']
-        if verify_end_idx >= df_len:
-            continue
-        
-        if pattern_type == 'positive':
-            # 正N型：验证期内不跌破H1
-            verify_low = df.iloc[H2_idx:verify_end_idx+1]['low'].min()
-            if verify_low < H1:
-                continue
-        else:
-            # 反N型：验证期内不突破H1
-            verify_high = df.iloc[S2_idx:verify_end_idx+1]['high'].max()
-            if verify_high > H1:
-                continue
-        
-        # ===================== 筛选目标月份的N型 =====================
-        confirm_date = df.iloc[H2_idx]['date']
-        if confirm_date.year != CONFIG['目标年份'] or confirm_date.month != CONFIG['目标月份']:
-            continue
-        
-        # ===================== 记录有效N型 =====================
-        pattern_info = {
-            'pattern_type': '正N型' if pattern_type == 'positive' else '反N型',
-            'H1_date': df.iloc[H1_idx]['date'].strftime('%Y-%m-%d'),
-            'H2_date': df.iloc[H2_idx]['date'].strftime('%Y-%m-%d'),
-            'confirm_date': df.iloc[H2_idx]['date'].strftime('%Y-%m-%d'),
-            'suggested_buy_date': df.iloc[S2_idx]['date'].strftime('%Y-%m-%d'),  # S2 附近
-            'suggested_buy_price': round(df.iloc[S2_idx]['close'], 2),  # S2 收盘价
-            'breakthrough_date': df.iloc[H2_idx]['date'].strftime('%Y-%m-%d'),  # 突破日
-            'breakthrough_price': round(H1 * 1.01, 2),  # H1 上方 1%
-            'S1': round(S1, 2),
-            'H1': round(H1, 2),
-            'S2': round(S2, 2),
-            'H2': round(H2, 2),
-            'first_wave': round(first_wave, 2),
-            'retracement_rate': round(retracement * 100, 2),  # 回调/反抽幅度（%）
-            'break_rate': round(break_through_rate * 100, 2) if pattern_type == 'positive' else round(break_down_rate * 100, 2),
-            'vol1': vol1,
-            'vol2': vol2,
-            'vol3': vol3,
-            'is_valid': True
-        }
-        n_patterns.append(pattern_info)
+            break_rate = (S1 - S2) / S1
+    
+    # 量能：前缀和求区间成交量（缺失值按0计，与pandas求和一致）
+    if volume.dtype.kind in 'iu':
+        cum_volume = np.cumsum(volume, axis=0)
+    else:
+        cum_volume = np.nancumsum(volume, axis=0)
+    cum_volume = np.concatenate([np.zeros((1,) + volume.shape[1:], dtype=cum_volume.dtype), cum_volume])
+    vol1 = _window_sum(cum_volume, S1_idx, H1_idx)
+    vol2 = _window_sum(cum_volume, H1_idx, S2_idx)
+    vol3 = _window_sum(cum_volume, S2_idx, H2_idx)
+    ma5_vol1 = ma5_volume[H1_idx]
+    
+    # 验证期：正N型看H2起的最低价，反N型看S2起的最高价（两者都是窗口 [i, i+验证天数]）
+    if len(idx) > 0:
+        verify_src = low if pattern_type == 'positive' else high
+        windows = sliding_window_view(verify_src, verify_days + 1, axis=0)[idx]
+        reducer = np.fmin if pattern_type == 'positive' else np.fmax
+        verify_extreme = reducer.reduce(windows, axis=-1)
+    else:
+        verify_extreme = np.empty((0,) + low.shape[1:])
+    
+    return {
+        'S1_idx': S1_idx, 'H1_idx': H1_idx, 'S2_idx': S2_idx, 'H2_idx': H2_idx,
+        'S1': S1, 'H1': H1, 'S2': S2, 'H2': H2,
+        'days_interval': days_interval,
+        'first_wave': first_wave,
+        'retracement': retracement,
+        'break_rate': break_rate,
+        'vol1': vol1, 'vol2': vol2, 'vol3': vol3,
+        'ma5_vol1': ma5_vol1,
+        'verify_extreme': verify_extreme,
+        'confirm_date': dates[H2_idx],
+    }
+
+def n_pattern_mask(features, pattern_type='positive', config=None):
+    """
+    按CONFIG阈值对候选窗口做规则判定，返回布尔掩码
+    比较含缺失值时的取舍与逐行判定版本保持一致
+    """
+    if config is None:
+        config = CONFIG
+    S1, H1, S2, H2 = features['S1'], features['H1'], features['S2'], features['H2']
+    vol1, vol2, vol3 = features['vol1'], features['vol2'], features['vol3']
+    
+    # 第一步：高低点规则判定（正N型：S2>S1 且 H2>H1；反N型：H2<H1 且 S2<S1）
+    if pattern_type == 'positive':
+        mask = (S2 > S1) & (H2 > H1)
+    else:
+        mask = (H2 < H1) & (S2 < S1)
+    mask &= features['first_wave'] > 0
+    
+    # 第二步：幅度+时间规则
+    mask &= (features['retracement'] <= config['回调/反抽幅度阈值']) & (features['days_interval'] <= config['最大回调/反抽天数'])
+    
+    # 第三步：量能规则（放量 → 缩量 → 再次放量）
+    mask &= ~(vol1 < features['ma5_vol1'] * config['放量倍数'])
+    mask &= ~(vol2 > vol1 * config['缩量倍数'])
+    mask &= ~(vol3 < vol1)
+    
+    # 第四步：突破/跌破幅度判定
+    mask &= ~(features['break_rate'] < config['突破确认幅度'])
+    
+    # 第五步：验证期内不跌破（正N型）/ 不突破（反N型）H1
+    if pattern_type == 'positive':
+        mask &= ~(features['verify_extreme'] < H1)
+    else:
+        mask &= ~(features['verify_extreme'] > H1)
+    
+    # 筛选目标月份（目标月份为None时不筛选，用于全历史统计）
+    if config['目标月份'] is None:
+        return mask
+    target_month = np.datetime64(f"{config['目标年份']:04d}-{config['目标月份']:02d}", 'M')
+    in_month = features['confirm_date'].astype('datetime64[M]') == target_month
+    if in_month.ndim < mask.ndim:
+        in_month = in_month[:, None]
+    return mask & in_month
+
+# ===================== N型识别核心函数 =====================
+def identify_n_pattern(df, pattern_type='positive', new_from_idx=0):
+    """
+    识别正N型（positive）/反N型（negative）结构
+    new_from_idx：新增K线的起始位置，只评估验证期用到新K线的窗口（增量模式用，0为全量）
+    返回：包含N型信息的DataFrame
+    """
+    # 窗口 [i-验证天数-2, i+验证天数] 的最后一根K线为 i+验证天数，需落在新增K线内
+    min_idx = new_from_idx - CONFIG['验证天数'] if new_from_idx > 0 else 0
+    features = compute_n_pattern_features(
+        df['low'].to_numpy(), df['high'].to_numpy(), df['close'].to_numpy(),
+        df['volume'].to_numpy(), df['ma5_volume'].to_numpy(), df['date'].to_numpy(),
+        pattern_type=pattern_type, min_idx=min_idx)
+    mask = n_pattern_mask(features, pattern_type)
+    if not mask.any():
+        return pd.DataFrame()
+    
+    pick = {k: v[mask] for k, v in features.items()}
+    dates = df['date'].to_numpy()
+    close = df['close'].to_numpy()
+    return build_n_pattern_frame(pick, dates[pick['H1_idx']], dates[pick['H2_idx']],
+                                 dates[pick['S2_idx']], close[pick['S2_idx']], pattern_type)
+
+def build_n_pattern_frame(pick, H1_date, H2_date, S2_date, S2_close, pattern_type='positive'):
+    """
+    把命中窗口的特征整理为结果DataFrame
+    pick：按掩码取出的特征（一维）；日期/收盘价已按对应点位取好，便于单股与多股面板共用
+    """
+    confirm_date = pd.DatetimeIndex(H2_date).strftime('%Y-%m-%d')
     
-    # 转换为DataFrame输出
-    return pd.DataFrame(n_patterns)
+    # ===================== 记录有效N型 =====================
+    n_patterns = pd.DataFrame({
+        'pattern_type': '正N型' if pattern_type == 'positive' else '反N型',
+        'H1_date': pd.DatetimeIndex(H1_date).strftime('%Y-%m-%d'),
+        'H2_date': confirm_date,
+        'confirm_date': confirm_date,
+        'suggested_buy_date': pd.DatetimeIndex(S2_date).strftime('%Y-%m-%d'),  # S2 附近
+        'suggested_buy_price': np.round(S2_close, 2),  # S2 收盘价
+        'breakthrough_date': confirm_date,  # 突破日
+        'breakthrough_price': np.round(pick['H1'] * 1.01, 2),  # H1 上方 1%
+        'S1': np.round(pick['S1'], 2),
+        'H1': np.round(pick['H1'], 2),
+        'S2': np.round(pick['S2'], 2),
+        'H2': np.round(pick['H2'], 2),
+        'first_wave': np.round(pick['first_wave'], 2),
+        'retracement_rate': np.round(pick['retracement'] * 100, 2),  # 回调/反抽幅度（%）
+        'break_rate': np.round(pick['break_rate'] * 100, 2),
+        'vol1': pick['vol1'],
+        'vol2': pick['vol2'],
+        'vol3': pick['vol3'],
+        'is_valid': True
+    })
+    return n_patterns
 
 # ===================== 可视化函数（可选） =====================
 def plot_n_pattern(df, n_patterns_df):
@@ -273,7 +259,8 @@ def plot_n_pattern(df, n_patterns_df):
     end_date = pd.to_datetime(confirm_date) + pd.Timedelta(days=15)
     plot_df = df[(df['date'] >= start_date) & (df['date'] <= end_date)].copy()
     
-    # 绘图
+    # 绘图（pyplot 在这里才导入，HTML报告路径不需要它）
+    plt = get_pyplot()
     plt.figure(figsize=(12, 6))
     # 绘制K线高低点
     plt.plot(plot_df['date'], plot_df['high'], color='red', label='最高价', linewidth=1)
@@ -297,226 +284,217 @@ def plot_n_pattern(df, n_patterns_df):
     plt.show()
 
 # ===================== HTML生成函数 =====================
-def generate_html_report(all_n_patterns, all_positive_n, all_negative_n, config):
-    """
-    生成美观的HTML报告
-    """
-    # 统计信息
-    total_count = len(all_n_patterns)
-    positive_count = len(pd.concat(all_positive_n, ignore_index=True)) if all_positive_n else 0
-    negative_count = len(pd.concat(all_negative_n, ignore_index=True)) if all_negative_n else 0
-    
-    # 按确认日期排序
-    all_n_patterns_sorted = all_n_patterns.sort_values('confirm_date')
-    
-    # 生成表格行
-    table_rows = ""
-    for idx, row in all_n_patterns_sorted.iterrows():
-        row_class = "positive" if row['pattern_type'] == '正N型' else "negative"
-        table_rows += f"""
-        <tr class="{row_class}">
-            <td>{row['股票代码']}</td>
-            <td>{row['H1_date']}</td>
-            <td>{row['H2_date']}</td>
-            <td>{row['confirm_date']}</td>
-            <td>{row['suggested_buy_date']}</td>
-            <td>{row['pattern_type']}</td>
-            <td class="price">{row['suggested_buy_price']:.2f}</td>
-            <td class="rate">{row['break_rate']:.2f}%</td>
-            <td class="rate">{row['retracement_rate']:.2f}%</td>
-            <td>{row['S1']:.2f}</td>
-            <td>{row['H1']:.2f}</td>
-            <td>{row['S2']:.2f}</td>
-            <td>{row['H2']:.2f}</td>
-        </tr>
-        """
-    
-    # 生成HTML内容
-    html_content = f"""
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{config['目标年份']}年{config['目标月份']}月N型结构识别结果</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
+# 报告数据以紧凑的JS数组嵌入页面，逐块写入文件，不在内存里拼接整份HTML；
+# 排序、筛选、虚拟滚动（只渲染可见行）都在浏览器端完成，数万行也能流畅浏览。
+
+REPORT_COLUMNS = [
+    # (字段, 表头, 显示格式)
+    ('股票代码', '股票代码', 'text'),
+    ('H1_date', 'H1日期', 'text'),
+    ('H2_date', 'H2日期', 'text'),
+    ('confirm_date', '确认日期', 'text'),
+    ('suggested_buy_date', '建议买入日期', 'text'),
+    ('pattern_type', '类型', 'text'),
+    ('suggested_buy_price', '建议买入价', 'price'),
+    ('break_rate', '突破幅度', 'rate'),
+    ('retracement_rate', '回调幅度', 'rate'),
+    ('S1', 'S1', 'num'),
+    ('H1', 'H1', 'num'),
+    ('S2', 'S2', 'num'),
+    ('H2', 'H2', 'num'),
+]
+REPORT_CHUNK_ROWS = 5000  # 每次写入的行数
+
+REPORT_CSS = """
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
             font-family: 'Microsoft YaHei', 'PingFang SC', 'Helvetica Neue', Arial, sans-serif;
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             padding: 20px;
             min-height: 100vh;
-        }}
-        
-        .container {{
+        }
+        .container {
             max-width: 1400px;
             margin: 0 auto;
             background: white;
             border-radius: 15px;
             box-shadow: 0 10px 40px rgba(0, 0, 0, 0.2);
             overflow: hidden;
-        }}
-        
-        .header {{
+        }
+        .header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 30px;
             text-align: center;
-        }}
-        
-        .header h1 {{
-            font-size: 32px;
-            margin-bottom: 10px;
-            font-weight: 600;
-        }}
-        
-        .header p {{
-            font-size: 16px;
-            opacity: 0.9;
-        }}
-        
-        .stats {{
+        }
+        .header h1 { font-size: 32px; margin-bottom: 10px; font-weight: 600; }
+        .header p { font-size: 16px; opacity: 0.9; }
+        .stats {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             padding: 30px;
             background: #f8f9fa;
-        }}
-        
-        .stat-card {{
+        }
+        .stat-card {
             background: white;
             padding: 20px;
             border-radius: 10px;
             text-align: center;
             box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
             transition: transform 0.3s;
-        }}
-        
-        .stat-card:hover {{
-            transform: translateY(-5px);
-        }}
-        
-        .stat-card h3 {{
-            font-size: 14px;
-            color: #666;
-            margin-bottom: 10px;
-        }}
-        
-        .stat-card .value {{
-            font-size: 28px;
-            font-weight: bold;
-            color: #667eea;
-        }}
-        
-        .stat-card.positive .value {{
-            color: #28a745;
-        }}
-        
-        .stat-card.negative .value {{
-            color: #dc3545;
-        }}
-        
-        .table-container {{
-            padding: 30px;
-            overflow-x: auto;
-        }}
-        
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            font-size: 13px;
-        }}
-        
-        thead {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        }
+        .stat-card:hover { transform: translateY(-5px); }
+        .stat-card h3 { font-size: 14px; color: #666; margin-bottom: 10px; }
+        .stat-card .value { font-size: 28px; font-weight: bold; color: #667eea; }
+        .stat-card.positive .value { color: #28a745; }
+        .stat-card.negative .value { color: #dc3545; }
+        .toolbar { display: flex; gap: 12px; align-items: center; padding: 20px 30px 0; flex-wrap: wrap; }
+        .toolbar input, .toolbar select { padding: 8px 10px; border: 1px solid #ccc; border-radius: 6px; font-size: 13px; }
+        .toolbar .count { color: #666; font-size: 13px; }
+        .pager { padding: 10px 30px 0; font-size: 13px; }
+        .pager a { margin-right: 8px; color: #667eea; }
+        .pager b { margin-right: 8px; }
+        .table-container { margin: 20px 30px 30px; height: 640px; overflow: auto; border: 1px solid #e0e0e0; }
+        table { width: 100%; border-collapse: collapse; font-size: 13px; }
+        thead th {
+            position: sticky;
+            top: 0;
+            background: #6f5fc0;
             color: white;
-        }}
-        
-        th {{
             padding: 15px 10px;
             text-align: left;
             font-weight: 600;
             white-space: nowrap;
-        }}
-        
-        td {{
-            padding: 12px 10px;
-            border-bottom: 1px solid #e0e0e0;
-        }}
-        
-        tbody tr:hover {{
-            background: #f5f5f5;
-        }}
-        
-        tbody tr.positive {{
-            border-left: 4px solid #28a745;
-        }}
-        
-        tbody tr.negative {{
-            border-left: 4px solid #dc3545;
-        }}
-        
-        .price {{
-            font-weight: 600;
-            color: #333;
-        }}
-        
-        .rate {{
-            font-weight: 600;
-        }}
-        
-        .rate.positive {{
-            color: #28a745;
-        }}
-        
-        .rate.negative {{
-            color: #dc3545;
-        }}
-        
-        .footer {{
-            background: #f8f9fa;
-            padding: 20px;
-            text-align: center;
-            color: #666;
-            font-size: 14px;
-        }}
-        
-        @media (max-width: 768px) {{
-            .stats {{
-                grid-template-columns: 1fr;
-            }}
-            
-            th, td {{
-                padding: 10px 5px;
-                font-size: 12px;
-            }}
-        }}
-    </style>
+            cursor: pointer;
+            user-select: none;
+        }
+        thead th.asc::after { content: ' ▲'; }
+        thead th.desc::after { content: ' ▼'; }
+        tbody tr { height: 40px; }
+        td { padding: 0 10px; border-bottom: 1px solid #e0e0e0; white-space: nowrap; }
+        tbody tr:hover { background: #f5f5f5; }
+        tbody tr.positive { border-left: 4px solid #28a745; }
+        tbody tr.negative { border-left: 4px solid #dc3545; }
+        tbody tr.spacer, tbody tr.spacer:hover { border: none; background: none; }
+        .price { font-weight: 600; color: #333; }
+        .rate { font-weight: 600; }
+        .footer { background: #f8f9fa; padding: 20px; text-align: center; color: #666; font-size: 14px; }
+        @media (max-width: 768px) {
+            .stats { grid-template-columns: 1fr; }
+            td { padding: 0 5px; font-size: 12px; }
+        }
+"""
+
+REPORT_SCRIPT = """
+(function () {
+    const ROW_HEIGHT = 40, OVERSCAN = 10;
+    const box = document.getElementById('table-box');
+    const tbody = document.getElementById('rows');
+    const headers = document.querySelectorAll('thead th');
+    const search = document.getElementById('search');
+    const typeFilter = document.getElementById('type-filter');
+    const counter = document.getElementById('count');
+    const typeCol = COLUMNS.findIndex(c => c[0] === 'pattern_type');
+    let view = ROWS.slice(), sortCol = -1, sortDir = 1;
+
+    function fmt(value, kind) {
+        if (value === null || value === undefined || Number.isNaN(value)) return '';
+        if (kind === 'price' || kind === 'num') return Number(value).toFixed(2);
+        if (kind === 'rate') return Number(value).toFixed(2) + '%';
+        return String(value).replace(/[&<>]/g, ch => ({'&': '&amp;', '<': '&lt;', '>': '&gt;'}[ch]));
+    }
+    function render() {
+        const first = Math.max(0, Math.floor(box.scrollTop / ROW_HEIGHT) - OVERSCAN);
+        const last = Math.min(view.length, first + Math.ceil(box.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN);
+        let html = '<tr class="spacer" style="height:' + first * ROW_HEIGHT + 'px"></tr>';
+        for (let i = first; i < last; i++) {
+            const row = view[i];
+            html += '<tr class="' + (row[typeCol] === '正N型' ? 'positive' : 'negative') + '">';
+            for (let c = 0; c < COLUMNS.length; c++) {
+                const kind = COLUMNS[c][2];
+                html += '<td' + (kind === 'price' || kind === 'rate' ? ' class="' + kind + '"' : '') + '>' + fmt(row[c], kind) + '</td>';
+            }
+            html += '</tr>';
+        }
+        html += '<tr class="spacer" style="height:' + (view.length - last) * ROW_HEIGHT + 'px"></tr>';
+        tbody.innerHTML = html;
+    }
+    function applyFilter() {
+        const keyword = search.value.trim().toLowerCase();
+        const type = typeFilter.value;
+        view = ROWS.filter(row => (!type || row[typeCol] === type) &&
+            (!keyword || row.some(v => v !== null && String(v).toLowerCase().includes(keyword))));
+        if (sortCol >= 0) sortView();
+        counter.textContent = '显示 ' + view.length + ' / ' + ROWS.length + ' 行';
+        box.scrollTop = 0;
+        render();
+    }
+    function sortView() {
+        view.sort((a, b) => {
+            const x = a[sortCol], y = b[sortCol];
+            if (x === y) return 0;
+            if (x === null) return 1;
+            if (y === null) return -1;
+            return (x < y ? -1 : 1) * sortDir;
+        });
+    }
+    headers.forEach((th, c) => th.addEventListener('click', () => {
+        sortDir = (sortCol === c) ? -sortDir : 1;
+        sortCol = c;
+        headers.forEach(h => h.classList.remove('asc', 'desc'));
+        th.classList.add(sortDir > 0 ? 'asc' : 'desc');
+        sortView();
+        render();
+    }));
+    search.addEventListener('input', applyFilter);
+    typeFilter.addEventListener('change', applyFilter);
+    box.addEventListener('scroll', () => window.requestAnimationFrame(render));
+    window.addEventListener('resize', render);
+    applyFilter();
+})();
+"""
+
+def _report_page_name(output_file, page, n_pages):
+    """分页文件名：第1页沿用原文件名，其余页加「_第N页」后缀"""
+    if n_pages <= 1 or page == 1:
+        return output_file
+    root, ext = os.path.splitext(output_file)
+    return f"{root}_第{page}页{ext}"
+
+def _write_report_page(f, rows_df, config, stats, pager_html):
+    """把一页报告写入已打开的文件对象（数据按块序列化后直接写出）"""
+    title = f"{config['目标年份']}年{config['目标月份']}月N型结构识别结果"
+    columns_js = json.dumps([[key, label, kind] for key, label, kind in REPORT_COLUMNS], ensure_ascii=False)
+    header_cells = ''.join(f'<th>{label}</th>' for _, label, _ in REPORT_COLUMNS)
+    
+    f.write(f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>{REPORT_CSS}    </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
-            <h1>📊 {config['目标年份']}年{config['目标月份']}月N型结构识别结果</h1>
+            <h1>📊 {title}</h1>
             <p>基于最近{config['分析周期月数']}个月的K线数据分析</p>
         </div>
         
         <div class="stats">
             <div class="stat-card">
                 <h3>总计识别</h3>
-                <div class="value">{total_count}</div>
+                <div class="value">{stats['total']}</div>
             </div>
             <div class="stat-card positive">
                 <h3>正N型</h3>
-                <div class="value">{positive_count}</div>
+                <div class="value">{stats['positive']}</div>
             </div>
             <div class="stat-card negative">
                 <h3>反N型</h3>
-                <div class="value">{negative_count}</div>
+                <div class="value">{stats['negative']}</div>
             </div>
             <div class="stat-card">
                 <h3>分析周期</h3>
@@ -524,28 +502,20 @@ def generate_html_report(all_n_patterns, all_positive_n, all_negative_n, config)
             </div>
         </div>
         
-        <div class="table-container">
+        <div class="toolbar">
+            <input id="search" type="search" placeholder="搜索股票代码 / 日期 …">
+            <select id="type-filter">
+                <option value="">全部类型</option>
+                <option value="正N型">正N型</option>
+                <option value="反N型">反N型</option>
+            </select>
+            <span class="count" id="count"></span>
+        </div>
+        {pager_html}
+        <div class="table-container" id="table-box">
             <table>
-                <thead>
-                    <tr>
-                        <th>股票代码</th>
-                        <th>H1日期</th>
-                        <th>H2日期</th>
-                        <th>确认日期</th>
-                        <th>建议买入日期</th>
-                        <th>类型</th>
-                        <th>建议买入价</th>
-                        <th>突破幅度</th>
-                        <th>回调幅度</th>
-                        <th>S1</th>
-                        <th>H1</th>
-                        <th>S2</th>
-                        <th>H2</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {table_rows}
-                </tbody>
+                <thead><tr>{header_cells}</tr></thead>
+                <tbody id="rows"></tbody>
             </table>
         </div>
         
@@ -553,26 +523,234 @@ def generate_html_report(all_n_patterns, all_positive_n, all_negative_n, config)
             <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | 数据来源: 通达信</p>
         </div>
     </div>
+<script>
+const COLUMNS = {columns_js};
+const ROWS = [
+""")
+    keys = [key for key, _, _ in REPORT_COLUMNS]
+    for start in range(0, len(rows_df), REPORT_CHUNK_ROWS):
+        chunk = rows_df.iloc[start:start + REPORT_CHUNK_ROWS][keys]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        lines = [json.dumps(row, ensure_ascii=False, separators=(',', ':')) for row in chunk.to_numpy().tolist()]
+        f.write(',\n'.join(lines).replace('</', '<\\/'))
+        f.write(',\n' if start + REPORT_CHUNK_ROWS < len(rows_df) else '\n')
+    f.write(f"""];
+{REPORT_SCRIPT}</script>
 </body>
 </html>
+""")
+
+def write_html_report(output_file, all_n_patterns, config, page_size=None):
+    """
+    流式写出HTML报告
+    page_size：每页行数，给出时拆分为多个文件（第1页为 output_file，其余加「_第N页」后缀）
+    返回：写出的文件路径列表
     """
+    # 按确认日期排序
+    all_n_patterns = all_n_patterns.sort_values('confirm_date', kind='stable')
+    stats = {
+        'total': len(all_n_patterns),
+        'positive': int((all_n_patterns['pattern_type'] == '正N型').sum()),
+        'negative': int((all_n_patterns['pattern_type'] == '反N型').sum()),
+    }
+    if not page_size or page_size <= 0:
+        page_size = max(len(all_n_patterns), 1)
+    n_pages = max(1, -(-len(all_n_patterns) // page_size))
     
-    return html_content
+    output_files = []
+    for page in range(1, n_pages + 1):
+        pager_html = ''
+        if n_pages > 1:
+            links = ''.join(
+                f'<b>{p}</b>' if p == page else f'<a href="{os.path.basename(_report_page_name(output_file, p, n_pages))}">{p}</a>'
+                for p in range(1, n_pages + 1))
+            pager_html = f'<div class="pager">分页（每页{page_size}行）：{links}</div>'
+        page_file = _report_page_name(output_file, page, n_pages)
+        rows_df = all_n_patterns.iloc[(page - 1) * page_size:page * page_size]
+        with open(page_file, 'w', encoding='utf-8') as f:
+            _write_report_page(f, rows_df, config, stats, pager_html)
+        output_files.append(page_file)
+    return output_files
+
+def generate_html_report(all_n_patterns, all_positive_n, all_negative_n, config):
+    """
+    生成HTML报告并以字符串返回（大结果集请用 write_html_report 直接写文件）
+    """
+    buffer = io.StringIO()
+    stats = {
+        'total': len(all_n_patterns),
+        'positive': sum(len(df) for df in all_positive_n),
+        'negative': sum(len(df) for df in all_negative_n),
+    }
+    _write_report_page(buffer, all_n_patterns.sort_values('confirm_date', kind='stable'), config, stats, '')
+    return buffer.getvalue()
+
+# ===================== 单文件扫描（可在进程池中执行） =====================
+def _init_worker(config, profile=False):
+    """子进程初始化：同步主进程的CONFIG（spawn模式下子进程会重新导入本模块）；profile=True 时记录阶段耗时"""
+    CONFIG.update(config)
+    PROFILER.enabled = profile
+
+def scan_file(file_path, last_date=None, loaded=None):
+    """
+    读取单个文件并识别正/反N型
+    last_date：上次扫描到的日期，给出时只评估其后新增K线（增量模式）
+    loaded：预取线程返回的 Future（见 prefetch），给出时不再自行读取
+    返回：dict（file_name, rows, new_rows, state, positive, negative, error, timings），异常不向外抛出，便于进程池汇总
+    """
+    file_name = os.path.basename(file_path)
+    stock_code = file_name.replace('.txt', '')
+    result = {'file_name': file_name, 'rows': 0, 'new_rows': 0, 'state': None,
+              'positive': None, 'negative': None, 'error': None, 'timings': None}
+    try:
+        with stage('load_and_clean_data', stock_code):
+            df = loaded.result() if loaded is not None else load_and_clean_data(file_path)
+        result['rows'] = len(df)
+        result['state'] = stock_state(df)
+        new_from_idx = first_new_index(df, last_date)
+        result['new_rows'] = len(df) - new_from_idx
+        for pattern_type in ('positive', 'negative'):
+            if new_from_idx >= len(df):
+                result[pattern_type] = pd.DataFrame()  # 没有新K线，无需扫描
+                continue
+            with stage(f'identify_n_pattern_{pattern_type}', stock_code):
+                patterns = identify_n_pattern(df, pattern_type=pattern_type, new_from_idx=new_from_idx)
+            if len(patterns) > 0:
+                patterns['股票代码'] = stock_code
+            result[pattern_type] = patterns
+    except Exception as e:
+        result['error'] = str(e)
+    if PROFILER.enabled:
+        result['timings'] = PROFILER.drain()  # 进程池中由主进程汇总
+    return result
+
+# ===================== 参数扫描 =====================
+# 可扫描的参数：除「验证天数」外都只影响规则判定，特征每只股票只算一次；
+# 「验证天数」改变候选窗口本身，每个取值各算一次特征。
+SWEEP_KEYS = ['回调/反抽幅度阈值', '最大回调/反抽天数', '放量倍数', '缩量倍数', '突破确认幅度', '验证天数']
+
+def parse_sweep_grid(specs):
+    """
+    解析参数网格，如 ["放量倍数=1.0,1.2,1.5", "验证天数=2,3"]
+    返回：{参数名: [取值, ...]}（按 SWEEP_KEYS 顺序）
+    """
+    grid = {}
+    for spec in specs:
+        key, sep, values = spec.partition('=')
+        key = key.strip()
+        if not sep or key not in SWEEP_KEYS:
+            raise ValueError(f"无法解析扫描参数：{spec}（可扫描参数：{SWEEP_KEYS}）")
+        cast = int if key in ('验证天数', '最大回调/反抽天数') else float
+        grid[key] = [cast(v) for v in values.split(',') if v.strip()]
+    return {key: grid[key] for key in SWEEP_KEYS if key in grid}
+
+def sweep_n_patterns(txt_files, grid, config=None):
+    """
+    对参数网格的每个组合统计信号数
+    每只股票只读取一次；候选窗口特征按「验证天数」取值各算一次后跨股票拼接，
+    每个参数组合只做一次整体掩码判定
+    返回：每个组合一行的DataFrame（参数取值、正N型数、反N型数、命中股票数）
+    """
+    base = dict(CONFIG if config is None else config)
+    verify_values = grid.get('验证天数', [base['验证天数']])
+    mask_keys = [key for key in grid if key != '验证天数']
+    
+    # 第一遍：读取数据并计算特征
+    parts = {(v, pt): [] for v in verify_values for pt in ('positive', 'negative')}
+    owners = {key: [] for key in parts}
+    n_stocks = 0
+    for file_path, loaded in prefetch(txt_files, load_and_clean_data):
+        try:
+            df = loaded.result()
+        except Exception:
+            continue
+        arrays = (df['low'].to_numpy(), df['high'].to_numpy(), df['close'].to_numpy(),
+                  df['volume'].to_numpy(), df['ma5_volume'].to_numpy(), df['date'].to_numpy())
+        for (v, pattern_type), bucket in parts.items():
+            features = compute_n_pattern_features(*arrays, pattern_type=pattern_type, verify_days=v)
+            bucket.append(features)
+            owners[(v, pattern_type)].append(np.full(len(features['S1']), n_stocks))
+        n_stocks += 1
+    
+    stacked = {}
+    for key, bucket in parts.items():
+        features = {k: np.concatenate([f[k] for f in bucket]) for k in bucket[0]} if bucket else None
+        stacked[key] = (features, np.concatenate(owners[key]) if bucket else None)
+    
+    # 第二遍：逐组合判定
+    rows = []
+    for v in verify_values:
+        for combo in itertools.product(*[grid[key] for key in mask_keys]):
+            combo_config = dict(base, **dict(zip(mask_keys, combo)))
+            combo_config['验证天数'] = v
+            row = {key: combo_config[key] for key in grid}
+            stocks_hit = np.zeros(n_stocks, dtype=bool)
+            for pattern_type, label in (('positive', '正N型数'), ('negative', '反N型数')):
+                features, owner = stacked[(v, pattern_type)]
+                if features is None:
+                    row[label] = 0
+                    continue
+                mask = n_pattern_mask(features, pattern_type, combo_config)
+                row[label] = int(mask.sum())
+                stocks_hit[owner[mask]] = True
+            row['命中股票数'] = int(stocks_hit.sum())
+            rows.append(row)
+    return pd.DataFrame(rows)
 
 # ===================== 主函数（执行流程） =====================
 if __name__ == "__main__":
-    import os
     import glob
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # -------------------- 命令行参数解析 --------------------
+    parser = argparse.ArgumentParser(description='日线N型结构识别程序')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='并行进程数（默认1，即单进程顺序处理）')
+    parser.add_argument('-i', '--incremental', action='store_true', help='增量模式：只扫描上次运行后新增的K线，只输出新确认的信号')
+    parser.add_argument('--page-size', type=int, default=None, help='HTML报告每页行数（默认不分页）')
+    parser.add_argument('--sweep', action='append', metavar='参数=取值1,取值2',
+                        help='参数扫描模式，可重复指定，如 --sweep 放量倍数=1.0,1.2,1.5 --sweep 验证天数=2,3')
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        # 多进程时 cProfile 只覆盖主进程，阶段耗时由子进程随结果带回
+        start_profiling()
     
     # -------------------- 获取所有数据文件 --------------------
     data_dir = "./data"
-    txt_files = glob.glob(os.path.join(data_dir, "*.txt"))
+    txt_files = sorted(glob.glob(os.path.join(data_dir, "*.txt")))
     
     if not txt_files:
         print(f"未在 {data_dir} 目录下找到任何 .txt 文件")
         exit(1)
     
     print(f"找到 {len(txt_files)} 个数据文件")
+    
+    # -------------------- 参数扫描模式 --------------------
+    if args.sweep:
+        try:
+            grid = parse_sweep_grid(args.sweep)
+        except ValueError as e:
+            parser.error(str(e))
+        n_combos = int(np.prod([len(values) for values in grid.values()]))
+        print(f"参数扫描：{n_combos} 个组合，{'、'.join(grid)}")
+        with stage('sweep_n_patterns'):
+            sweep_df = sweep_n_patterns(txt_files, grid)
+        sweep_df = sweep_df.sort_values(['正N型数', '反N型数'], ascending=False).reset_index(drop=True)
+        print(sweep_df.head(20).to_string(index=False))
+        output_file = f"{CONFIG['目标年份']}年{CONFIG['目标月份']}月N型参数扫描结果.xlsx"
+        with stage('write_results'):
+            sweep_df.to_excel(output_file, index=False)
+        print(f"\n扫描结果已保存至：{output_file}")
+        if args.profile:
+            print(f"性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
+        exit(0)
+    
+    # 增量模式：读取上次扫描到的日期（没有记录的股票做全量扫描）
+    scan_state = load_scan_state(data_dir, 'N') if args.incremental else {}
+    last_dates = [scan_state.get(os.path.basename(f).replace('.txt', ''), {}).get('last_date') for f in txt_files]
+    if args.incremental:
+        print(f"增量模式：{sum(d is not None for d in last_dates)} 只股票有扫描记录")
     print("=" * 60)
     
     # -------------------- 初始化结果汇总 --------------------
@@ -581,42 +759,55 @@ if __name__ == "__main__":
     processed_count = 0
     success_count = 0
     
-    # -------------------- 循环处理每个文件 --------------------
-    for file_path in txt_files:
-        file_name = os.path.basename(file_path)
+    # -------------------- 逐个/并行处理文件 --------------------
+    # 进程池的 map 按提交顺序返回结果，结果边完成边汇总，输出顺序与单进程一致
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                       initargs=(dict(CONFIG), PROFILER.enabled))
+        chunksize = max(1, len(txt_files) // (args.workers * 16))
+        results = executor.map(scan_file, txt_files, last_dates, chunksize=chunksize)
+    else:
+        # 单进程时由预取线程提前读取后面的文件，与识别计算重叠
+        results = (scan_file(file_path, last_date, loaded)
+                   for (file_path, loaded), last_date in zip(prefetch(txt_files, load_and_clean_data), last_dates))
+    
+    for result in results:
         processed_count += 1
+        PROFILER.extend(result['timings'])
+        print(f"\n[{processed_count}/{len(txt_files)}] 处理文件：{result['file_name']}")
+        print("-" * 60)
         
-        try:
-            print(f"\n[{processed_count}/{len(txt_files)}] 处理文件：{file_name}")
-            print("-" * 60)
-            
-            # 步骤1：读取并清洗数据
-            df = load_and_clean_data(file_path)
-            print(f"  数据读取完成，共{len(df)}条日线记录")
-            
-            # 步骤2：识别正N型
-            positive_n = identify_n_pattern(df, pattern_type='positive')
-            if len(positive_n) > 0:
-                positive_n['股票代码'] = file_name.replace('.txt', '')
-                all_positive_n.append(positive_n)
-                print(f"  识别到{len(positive_n)}个有效正N型")
-            else:
-                print(f"  未识别到有效正N型")
-            
-            # 步骤3：识别反N型
-            negative_n = identify_n_pattern(df, pattern_type='negative')
-            if len(negative_n) > 0:
-                negative_n['股票代码'] = file_name.replace('.txt', '')
-                all_negative_n.append(negative_n)
-                print(f"  识别到{len(negative_n)}个有效反N型")
-            else:
-                print(f"  未识别到有效反N型")
-            
-            success_count += 1
-            
-        except Exception as e:
-            print(f"  处理失败：{str(e)}")
+        if result['error'] is not None:
+            print(f"  处理失败：{result['error']}")
             continue
+        
+        print(f"  数据读取完成，共{result['rows']}条日线记录")
+        if args.incremental:
+            print(f"  新增{result['new_rows']}条日线记录")
+            if result['state'] is not None:
+                scan_state[result['file_name'].replace('.txt', '')] = result['state']
+        
+        positive_n = result['positive']
+        if len(positive_n) > 0:
+            all_positive_n.append(positive_n)
+            print(f"  识别到{len(positive_n)}个有效正N型")
+        else:
+            print(f"  未识别到有效正N型")
+        
+        negative_n = result['negative']
+        if len(negative_n) > 0:
+            all_negative_n.append(negative_n)
+            print(f"  识别到{len(negative_n)}个有效反N型")
+        else:
+            print(f"  未识别到有效反N型")
+        
+        success_count += 1
+    
+    if executor is not None:
+        executor.shutdown()
+    if args.incremental:
+        save_scan_state(data_dir, 'N', scan_state)
     
     # -------------------- 汇总并保存结果 --------------------
     print("\n" + "=" * 60)
@@ -627,12 +818,14 @@ if __name__ == "__main__":
     if all_positive_n or all_negative_n:
         all_n_patterns = pd.concat(all_positive_n + all_negative_n, ignore_index=True)
         
-        # 生成HTML报告
-        html_content = generate_html_report(all_n_patterns, all_positive_n, all_negative_n, CONFIG)
+        # 生成HTML报告（流式写出，可分页）
         output_file = f"{CONFIG['目标年份']}年{CONFIG['目标月份']}月N型结构识别结果.html"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        print(f"\n识别结果已保存至：{output_file}")
+        if args.incremental:
+            # 增量结果单独保存，不覆盖全量报告
+            output_file = output_file.replace('.html', f"_增量_{datetime.now().strftime('%Y%m%d')}.html")
+        with stage('write_html_report'):
+            output_files = write_html_report(output_file, all_n_patterns, CONFIG, page_size=args.page_size)
+        print(f"\n识别结果已保存至：{output_file}" + (f"（共{len(output_files)}页）" if len(output_files) > 1 else ""))
         print(f"总计识别到 {len(all_n_patterns)} 个N型结构")
         print(f"  - 正N型：{len(pd.concat(all_positive_n, ignore_index=True)) if all_positive_n else 0} 个")
         print(f"  - 反N型：{len(pd.concat(all_negative_n, ignore_index=True)) if all_negative_n else 0} 个")
@@ -642,4 +835,7 @@ if __name__ == "__main__":
         print(f"\n按确认日期排序的前5个N型结构：")
         print(all_n_patterns_sorted[['股票代码', 'confirm_date', 'pattern_type', 'suggested_buy_price', 'break_rate']].head().to_string(index=False))
     else:
-        print(f"\n未在{CONFIG['目标年份']}年{CONFIG['目标月份']}月识别到任何有效N型结构")
\ No newline at end of file
+        print(f"\n未在{CONFIG['目标年份']}年{CONFIG['目标月份']}月识别到任何有效N型结构")
+    
+    if args.profile:
+        print(f"\n性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
@@ -1,74 +1,29 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 import glob
+import argparse
 from datetime import datetime, timedelta
 import warnings
+from tdx_cache import load_cached_bars
+from feature_store import attach_features
+from rolling_channel import fit_channel
+from chart_render import get_pyplot, chart_figure, save_chart, render_charts
+from result_sinks import add_output_format_argument, parse_formats, write_results
+from chip_distribution import compute_chip_distribution
+from profiling import stage, add_profile_argument, start_profiling, finish_profiling
+from prefetch import prefetch
 warnings.filterwarnings('ignore')
 
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'SimSun']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib中文字体（首次绘图时才导入pyplot并设置，见 chart_render.get_pyplot）
+CHART_FONTS = ['Microsoft YaHei', 'SimHei', 'SimSun']
 
 def load_and_clean_data(file_path):
-    """读取并标准化日线CSV数据"""
-    encodings = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312']
-    separators = ['\t', ',']
-    df = None
-    last_error = None
-    skip_rows = 0
-    temp_df = None
-    
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                temp_df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, nrows=2)
-                first_col_value = str(temp_df.iloc[0, 0])
-                import re
-                date_pattern = r'^\d{4}[/\-]\d{2}[/\-]\d{2}$'
-                if not re.match(date_pattern, first_col_value):
-                    skip_rows = 1
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if temp_df is not None:
-            break
-    
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, skiprows=skip_rows)
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if df is not None:
-            break
-    
-    if df is None:
-        return None
-    
-    df.columns = df.columns.str.strip()
-    col_mapping = {
-        '日期': 'date', 'Date': 'date',
-        '开盘': 'open', 'Open': 'open',
-        '最高': 'high', 'High': 'high',
-        '最低': 'low', 'Low': 'low',
-        '收盘': 'close', 'Close': 'close',
-        '成交量': 'volume', 'Volume': 'volume'
-    }
-    df.rename(columns=col_mapping, inplace=True)
-    
-    required_cols = ['date', 'close', 'high', 'low', 'volume']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
+    """读取并标准化日线CSV数据，附带均线指标（见 feature_store）"""
+    try:
+        return attach_features(file_path, load_cached_bars(file_path, required_cols=['date', 'close', 'high', 'low', 'volume']))
+    except (ValueError, pd.errors.ParserError):
         return None
-    
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    return df
 
 def detect_rising_channel(df):
     """检测上升通道形态"""
@@ -76,18 +31,11 @@ def detect_rising_channel(df):
         return None, None
     
     try:
-        x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
-        intercept = z[1]
+        # 闭式回归（见 rolling_channel），与 np.polyfit 一次拟合结果一致
+        slope, intercept, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope > 0:
-            residuals = y - (slope * x + intercept)
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 return True, slope
         
         return False, None
@@ -109,68 +57,16 @@ def calculate_december_gain(df):
     gain = (dec_end_price - dec_start_price) / dec_start_price * 100
     return gain
 
-def calculate_chip_distribution(df, window=60):
-    """计算筹码分布"""
+def calculate_chip_distribution(df, window=60, num_bins=20):
+    """计算筹码分布（向量化实现见 chip_distribution）"""
     if len(df) < 10:
         return None
     
     window = min(window, len(df))
-    recent = df.tail(window).copy()
-    
-    price_min = recent['low'].min()
-    price_max = recent['high'].max()
-    price_range = price_max - price_min
-    
-    if price_range == 0:
-        return None
-    
-    num_bins = 20
-    bin_size = price_range / num_bins
-    bins = [price_min + i * bin_size for i in range(num_bins + 1)]
-    
-    chip_distribution = []
-    for i in range(num_bins):
-        bin_low = bins[i]
-        bin_high = bins[i + 1]
-        
-        mask = (recent['low'] <= bin_high) & (recent['high'] >= bin_low)
-        bin_volume = recent[mask]['volume'].sum()
-        
-        if bin_volume > 0:
-            weighted_price = ((recent[mask]['close'] * recent[mask]['volume']).sum() / bin_volume)
-        else:
-            weighted_price = (bin_low + bin_high) / 2
-        
-        chip_distribution.append({
-            'price_low': bin_low,
-            'price_high': bin_high,
-            'price_mid': (bin_low + bin_high) / 2,
-            'volume': bin_volume,
-            'weighted_price': weighted_price
-        })
-    
-    total_volume = sum(item['volume'] for item in chip_distribution)
-    sorted_chips = sorted(chip_distribution, key=lambda x: x['volume'], reverse=True)
-    top3_volume = sum(item['volume'] for item in sorted_chips[:3])
-    concentration = (top3_volume / total_volume * 100) if total_volume > 0 else 0
-    
-    peaks = []
-    valleys = []
-    for i in range(1, len(chip_distribution) - 1):
-        if (chip_distribution[i]['volume'] > chip_distribution[i-1]['volume'] and 
-            chip_distribution[i]['volume'] > chip_distribution[i+1]['volume']):
-            peaks.append(chip_distribution[i])
-        elif (chip_distribution[i]['volume'] < chip_distribution[i-1]['volume'] and 
-              chip_distribution[i]['volume'] < chip_distribution[i+1]['volume']):
-            valleys.append(chip_distribution[i])
-    
-    return {
-        'distribution': chip_distribution,
-        'concentration': round(concentration, 2),
-        'peaks': peaks,
-        'valleys': valleys,
-        'total_volume': total_volume
-    }
+    recent = df.tail(window)
+    return compute_chip_distribution(recent['low'].to_numpy(), recent['high'].to_numpy(),
+                                     recent['close'].to_numpy(), recent['volume'].to_numpy(),
+                                     num_bins=num_bins)
 
 def calculate_chip_profit_ratio(df, current_price=None):
     """计算筹码获利比例"""
@@ -204,7 +100,8 @@ def analyze_chip_statistics(df, stock_code):
     if len(df) < 30:
         return None
     
-    chip_dist = calculate_chip_distribution(df, window=min(60, len(df)))
+    with stage('chip_distribution', stock_code):
+        chip_dist = calculate_chip_distribution(df, window=min(60, len(df)))
     if chip_dist is None:
         return None
     
@@ -270,11 +167,6 @@ def analyze_stock(df, stock_code):
     if len(df_pre) < 30:
         return None
     
-    df_pre['ma5'] = df_pre['close'].rolling(window=5).mean()
-    df_pre['ma10'] = df_pre['close'].rolling(window=10).mean()
-    df_pre['ma20'] = df_pre['close'].rolling(window=20).mean()
-    df_pre['volume_ma5'] = df_pre['volume'].rolling(window=5).mean()
-    
     is_rising, slope = detect_rising_channel(df_pre)
     
     if not is_rising:
@@ -375,23 +267,10 @@ def plot_potential_stock(df, stock_code, details):
     if len(df_analysis) < 50:
         return
     
-    df_analysis['ma5'] = df_analysis['close'].rolling(window=5).mean()
-    df_analysis['ma10'] = df_analysis['close'].rolling(window=10).mean()
-    df_analysis['ma20'] = df_analysis['close'].rolling(window=20).mean()
-    df_analysis['ma60'] = df_analysis['close'].rolling(window=60).mean()
-    df_analysis['volume_ma5'] = df_analysis['volume'].rolling(window=5).mean()
-    
     df_pre = df_analysis[df_analysis['date'] < dec_start].copy()
     
     if len(df_pre) >= 30:
-        x_pre = np.arange(len(df_pre))
-        y_pre = df_pre['close'].values
-        z = np.polyfit(x_pre, y_pre, 1)
-        slope = z[0]
-        intercept = z[1]
-        trend_line_pre = slope * x_pre + intercept
-        residuals = y_pre - trend_line_pre
-        std_residuals = np.std(residuals)
+        slope, intercept, std_residuals, _ = fit_channel(df_pre['close'].values)
         
         x_all = np.arange(len(df_analysis))
         trend_line_all = slope * x_all + intercept
@@ -402,7 +281,8 @@ def plot_potential_stock(df, stock_code, details):
         channel_upper = None
         channel_lower = None
     
-    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(16, 13))
+    plt = get_pyplot(CHART_FONTS)
+    fig, (ax1, ax2, ax3) = chart_figure('potential_stock', 3, 1, figsize=(16, 13))
     
     ax1.plot(df_analysis['date'], df_analysis['close'], label='收盘价', linewidth=1.5, color='black')
     ax1.plot(df_analysis['date'], df_analysis['ma5'], label='MA5', linewidth=1, alpha=0.7, color='red')
@@ -498,12 +378,9 @@ def plot_potential_stock(df, stock_code, details):
     
     filename = f'{stock_code.replace("#", "_")}_潜在主升.png'
     full_path = os.path.join(charts_dir, filename)
-    plt.savefig(full_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    
-    print(f"  已保存: {full_path}")
+    return save_chart(fig, full_path)
 
-def main():
+def main(output_formats=None):
     """主函数：筛选符合上升通道+低位+缩量但未启动主升的股票"""
     print("=" * 80)
     print("筛选符合上升通道+低位+缩量但未启动主升的股票")
@@ -518,19 +395,23 @@ def main():
     print(f"\n找到 {len(txt_files)} 个股票数据文件")
     
     all_results = []
+    frames = {}  # 检测到上升通道的股票K线，出图时直接使用，不再重新读取文件
     rising_channel_count = 0
     
-    for file_path in txt_files:
+    for file_path, loaded in prefetch(txt_files, load_and_clean_data):
         stock_code = os.path.basename(file_path).replace('.txt', '')
         
-        df = load_and_clean_data(file_path)
+        with stage('load_and_clean_data', stock_code):
+            df = loaded.result()
         if df is None:
             continue
         
-        details = analyze_stock(df, stock_code)
+        with stage('analyze_stock', stock_code):
+            details = analyze_stock(df, stock_code)
         if details:
             rising_channel_count += 1
             all_results.append(details)
+            frames[stock_code] = df
     
     print(f"\n检测到上升通道形态的股票: {rising_channel_count} 只")
     
@@ -620,23 +501,38 @@ def main():
         print(f"  {position}: {count}/{len(filtered)} ({count/len(filtered)*100:.1f}%)")
     
     output_file = '上升通道低位缩量潜在主升股票_full.xlsx'
-    filtered.to_excel(output_file, index=False)
-    print(f"\n详细结果已保存到: {output_file}")
+    with stage('write_results'):
+        output_files = write_results(filtered, output_file, output_formats)
+    print(f"\n详细结果已保存到: {'、'.join(output_files)}")
     
     print("\n" + "=" * 80)
     print("生成可视化图表...")
     print("=" * 80)
     
-    for idx, row in filtered.head(20).iterrows():
-        stock_code = row['stock_code']
-        file_path = os.path.join(data_dir, f'{stock_code}.txt')
-        
-        df = load_and_clean_data(file_path)
-        if df is not None:
-            plot_potential_stock(df, stock_code, row)
+    jobs = [(plot_potential_stock, frames[row['stock_code']], row['stock_code'], row)
+            for _, row in filtered.head(20).iterrows()]
+    with stage('render_charts'):
+        chart_results = render_charts(jobs)
+    for job, (chart_path, error) in zip(jobs, chart_results):
+        if error is not None:
+            print(f"  {job[2]}: 图表生成失败 - {error}")
+        elif chart_path is not None:
+            print(f"  已保存: {chart_path}")
     
     print(f"\n已生成前20只股票的可视化图表")
     print("\n分析完成！")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='筛选上升通道+低位+缩量的潜在主升股票（含筹码分析）')
+    add_output_format_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        start_profiling()
+    main(output_formats)
+    if args.profile:
+        print(f"\n性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
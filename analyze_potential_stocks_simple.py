@@ -1,43 +1,21 @@
 import os
+import argparse
 import pandas as pd
-import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.font_manager import FontProperties
+from tdx_cache import load_cached_bars
+from feature_store import attach_features
+from rolling_channel import fit_channel
+from chart_render import get_pyplot, chart_figure, save_chart, render_charts
+from result_sinks import add_output_format_argument, parse_formats, write_results
+from profiling import stage, add_profile_argument, start_profiling, finish_profiling
+from prefetch import prefetch
 
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib中文字体（首次绘图时才导入pyplot并设置，见 chart_render.get_pyplot）
+CHART_FONTS = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
 
 def load_and_clean_data(file_path):
-    """读取并标准化日线CSV数据"""
-    try:
-        df = pd.read_csv(file_path, encoding='utf-8', skiprows=1, sep='\t', comment='#')
-    except UnicodeDecodeError:
-        try:
-            df = pd.read_csv(file_path, encoding='gbk', skiprows=1, sep='\t', comment='#')
-        except UnicodeDecodeError:
-            df = pd.read_csv(file_path, encoding='gb18030', skiprows=1, sep='\t', comment='#')
-    
-    df.columns = df.columns.str.strip()
-    
-    column_mapping = {
-        '日期': 'date',
-        '开盘': 'open',
-        '最高': 'high',
-        '最低': 'low',
-        '收盘': 'close',
-        '成交量': 'volume',
-        '成交额': 'amount'
-    }
-    
-    df = df.rename(columns=column_mapping)
-    
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df = df.dropna(subset=['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    return df
+    """读取并标准化日线CSV数据，附带均线指标（见 feature_store）"""
+    return attach_features(file_path, load_cached_bars(file_path, required_cols=['date']))
 
 def detect_rising_channel(df):
     """检测上升通道形态"""
@@ -45,18 +23,11 @@ def detect_rising_channel(df):
         return None, None
     
     try:
-        x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
-        intercept = z[1]
+        # 闭式回归（见 rolling_channel），与 np.polyfit 一次拟合结果一致
+        slope, intercept, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope > 0:
-            residuals = y - (slope * x + intercept)
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 return True, slope
         
         return False, None
@@ -69,11 +40,6 @@ def analyze_stock(df, stock_code):
         return None
     
     df = df.copy()
-    df['ma5'] = df['close'].rolling(window=5).mean()
-    df['ma10'] = df['close'].rolling(window=10).mean()
-    df['ma20'] = df['close'].rolling(window=20).mean()
-    df['ma60'] = df['close'].rolling(window=60).mean()
-    df['vol_ma5'] = df['volume'].rolling(window=5).mean()
     
     recent_30 = df.tail(30)
     
@@ -129,15 +95,12 @@ def analyze_stock(df, stock_code):
 
 def plot_potential_stock(df, stock_code, details):
     """绘制潜在股票的形态图"""
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10), gridspec_kw={'height_ratios': [3, 1]})
+    import matplotlib.dates as mdates
+    plt = get_pyplot(CHART_FONTS)
+    fig, (ax1, ax2) = chart_figure('potential_stock', 2, 1, figsize=(14, 10), gridspec_kw={'height_ratios': [3, 1]})
     
     df_plot = df.tail(60).copy()
     df_plot['date'] = pd.to_datetime(df_plot['date'])
-    df_plot['ma5'] = df_plot['close'].rolling(window=5).mean()
-    df_plot['ma10'] = df_plot['close'].rolling(window=10).mean()
-    df_plot['ma20'] = df_plot['close'].rolling(window=20).mean()
-    df_plot['ma60'] = df_plot['close'].rolling(window=60).mean()
-    df_plot['vol_ma5'] = df_plot['volume'].rolling(window=5).mean()
     
     ax1.plot(df_plot['date'], df_plot['close'], label='收盘价', linewidth=2, color='#1f77b4')
     ax1.plot(df_plot['date'], df_plot['ma5'], label='MA5', linewidth=1.5, color='#ff7f0e', alpha=0.8)
@@ -158,7 +121,7 @@ def plot_potential_stock(df, stock_code, details):
     ax1.grid(True, alpha=0.3)
     
     ax2.bar(df_plot['date'], df_plot['volume'], color='#7f7f7f', alpha=0.6, label='成交量')
-    ax2.plot(df_plot['date'], df_plot['vol_ma5'], label='量MA5', linewidth=2, color='#e377c2')
+    ax2.plot(df_plot['date'], df_plot['volume_ma5'], label='量MA5', linewidth=2, color='#e377c2')
     ax2.set_ylabel('成交量', fontsize=12)
     ax2.set_xlabel('日期', fontsize=12)
     ax2.legend(loc='upper left', fontsize=10)
@@ -174,15 +137,13 @@ def plot_potential_stock(df, stock_code, details):
     output_dir = 'potential_stocks_charts'
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, f'{stock_code}_形态分析.png')
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    
-    return output_path
+    return save_chart(fig, output_path)
 
-def main():
+def main(output_formats=None):
     """主函数：筛选符合上升通道+低位+缩量但未启动主升的股票"""
     data_dir = 'data'
     results = []
+    frames = {}  # 符合条件股票的K线，出图时直接使用，不再重新读取文件
     
     if not os.path.exists(data_dir):
         print(f"数据目录 {data_dir} 不存在")
@@ -192,16 +153,19 @@ def main():
     
     print(f"开始分析 {len(csv_files)} 只股票...")
     
-    for i, file in enumerate(csv_files, 1):
-        stock_code = file.replace('.txt', '')
-        file_path = os.path.join(data_dir, file)
+    file_paths = [os.path.join(data_dir, file) for file in csv_files]
+    for i, (file_path, loaded) in enumerate(prefetch(file_paths, load_and_clean_data), 1):
+        stock_code = os.path.basename(file_path).replace('.txt', '')
         
         try:
-            df = load_and_clean_data(file_path)
-            details = analyze_stock(df, stock_code)
+            with stage('load_and_clean_data', stock_code):
+                df = loaded.result()
+            with stage('analyze_stock', stock_code):
+                details = analyze_stock(df, stock_code)
             
             if details:
                 results.append(details)
+                frames[stock_code] = df.tail(60)  # 图表只用最近60根K线
                 print(f"[{i}/{len(csv_files)}] {stock_code}: 符合条件 - 价格位置={details['price_position']:.1f}%, "
                       f"量能变化={details['volume_change']:.2f}, 12月涨幅={details['december_gain']:.2f}%")
             else:
@@ -240,8 +204,9 @@ def main():
     print(f"筛选条件: 价格位置<30%, 量能变化<0.8, 12月涨幅<20%")
     
     output_file = '上升通道低位缩量潜在主升股票.xlsx'
-    filtered.to_excel(output_file, index=False, engine='openpyxl')
-    print(f"\n结果已保存到: {output_file}")
+    with stage('write_results'):
+        output_files = write_results(filtered, output_file, output_formats)
+    print(f"\n结果已保存到: {'、'.join(output_files)}")
     
     print("\n前10名股票详情:")
     print(filtered[['stock_code', 'current_price', 'price_position', 'volume_change', 
@@ -250,18 +215,29 @@ def main():
     print("\n开始生成可视化图表...")
     chart_count = min(20, len(filtered))
     
-    for i in range(chart_count):
-        stock_code = filtered.iloc[i]['stock_code']
-        file_path = os.path.join(data_dir, f'{stock_code}.txt')
-        
-        try:
-            df = load_and_clean_data(file_path)
-            chart_path = plot_potential_stock(df, stock_code, filtered.iloc[i].to_dict())
+    jobs = [(plot_potential_stock, frames[row['stock_code']], row['stock_code'], row)
+            for row in filtered.head(chart_count).to_dict('records')]
+    with stage('render_charts'):
+        chart_results = render_charts(jobs)
+    for i, (chart_path, error) in enumerate(chart_results):
+        if error is None:
             print(f"[{i+1}/{chart_count}] 已生成图表: {chart_path}")
-        except Exception as e:
-            print(f"[{i+1}/{chart_count}] {stock_code}: 图表生成失败 - {str(e)}")
+        else:
+            print(f"[{i+1}/{chart_count}] {jobs[i][2]}: 图表生成失败 - {error}")
     
     print(f"\n完成！共生成 {chart_count} 张形态分析图表，保存在 potential_stocks_charts/ 目录")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='筛选上升通道+低位+缩量的潜在主升股票（简化版）')
+    add_output_format_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        start_profiling()
+    main(output_formats)
+    if args.profile:
+        print(f"\n性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
@@ -1,75 +1,30 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 import os
 import glob
+import argparse
 from datetime import datetime, timedelta
 import warnings
+from tdx_cache import load_cached_bars
+from feature_store import attach_features
+from rolling_channel import fit_channel
+from chart_render import get_pyplot, chart_figure, save_chart, render_charts
+from result_sinks import add_output_format_argument, parse_formats, read_results, write_results
+from chip_distribution import compute_chip_distribution
+from profiling import stage, add_profile_argument, start_profiling, finish_profiling
+from prefetch import prefetch
 warnings.filterwarnings('ignore')
 
-# 设置matplotlib中文字体
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'SimSun']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib中文字体（首次绘图时才导入pyplot并设置，见 chart_render.get_pyplot）
+CHART_FONTS = ['Microsoft YaHei', 'SimHei', 'SimSun']
 
 def load_and_clean_data(file_path):
-    """读取并标准化日线CSV数据"""
-    encodings = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312']
-    separators = ['\t', ',']
-    df = None
-    last_error = None
-    skip_rows = 0
-    temp_df = None
-    
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                temp_df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, nrows=2)
-                first_col_value = str(temp_df.iloc[0, 0])
-                import re
-                date_pattern = r'^\d{4}[/\-]\d{2}[/\-]\d{2}$'
-                if not re.match(date_pattern, first_col_value):
-                    skip_rows = 1
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if temp_df is not None:
-            break
-    
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, skiprows=skip_rows)
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if df is not None:
-            break
-    
-    if df is None:
-        return None
-    
-    df.columns = df.columns.str.strip()
-    col_mapping = {
-        '日期': 'date', 'Date': 'date',
-        '开盘': 'open', 'Open': 'open',
-        '最高': 'high', 'High': 'high',
-        '最低': 'low', 'Low': 'low',
-        '收盘': 'close', 'Close': 'close',
-        '成交量': 'volume', 'Volume': 'volume'
-    }
-    df.rename(columns=col_mapping, inplace=True)
-    
-    required_cols = ['date', 'close', 'high', 'low', 'volume']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
+    """读取并标准化日线CSV数据，附带均线指标（见 feature_store）"""
+    try:
+        return attach_features(file_path, load_cached_bars(file_path, required_cols=['date', 'close', 'high', 'low', 'volume']))
+    except (ValueError, pd.errors.ParserError):
         return None
-    
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    return df
 
 def plot_chip_distribution(df, stock_code, chip_stats):
     """绘制筹码分布图"""
@@ -79,7 +34,8 @@ def plot_chip_distribution(df, stock_code, chip_stats):
     distribution = chip_stats['distribution']
     
     # 创建图表
-    fig, ax = plt.subplots(figsize=(14, 8))
+    plt = get_pyplot(CHART_FONTS)
+    fig, ax = chart_figure('chip_distribution', figsize=(14, 8))
     
     # 提取价格和筹码量
     prices = [item['price_mid'] for item in distribution]
@@ -141,10 +97,10 @@ def plot_chip_distribution(df, stock_code, chip_stats):
     
     # 保存图片
     filename = f'{stock_code.replace("#", "_")}_筹码分布.png'
-    plt.savefig(filename, dpi=150, bbox_inches='tight')
-    plt.close()
+    save_chart(fig, filename)
     
     print(f"  已保存: {filename}")
+    return filename
 
 def plot_stock_pattern(df, stock_code, gain, chip_stats=None):
     """绘制股票启动形态图"""
@@ -166,12 +122,7 @@ def plot_stock_pattern(df, stock_code, gain, chip_stats=None):
     if len(df_analysis) < 50:
         return
     
-    # 计算技术指标
-    df_analysis['ma5'] = df_analysis['close'].rolling(window=5).mean()
-    df_analysis['ma10'] = df_analysis['close'].rolling(window=10).mean()
-    df_analysis['ma20'] = df_analysis['close'].rolling(window=20).mean()
-    df_analysis['ma60'] = df_analysis['close'].rolling(window=60).mean()
-    df_analysis['volume_ma5'] = df_analysis['volume'].rolling(window=5).mean()
+    # 技术指标（均线、5日均量）已由 load_and_clean_data 按完整历史附带
     
     # 检测启动前的形态
     pre_dec = df_analysis[df_analysis['date'] < dec_start]
@@ -179,31 +130,34 @@ def plot_stock_pattern(df, stock_code, gain, chip_stats=None):
     pattern_markers = []
     
     if len(pre_dec) >= 20:
-        n_pattern = detect_n_pattern(pre_dec)
+        # 局部极值点只计算一次，供所有形态检测和标记函数共用
+        pivots = find_local_extrema(pre_dec)
+        
+        n_pattern = detect_n_pattern(pre_dec, pivots)
         if n_pattern:
             patterns.append(n_pattern)
-            markers = get_n_pattern_markers(pre_dec)
+            markers = get_n_pattern_markers(pre_dec, pivots)
             if markers:
                 pattern_markers.extend(markers)
         
-        v_pattern = detect_v_pattern(pre_dec)
+        v_pattern = detect_v_pattern(pre_dec, pivots)
         if v_pattern:
             patterns.append(v_pattern)
-            markers = get_v_pattern_markers(pre_dec)
+            markers = get_v_pattern_markers(pre_dec, pivots)
             if markers:
                 pattern_markers.extend(markers)
         
-        w_pattern = detect_w_pattern(pre_dec)
+        w_pattern = detect_w_pattern(pre_dec, pivots)
         if w_pattern:
             patterns.append(w_pattern)
-            markers = get_w_pattern_markers(pre_dec)
+            markers = get_w_pattern_markers(pre_dec, pivots)
             if markers:
                 pattern_markers.extend(markers)
         
-        head_shoulder = detect_head_shoulder_bottom(pre_dec)
+        head_shoulder = detect_head_shoulder_bottom(pre_dec, pivots)
         if head_shoulder:
             patterns.append(head_shoulder)
-            markers = get_head_shoulder_markers(pre_dec)
+            markers = get_head_shoulder_markers(pre_dec, pivots)
             if markers:
                 pattern_markers.extend(markers)
         
@@ -235,17 +189,18 @@ def plot_stock_pattern(df, stock_code, gain, chip_stats=None):
             if markers:
                 pattern_markers.extend(markers)
         
-        rounding = detect_rounding_bottom(pre_dec)
+        rounding = detect_rounding_bottom(pre_dec, pivots)
         if rounding:
             patterns.append(rounding)
-            markers = get_rounding_bottom_markers(pre_dec)
+            markers = get_rounding_bottom_markers(pre_dec, pivots)
             if markers:
                 pattern_markers.extend(markers)
     
     pattern_text = ' | '.join(patterns) if patterns else '无明显形态'
     
     # 创建图表
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(16, 10))
+    plt = get_pyplot(CHART_FONTS)
+    fig, (ax1, ax2) = chart_figure('stock_pattern', 2, 1, figsize=(16, 10))
     
     # 绘制价格图
     ax1.plot(df_analysis['date'], df_analysis['close'], label='收盘价', linewidth=1.5, color='black')
@@ -398,79 +353,20 @@ def plot_stock_pattern(df, stock_code, gain, chip_stats=None):
     
     # 保存图片
     filename = f'{stock_code.replace("#", "_")}_启动形态.png'
-    plt.savefig(filename, dpi=150, bbox_inches='tight')
-    plt.close()
+    save_chart(fig, filename)
     
     print(f"  已保存: {filename}")
+    return filename
 
-def calculate_chip_distribution(df, window=60):
-    """计算筹码分布"""
+def calculate_chip_distribution(df, window=60, num_bins=20):
+    """计算筹码分布（向量化实现见 chip_distribution）"""
     if len(df) < window:
         return None
     
-    recent = df.tail(window).copy()
-    
-    # 创建价格区间
-    price_min = recent['low'].min()
-    price_max = recent['high'].max()
-    price_range = price_max - price_min
-    
-    if price_range == 0:
-        return None
-    
-    # 分为20个价格区间
-    num_bins = 20
-    bin_size = price_range / num_bins
-    bins = [price_min + i * bin_size for i in range(num_bins + 1)]
-    
-    # 计算每个价格区间的筹码量（基于成交量）
-    chip_distribution = []
-    for i in range(num_bins):
-        bin_low = bins[i]
-        bin_high = bins[i + 1]
-        
-        # 计算在这个价格区间内的成交量
-        mask = (recent['low'] <= bin_high) & (recent['high'] >= bin_low)
-        bin_volume = recent[mask]['volume'].sum()
-        
-        # 计算加权平均价格
-        if bin_volume > 0:
-            weighted_price = ((recent[mask]['close'] * recent[mask]['volume']).sum() / bin_volume)
-        else:
-            weighted_price = (bin_low + bin_high) / 2
-        
-        chip_distribution.append({
-            'price_low': bin_low,
-            'price_high': bin_high,
-            'price_mid': (bin_low + bin_high) / 2,
-            'volume': bin_volume,
-            'weighted_price': weighted_price
-        })
-    
-    # 计算筹码集中度（前3个最大筹码区间的占比）
-    total_volume = sum(item['volume'] for item in chip_distribution)
-    sorted_chips = sorted(chip_distribution, key=lambda x: x['volume'], reverse=True)
-    top3_volume = sum(item['volume'] for item in sorted_chips[:3])
-    concentration = (top3_volume / total_volume * 100) if total_volume > 0 else 0
-    
-    # 找到筹码峰谷
-    peaks = []
-    valleys = []
-    for i in range(1, len(chip_distribution) - 1):
-        if (chip_distribution[i]['volume'] > chip_distribution[i-1]['volume'] and 
-            chip_distribution[i]['volume'] > chip_distribution[i+1]['volume']):
-            peaks.append(chip_distribution[i])
-        elif (chip_distribution[i]['volume'] < chip_distribution[i-1]['volume'] and 
-              chip_distribution[i]['volume'] < chip_distribution[i+1]['volume']):
-            valleys.append(chip_distribution[i])
-    
-    return {
-        'distribution': chip_distribution,
-        'concentration': round(concentration, 2),
-        'peaks': peaks,
-        'valleys': valleys,
-        'total_volume': total_volume
-    }
+    recent = df.tail(window)
+    return compute_chip_distribution(recent['low'].to_numpy(), recent['high'].to_numpy(),
+                                     recent['close'].to_numpy(), recent['volume'].to_numpy(),
+                                     num_bins=num_bins)
 
 def calculate_chip_profit_ratio(df, current_price=None):
     """计算筹码获利比例"""
@@ -511,7 +407,8 @@ def analyze_chip_statistics(df, stock_code):
         return None
     
     # 计算筹码分布
-    chip_dist = calculate_chip_distribution(df, window=60)
+    with stage('chip_distribution', stock_code):
+        chip_dist = calculate_chip_distribution(df, window=60)
     if chip_dist is None:
         return None
     
@@ -585,11 +482,7 @@ def analyze_pattern_details(df, stock_code):
     if len(df_pre) < 30:
         return None
     
-    # 计算技术指标
-    df_pre['ma5'] = df_pre['close'].rolling(window=5).mean()
-    df_pre['ma10'] = df_pre['close'].rolling(window=10).mean()
-    df_pre['ma20'] = df_pre['close'].rolling(window=20).mean()
-    df_pre['volume_ma5'] = df_pre['volume'].rolling(window=5).mean()
+    # 技术指标（均线、5日均量）已由 load_and_clean_data 按完整历史附带
     
     # 分析关键特征
     details = {
@@ -639,20 +532,21 @@ def analyze_pattern_details(df, stock_code):
     
     # 检测多种形态
     patterns = []
+    pivots = find_local_extrema(df_pre)
     
-    n_pattern = detect_n_pattern(df_pre)
+    n_pattern = detect_n_pattern(df_pre, pivots)
     if n_pattern:
         patterns.append(n_pattern)
     
-    v_pattern = detect_v_pattern(df_pre)
+    v_pattern = detect_v_pattern(df_pre, pivots)
     if v_pattern:
         patterns.append(v_pattern)
     
-    w_pattern = detect_w_pattern(df_pre)
+    w_pattern = detect_w_pattern(df_pre, pivots)
     if w_pattern:
         patterns.append(w_pattern)
     
-    head_shoulder = detect_head_shoulder_bottom(df_pre)
+    head_shoulder = detect_head_shoulder_bottom(df_pre, pivots)
     if head_shoulder:
         patterns.append(head_shoulder)
     
@@ -672,7 +566,7 @@ def analyze_pattern_details(df, stock_code):
     if falling:
         patterns.append(falling)
     
-    rounding = detect_rounding_bottom(df_pre)
+    rounding = detect_rounding_bottom(df_pre, pivots)
     if rounding:
         patterns.append(rounding)
     
@@ -751,37 +645,42 @@ def analyze_pattern_details(df, stock_code):
         details['num_valleys'] = 0
     
     # 计算筹码分布用于绘图
-    chip_dist = calculate_chip_distribution(df_pre, window=60)
+    with stage('chip_distribution', stock_code):
+        chip_dist = calculate_chip_distribution(df_pre, window=60)
     details['chip_distribution'] = chip_dist
     
     return details
 
-def detect_n_pattern(df):
+def find_local_extrema(df, n=5):
+    """
+    计算收盘价的局部极值点（左右各n根K线内严格最高/最低）
+    所有形态检测与标记函数共用，每个区间只需计算一次
+    返回：(local_max_idx, local_min_idx)
+    """
+    close = df['close'].to_numpy(dtype=float)
+    if len(close) < 2 * n + 1:
+        return [], []
+    
+    # 每个窗口以第n个元素为中心，与窗口内其余2n个元素比较
+    windows = sliding_window_view(close, 2 * n + 1)
+    center = windows[:, n][:, None]
+    others = np.delete(windows, n, axis=1)
+    is_max = ~np.any(center <= others, axis=1)
+    is_min = ~np.any(center >= others, axis=1)
+    
+    local_max_idx = (np.flatnonzero(is_max) + n).tolist()
+    local_min_idx = (np.flatnonzero(is_min) + n).tolist()
+    return local_max_idx, local_min_idx
+
+def detect_n_pattern(df, pivots=None):
     """检测N型结构"""
     if len(df) < 20:
         return None
     
     try:
-        n = 5
-        local_max_idx = []
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
-            
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_max_idx) < 2 or len(local_min_idx) < 2:
             return None
@@ -809,23 +708,15 @@ def detect_n_pattern(df):
     except Exception as e:
         return None
 
-def detect_v_pattern(df):
+def detect_v_pattern(df, pivots=None):
     """检测V型反转形态"""
     if len(df) < 20:
         return None
     
     try:
-        n = 5
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_min_idx = pivots[1]
         
         if len(local_min_idx) < 1:
             return None
@@ -849,32 +740,15 @@ def detect_v_pattern(df):
     except Exception as e:
         return None
 
-def detect_w_pattern(df):
+def detect_w_pattern(df, pivots=None):
     """检测W型双底形态"""
     if len(df) < 30:
         return None
     
     try:
-        n = 5
-        local_min_idx = []
-        local_max_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
-            
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_min_idx) < 2 or len(local_max_idx) < 1:
             return None
@@ -899,32 +773,15 @@ def detect_w_pattern(df):
     except Exception as e:
         return None
 
-def detect_head_shoulder_bottom(df):
+def detect_head_shoulder_bottom(df, pivots=None):
     """检测头肩底形态"""
     if len(df) < 40:
         return None
     
     try:
-        n = 5
-        local_min_idx = []
-        local_max_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
-            
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_min_idx) < 3 or len(local_max_idx) < 2:
             return None
@@ -960,8 +817,6 @@ def detect_triangle_pattern(df):
     
     try:
         df_analysis = df.copy()
-        df_analysis['ma10'] = df_analysis['close'].rolling(window=10).mean()
-        df_analysis['ma20'] = df_analysis['close'].rolling(window=20).mean()
         
         first_half = df_analysis.iloc[:len(df_analysis)//2]
         second_half = df_analysis.iloc[len(df_analysis)//2:]
@@ -1008,17 +863,10 @@ def detect_rising_channel(df):
         return None
     
     try:
-        x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
+        slope, _, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope > 0:
-            residuals = y - (slope * x + z[1])
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 return f'上升通道 (斜率{slope:.4f})'
         
         return None
@@ -1031,40 +879,25 @@ def detect_falling_channel(df):
         return None
     
     try:
-        x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
+        slope, _, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope < 0:
-            residuals = y - (slope * x + z[1])
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 return f'下降通道 (斜率{slope:.4f})'
         
         return None
     except Exception as e:
         return None
 
-def detect_rounding_bottom(df):
+def detect_rounding_bottom(df, pivots=None):
     """检测圆弧底形态"""
     if len(df) < 40:
         return None
     
     try:
-        n = 5
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_min_idx = pivots[1]
         
         if len(local_min_idx) < 1:
             return None
@@ -1088,33 +921,16 @@ def detect_rounding_bottom(df):
     except Exception as e:
         return None
 
-def get_n_pattern_markers(df):
+def get_n_pattern_markers(df, pivots=None):
     """获取N型结构的关键点标记"""
     markers = []
     if len(df) < 20:
         return markers
     
     try:
-        n = 5
-        local_max_idx = []
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
-            
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_min_idx) >= 2 and len(local_max_idx) >= 2:
             s1_idx = local_min_idx[-2]
@@ -1162,24 +978,16 @@ def get_n_pattern_markers(df):
     except Exception as e:
         return markers
 
-def get_v_pattern_markers(df):
+def get_v_pattern_markers(df, pivots=None):
     """获取V型反转的关键点标记"""
     markers = []
     if len(df) < 20:
         return markers
     
     try:
-        n = 5
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_min_idx = pivots[1]
         
         if len(local_min_idx) < 1:
             return markers
@@ -1208,33 +1016,16 @@ def get_v_pattern_markers(df):
     except Exception as e:
         return markers
 
-def get_w_pattern_markers(df):
+def get_w_pattern_markers(df, pivots=None):
     """获取W双底的关键点标记"""
     markers = []
     if len(df) < 30:
         return markers
     
     try:
-        n = 5
-        local_min_idx = []
-        local_max_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
-            
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_min_idx) < 2 or len(local_max_idx) < 1:
             return markers
@@ -1276,33 +1067,16 @@ def get_w_pattern_markers(df):
     except Exception as e:
         return markers
 
-def get_head_shoulder_markers(df):
+def get_head_shoulder_markers(df, pivots=None):
     """获取头肩底的关键点标记"""
     markers = []
     if len(df) < 40:
         return markers
     
     try:
-        n = 5
-        local_min_idx = []
-        local_max_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
-            
-            is_max = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] <= df['close'].iloc[j]:
-                    is_max = False
-                    break
-            if is_max:
-                local_max_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_max_idx, local_min_idx = pivots
         
         if len(local_min_idx) < 3 or len(local_max_idx) < 2:
             return markers
@@ -1368,8 +1142,6 @@ def get_triangle_markers(df):
     
     try:
         df_analysis = df.copy()
-        df_analysis['ma10'] = df_analysis['close'].rolling(window=10).mean()
-        df_analysis['ma20'] = df_analysis['close'].rolling(window=20).mean()
         
         first_half = df_analysis.iloc[:len(df_analysis)//2]
         second_half = df_analysis.iloc[len(df_analysis)//2:]
@@ -1436,17 +1208,10 @@ def get_rising_channel_markers(df):
     
     try:
         x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
-        intercept = z[1]
+        slope, intercept, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope > 0:
-            residuals = y - (slope * x + intercept)
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 trend_line = slope * x + intercept
                 upper_line = trend_line + std_residuals
                 lower_line = trend_line - std_residuals
@@ -1494,17 +1259,10 @@ def get_falling_channel_markers(df):
     
     try:
         x = np.arange(len(df))
-        y = df['close'].values
-        
-        z = np.polyfit(x, y, 1)
-        slope = z[0]
-        intercept = z[1]
+        slope, intercept, std_residuals, mean_price = fit_channel(df['close'].values)
         
         if slope < 0:
-            residuals = y - (slope * x + intercept)
-            std_residuals = np.std(residuals)
-            
-            if std_residuals / np.mean(y) < 0.1:
+            if std_residuals / mean_price < 0.1:
                 trend_line = slope * x + intercept
                 upper_line = trend_line + std_residuals
                 lower_line = trend_line - std_residuals
@@ -1544,24 +1302,16 @@ def get_falling_channel_markers(df):
     except Exception as e:
         return markers
 
-def get_rounding_bottom_markers(df):
+def get_rounding_bottom_markers(df, pivots=None):
     """获取圆弧底的关键点标记"""
     markers = []
     if len(df) < 40:
         return markers
     
     try:
-        n = 5
-        local_min_idx = []
-        
-        for i in range(n, len(df) - n):
-            is_min = True
-            for j in range(i - n, i + n + 1):
-                if j != i and df['close'].iloc[i] >= df['close'].iloc[j]:
-                    is_min = False
-                    break
-            if is_min:
-                local_min_idx.append(i)
+        if pivots is None:
+            pivots = find_local_extrema(df)
+        local_min_idx = pivots[1]
         
         if len(local_min_idx) < 1:
             return markers
@@ -1590,10 +1340,10 @@ def get_rounding_bottom_markers(df):
     except Exception as e:
         return markers
 
-def main():
+def main(output_formats=None):
     """主函数：分析涨幅前10名股票的启动形态"""
-    # 读取之前的结果
-    df_results = pd.read_excel('2025年12月股票涨幅统计.xlsx')
+    # 读取之前的结果（同名的 parquet/feather/csv 存在时优先读取，比解析xlsx快得多）
+    df_results = read_results('2025年12月股票涨幅统计.xlsx')
     top_stocks = df_results.head(10)
     
     print("=" * 80)
@@ -1601,20 +1351,22 @@ def main():
     print("=" * 80)
     
     detailed_results = []
+    chart_jobs = []  # 图表任务，扫描结束后并行渲染
     
-    for idx, row in top_stocks.iterrows():
+    file_paths = [os.path.join('data', f'{stock_code}.txt') for stock_code in top_stocks['stock_code']]
+    for (idx, row), (file_path, loaded) in zip(top_stocks.iterrows(), prefetch(file_paths, load_and_clean_data)):
         stock_code = row['stock_code']
         gain = row['december_gain']
         
         print(f"\n【{stock_code}】12月涨幅: {gain:.2f}%")
         
-        # 读取数据
-        file_path = os.path.join('data', f'{stock_code}.txt')
+        # 读取数据（预取线程已提前读取）
         if not os.path.exists(file_path):
             print(f"  数据文件不存在")
             continue
         
-        df = load_and_clean_data(file_path)
+        with stage('load_and_clean_data', stock_code):
+            df = loaded.result()
         if df is None:
             print(f"  数据读取失败")
             continue
@@ -1629,7 +1381,8 @@ def main():
         df_pre = df[(df['date'] >= pre_start) & (df['date'] < dec_start)].copy()
         
         # 详细分析
-        details = analyze_pattern_details(df, stock_code)
+        with stage('analyze_pattern_details', stock_code):
+            details = analyze_pattern_details(df, stock_code)
         if details:
             print(f"  启动前{details['pre_period_days']}天分析:")
             print(f"    日期范围: {details['pre_start_date']} ~ {details['pre_end_date']}")
@@ -1668,7 +1421,7 @@ def main():
             }
             
             # 绘制图表
-            plot_stock_pattern(df, stock_code, gain, chip_stats_for_pattern)
+            chart_jobs.append((plot_stock_pattern, df, stock_code, gain, chip_stats_for_pattern))
             
             # 绘制筹码分布图
             if details.get('chip_distribution'):
@@ -1679,15 +1432,25 @@ def main():
                     'valleys': details['chip_distribution']['valleys'],
                     'profit_ratio': details['profit_ratio']
                 }
-                plot_chip_distribution(df_pre, stock_code, chip_stats_for_plot)
+                chart_jobs.append((plot_chip_distribution, df_pre, stock_code, chip_stats_for_plot))
             
             detailed_results.append(details)
     
+    # 并行渲染全部图表
+    if chart_jobs:
+        print(f"\n生成 {len(chart_jobs)} 张图表...")
+        with stage('render_charts'):
+            chart_results = render_charts(chart_jobs)
+        for job, (_, error) in zip(chart_jobs, chart_results):
+            if error is not None:
+                print(f"  {job[2]}: 图表生成失败 - {error}")
+    
     # 保存详细分析结果
     if detailed_results:
         df_detailed = pd.DataFrame(detailed_results)
-        df_detailed.to_excel('2025年12月涨幅前10名启动形态详细分析.xlsx', index=False)
-        print(f"\n详细分析结果已保存到: 2025年12月涨幅前10名启动形态详细分析.xlsx")
+        with stage('write_results'):
+            output_files = write_results(df_detailed, '2025年12月涨幅前10名启动形态详细分析.xlsx', output_formats)
+        print(f"\n详细分析结果已保存到: {'、'.join(output_files)}")
         
         # 统计总结
         print("\n" + "=" * 80)
@@ -1757,4 +1520,16 @@ def main():
     print("\n分析完成！")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='分析涨幅前10名股票的启动形态')
+    add_output_format_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        start_profiling()
+    main(output_formats)
+    if args.profile:
+        print(f"\n性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
@@ -0,0 +1,183 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from market_panel import build_market_panel, to_bar_axis, locate_signals, gather_forward
+from result_sinks import read_results
+from chip_distribution import rolling_chip_profit
+
+# ===================== 止盈止损回测 =====================
+# 对 longN.py 输出的每条信号（entry_price / stop_loss_price / take_profit_price），
+# 从确认日的下一根K线开始向后模拟：先触及止损或止盈即离场，超过最大持仓天数按收盘价离场。
+# 所有信号的后续K线一次性按 (信号数 × 持仓天数) 的二维数组取出，不逐笔循环。
+# 每条信号附带确认日的筹码获利比例/平均成本/成本偏离度（rolling_chip_profit），可按获利比例筛选后再回测。
+
+BACKTEST_CONFIG = {
+    "最大持仓天数": 20,      # 超过该K线数仍未触发止盈止损，按最后一天收盘价离场
+    "滑点": 0.001,           # 买入价×(1+滑点)，卖出价×(1-滑点)
+    "同日先止损": True,      # 同一根K线同时触及止损和止盈、且开盘价在两者之间时，按止损处理（保守）
+    "入场延迟天数": 0,       # 0=确认日按entry_price入场；N>0=确认后第N根K线收盘入场（设为验证天数可避免前视偏差）
+    "最大获利比例": None,    # 确认日筹码获利比例（%）高于此值的信号不参与回测；None=不筛选
+}
+
+
+def _first_true(mask):
+    """每行第一个True的位置，没有则为 mask.shape[1]"""
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), mask.shape[1])
+
+
+def chip_profit_at(bars, rows, cols):
+    """
+    信号所在K线的筹码获利比例、平均成本、成本偏离度
+    每只有信号的股票在自身有效K线上计算一次全历史序列，再按位置取值
+    """
+    out = {key: np.full(len(rows), np.nan) for key in ('profit_ratio', 'avg_cost', 'cost_deviation')}
+    for col in np.unique(cols):
+        first = int(np.argmax(bars['valid'][:, col]))
+        series = rolling_chip_profit(bars['low'][first:, col], bars['high'][first:, col],
+                                     bars['close'][first:, col], bars['volume'][first:, col])
+        pick = cols == col
+        for key in out:
+            out[key][pick] = series[key][rows[pick] - first]
+    return out
+
+
+def run_backtest(signals, bars, config=None):
+    """
+    批量回测
+    signals：包含 股票代码/confirm_date/entry_price/stop_loss_price/take_profit_price 的DataFrame
+    bars：to_bar_axis 的结果
+    返回：逐笔交易DataFrame（原信号列 + 成交与离场信息）
+    """
+    if config is None:
+        config = BACKTEST_CONFIG
+    horizon = config['最大持仓天数']
+    slippage = config['滑点']
+
+    rows, cols, found = locate_signals(bars, signals['股票代码'].to_numpy(), signals['confirm_date'])
+    trades = signals[found].reset_index(drop=True)
+    rows, cols = rows[found], cols[found]
+
+    # 确认日的筹码指标（按需筛选）
+    chip = chip_profit_at(bars, rows, cols)
+    trades['chip_profit_ratio'] = np.round(chip['profit_ratio'], 2)
+    trades['chip_avg_cost'] = np.round(chip['avg_cost'], 2)
+    trades['chip_cost_deviation'] = np.round(chip['cost_deviation'], 2)
+    if config.get('最大获利比例') is not None:
+        keep = ~(chip['profit_ratio'] > config['最大获利比例'])  # 数据不足（NaN）的信号保留
+        trades = trades[keep].reset_index(drop=True)
+        rows, cols = rows[keep], cols[keep]
+
+    entry = trades['entry_price'].to_numpy(dtype=float)
+    stop = trades['stop_loss_price'].to_numpy(dtype=float)
+    target = trades['take_profit_price'].to_numpy(dtype=float)
+    delay = config['入场延迟天数']
+    if delay > 0:
+        entry_rows = rows + delay
+        entry = np.where(entry_rows < len(bars['dates']),
+                         bars['close'][np.minimum(entry_rows, len(bars['dates']) - 1), cols], np.nan)
+        rows = entry_rows
+
+    open_ = gather_forward(bars['open'], rows, cols, horizon)
+    high = gather_forward(bars['high'], rows, cols, horizon)
+    low = gather_forward(bars['low'], rows, cols, horizon)
+    close = gather_forward(bars['close'], rows, cols, horizon)
+    available = ~np.isnan(close)
+
+    # 首次触及止损/止盈的K线
+    stop_hit = low <= stop[:, None]
+    target_hit = high >= target[:, None]
+    first_stop = _first_true(stop_hit)
+    first_target = _first_true(target_hit)
+    n_available = available.sum(axis=1)
+
+    exit_idx = np.minimum(first_stop, first_target)
+    touched = exit_idx < horizon
+    # 未触发：持仓满期或数据结束，在最后一根可用K线收盘离场
+    exit_idx = np.where(touched, exit_idx, np.maximum(n_available - 1, 0))
+
+    signal_index = np.arange(len(trades))
+    exit_open = open_[signal_index, exit_idx] if len(trades) else np.empty(0)
+    exit_close = close[signal_index, exit_idx] if len(trades) else np.empty(0)
+
+    # 同一根K线两者都触及：开盘价已越过其中一方的以开盘为准，否则按配置处理
+    same_bar = first_stop == first_target
+    stop_first = first_stop < first_target
+    stop_first |= same_bar & (exit_open <= stop)
+    stop_first |= same_bar & (exit_open > stop) & (exit_open < target) & config['同日先止损']
+    # 跳空越过止损/止盈时按开盘价成交
+    stop_fill = np.where(exit_open < stop, exit_open, stop)
+    target_fill = np.where(exit_open > target, exit_open, target)
+    raw_exit = np.where(touched, np.where(stop_first, stop_fill, target_fill), exit_close)
+
+    entry_fill = entry * (1 + slippage)
+    exit_fill = raw_exit * (1 - slippage)
+    reason = np.where(touched, np.where(stop_first, '止损', '止盈'),
+                      np.where(n_available >= horizon, '到期', '数据结束'))
+    no_data = (n_available == 0) | np.isnan(entry)
+    reason = np.where(no_data, '无后续数据', reason)
+
+    exit_rows = rows + exit_idx + 1
+    exit_dates = bars['dates'][np.minimum(exit_rows, len(bars['dates']) - 1), cols]
+    trades['entry_fill'] = np.round(entry_fill, 3)
+    trades['exit_date'] = pd.DatetimeIndex(np.where(no_data, np.datetime64('NaT'), exit_dates)).strftime('%Y-%m-%d')
+    trades['exit_price'] = np.round(exit_fill, 3)
+    trades['exit_reason'] = reason
+    trades['holding_days'] = np.where(no_data, 0, exit_idx + 1)
+    trades['return_pct'] = np.round((exit_fill / entry_fill - 1) * 100, 2)
+    trades.loc[no_data, ['exit_price', 'return_pct']] = np.nan
+    return trades
+
+
+def summarize_trades(trades):
+    """汇总统计：胜率、平均/中位收益、盈亏比、平均持仓天数、各离场原因占比"""
+    closed = trades.dropna(subset=['return_pct'])
+    returns = closed['return_pct'].to_numpy()
+    wins = returns[returns > 0]
+    losses = returns[returns <= 0]
+    stats = {
+        '信号数': len(trades),
+        '成交笔数': len(closed),
+        '胜率(%)': round(len(wins) / len(returns) * 100, 2) if len(returns) else 0,
+        '平均收益(%)': round(float(returns.mean()), 2) if len(returns) else 0,
+        '收益中位数(%)': round(float(np.median(returns)), 2) if len(returns) else 0,
+        '平均盈利(%)': round(float(wins.mean()), 2) if len(wins) else 0,
+        '平均亏损(%)': round(float(losses.mean()), 2) if len(losses) else 0,
+        '盈亏比': round(float(wins.sum() / -losses.sum()), 2) if losses.sum() < 0 else None,
+        '平均持仓天数': round(float(closed['holding_days'].mean()), 1) if len(closed) else 0,
+    }
+    for reason, count in closed['exit_reason'].value_counts().items():
+        stats[f'{reason}笔数'] = int(count)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='底部横盘+N型突破信号回测')
+    parser.add_argument('signal_file', nargs='?', default='底部横盘+N型突破识别结果.xlsx', help='信号文件（longN.py 输出；同名的 parquet/feather/csv 存在时优先读取）')
+    parser.add_argument('--hold', type=int, default=BACKTEST_CONFIG['最大持仓天数'], help='最大持仓天数')
+    parser.add_argument('--slippage', type=float, default=BACKTEST_CONFIG['滑点'], help='单边滑点比例')
+    parser.add_argument('--delay', type=int, default=BACKTEST_CONFIG['入场延迟天数'], help='确认后延迟N根K线按收盘价入场')
+    parser.add_argument('--max-profit-ratio', type=float, default=BACKTEST_CONFIG['最大获利比例'], help='只回测确认日筹码获利比例（%%）不高于此值的信号')
+    args = parser.parse_args()
+    BACKTEST_CONFIG.update({'最大持仓天数': args.hold, '滑点': args.slippage, '入场延迟天数': args.delay,
+                            '最大获利比例': args.max_profit_ratio})
+
+    data_dir = "./data"
+    signals = read_results(args.signal_file, dtype={'股票代码': str})
+    print(f"读取信号 {len(signals)} 条")
+
+    codes = signals['股票代码'].unique()
+    files = [os.path.join(data_dir, f"{code}.txt") for code in codes]
+    bars = to_bar_axis(build_market_panel(files=[f for f in files if os.path.exists(f)]))
+
+    trades = run_backtest(signals, bars)
+    stats = summarize_trades(trades)
+    print("=" * 60)
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+    output_file = "底部横盘+N型突破回测结果.xlsx"
+    with pd.ExcelWriter(output_file) as writer:
+        trades.to_excel(writer, sheet_name='逐笔交易', index=False)
+        pd.DataFrame([stats]).to_excel(writer, sheet_name='汇总统计', index=False)
+    print(f"\n回测结果已保存至：{output_file}")
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+# 在导入各扫描脚本（会导入pyplot）之前切换到无界面后端
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+import pandas as pd
+import N
+import longN
+import analyze_top_stocks_pattern as top
+import tdx_cache
+from frame_cache import FRAME_CACHE
+from tdx_loader import read_tdx_bars
+from synthetic_market import generate_market
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+# ===================== 扫描器性能基准 =====================
+# 在合成（或指定的真实）行情目录上分阶段计时，输出每个阶段的耗时、股票/秒、K线/秒及进程峰值内存，
+# 结果可保存为基准JSON，之后用 --compare 与基准对比，耗时超过阈值的阶段标记为退化。
+
+REGRESSION_THRESHOLD = 1.2  # 耗时为基准的1.2倍以上视为退化
+
+DETECTORS = [
+    ('N型', lambda df, pivots: top.detect_n_pattern(df, pivots)),
+    ('V型', lambda df, pivots: top.detect_v_pattern(df, pivots)),
+    ('W底', lambda df, pivots: top.detect_w_pattern(df, pivots)),
+    ('头肩底', lambda df, pivots: top.detect_head_shoulder_bottom(df, pivots)),
+    ('三角形', lambda df, pivots: top.detect_triangle_pattern(df)),
+    ('箱体', lambda df, pivots: top.detect_box_pattern(df)),
+    ('上升通道', lambda df, pivots: top.detect_rising_channel(df)),
+    ('下降通道', lambda df, pivots: top.detect_falling_channel(df)),
+    ('圆弧底', lambda df, pivots: top.detect_rounding_bottom(df, pivots)),
+]
+
+
+class StageTimer:
+    """按阶段累计耗时与处理量"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds, stocks=1, bars=0):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'stocks': 0, 'bars': 0})
+        stage['seconds'] += seconds
+        stage['stocks'] += stocks
+        stage['bars'] += bars
+
+    def run(self, name, func, *args, stocks=1, bars=0):
+        start = time.perf_counter()
+        result = func(*args)
+        self.add(name, time.perf_counter() - start, stocks=stocks, bars=bars)
+        return result
+
+    def summary(self):
+        out = {}
+        for name, stage in self.stages.items():
+            seconds = stage['seconds']
+            out[name] = {
+                'seconds': round(seconds, 4),
+                'stocks': stage['stocks'],
+                'bars': stage['bars'],
+                'stocks_per_sec': round(stage['stocks'] / seconds, 1) if seconds > 0 else None,
+                'bars_per_sec': round(stage['bars'] / seconds, 0) if seconds > 0 else None,
+            }
+        return out
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_benchmark(data_dir, out_dir):
+    """在 data_dir 上执行所有阶段，报告文件写入 out_dir"""
+    files = sorted(f for f in os.listdir(data_dir) if f.endswith('.txt'))
+    files = [os.path.join(data_dir, f) for f in files]
+    timer = StageTimer()
+
+    # 冷启动解析与缓存读取分开计时
+    shutil.rmtree(os.path.join(data_dir, tdx_cache.CACHE_DIR_NAME), ignore_errors=True)
+    for file_path in files:
+        start = time.perf_counter()
+        df = read_tdx_bars(file_path)
+        timer.add('load_parse', time.perf_counter() - start, bars=len(df))
+        timer.run('load_cache_write', tdx_cache.load_cached_bars, file_path, bars=len(df))
+        FRAME_CACHE.discard(file_path)  # 下一次读取走磁盘缓存，而不是进程内LRU
+        timer.run('load_cache_hit', tdx_cache.load_cached_bars, file_path, bars=len(df))
+        timer.run('load_memory_hit', tdx_cache.load_cached_bars, file_path, bars=len(df))
+
+    all_positive_n, all_negative_n, all_breakouts = [], [], []
+    for file_path in files:
+        stock_code = os.path.basename(file_path).replace('.txt', '')
+
+        # N.py：最近一个月的正/反N型（两种形态计入同一阶段，股票数与K线数只在正N型时计一次）
+        df = N.load_and_clean_data(file_path)
+        for pattern_type, bucket in (('positive', all_positive_n), ('negative', all_negative_n)):
+            first = pattern_type == 'positive'
+            patterns = timer.run('identify_n_pattern', N.identify_n_pattern, df, pattern_type,
+                                 stocks=int(first), bars=len(df) if first else 0)
+            if len(patterns) > 0:
+                patterns['股票代码'] = stock_code
+                bucket.append(patterns)
+
+        # longN.py：底部横盘 + 突破
+        df = longN.load_and_clean_data(file_path)
+        zones = timer.run('identify_bottom_consolidation', longN.identify_bottom_consolidation, df, bars=len(df))
+        if not zones.empty:
+            breakouts = timer.run('identify_consolidation_n_breakout', longN.identify_consolidation_n_breakout,
+                                  df, zones, bars=len(df))
+            if not breakouts.empty:
+                breakouts['股票代码'] = stock_code
+                all_breakouts.append(breakouts)
+
+        # 筹码分布与形态检测（analyze_top_stocks_pattern.py）
+        df = top.load_and_clean_data(file_path)
+        timer.run('calculate_chip_distribution', top.calculate_chip_distribution, df, bars=min(60, len(df)))
+        df_pre = df.tail(180).reset_index(drop=True)
+        start = time.perf_counter()
+        pivots = top.find_local_extrema(df_pre)
+        for _, detect in DETECTORS:
+            detect(df_pre, pivots)
+        timer.add('detectors', time.perf_counter() - start, bars=len(df_pre))
+
+    # 报告输出
+    start = time.perf_counter()
+    n_rows = 0
+    if all_positive_n or all_negative_n:
+        all_n_patterns = pd.concat(all_positive_n + all_negative_n, ignore_index=True)
+        n_rows += len(all_n_patterns)
+        N.write_html_report(os.path.join(out_dir, 'N型结构识别结果.html'), all_n_patterns, N.CONFIG)
+    if all_breakouts:
+        all_breakout_df = pd.concat(all_breakouts, ignore_index=True)
+        n_rows += len(all_breakout_df)
+        all_breakout_df.to_excel(os.path.join(out_dir, '底部横盘+N型突破识别结果.xlsx'), index=False)
+    timer.add('report_writing', time.perf_counter() - start, stocks=len(files), bars=n_rows)
+
+    signals = {
+        'positive_n': sum(len(p) for p in all_positive_n),
+        'negative_n': sum(len(p) for p in all_negative_n),
+        'breakouts': sum(len(p) for p in all_breakouts),
+    }
+    return timer.summary(), signals
+
+
+def compare_with_baseline(result, baseline):
+    """逐阶段对比耗时，返回退化的阶段列表"""
+    regressions = []
+    print(f"\n{'阶段':<36}{'基准(s)':>10}{'本次(s)':>10}{'比值':>8}")
+    for name, stage in result['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if base is None or not base['seconds']:
+            print(f"{name:<36}{'-':>10}{stage['seconds']:>10.3f}{'-':>8}")
+            continue
+        ratio = stage['seconds'] / base['seconds']
+        flag = '  ← 退化' if ratio > REGRESSION_THRESHOLD else ''
+        print(f"{name:<36}{base['seconds']:>10.3f}{stage['seconds']:>10.3f}{ratio:>8.2f}{flag}")
+        if ratio > REGRESSION_THRESHOLD:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='扫描器分阶段性能基准')
+    parser.add_argument('-n', '--stocks', type=int, default=200, help='合成股票数量（默认200）')
+    parser.add_argument('-y', '--years', type=float, default=5, help='每只股票的年数（默认5）')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='随机种子（默认0）')
+    parser.add_argument('-d', '--data-dir', type=str, default=None, help='使用已有数据目录，不生成合成数据')
+    parser.add_argument('-o', '--output', type=str, default=None, help='结果JSON保存路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把结果保存为基准（benchmarks/baseline.json）')
+    parser.add_argument('--compare', type=str, default=None, help='与指定的基准JSON对比')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='hitrade_bench_')
+    try:
+        data_dir = os.path.join(work_dir, 'data')
+        if args.data_dir:
+            # 复制到临时目录再测，不动原目录下的缓存与增量状态
+            shutil.copytree(args.data_dir, data_dir, ignore=shutil.ignore_patterns(tdx_cache.CACHE_DIR_NAME))
+        else:
+            start = time.perf_counter()
+            generate_market(data_dir, args.stocks, args.years, args.seed)
+            print(f"已生成 {args.stocks} 只合成股票（{args.years}年），耗时 {time.perf_counter() - start:.1f}s")
+
+        stages, signals = run_benchmark(data_dir, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data_dir': args.data_dir or 'synthetic',
+            'stocks': args.stocks if not args.data_dir else stages['load_parse']['stocks'],
+            'years': args.years if not args.data_dir else None,
+            'seed': args.seed if not args.data_dir else None,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'signals': signals,
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'frame_cache': FRAME_CACHE.stats(),
+    }
+
+    print(f"\n{'阶段':<36}{'耗时(s)':>10}{'股票/秒':>12}{'K线/秒':>14}")
+    for name, stage in stages.items():
+        print(f"{name:<36}{stage['seconds']:>10.3f}{stage['stocks_per_sec'] or 0:>12.1f}{stage['bars_per_sec'] or 0:>14.0f}")
+    print(f"\n信号数：{signals}")
+    print(f"峰值内存：{result['peak_rss_mb']} MB")
+    print(f"K线内存缓存：{result['frame_cache']}")
+
+    output = args.output
+    if args.save_baseline:
+        output = os.path.join(BENCH_DIR, 'baseline.json')
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至：{output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline)
+        if regressions:
+            print(f"\n以下阶段耗时超过基准的{REGRESSION_THRESHOLD}倍：{', '.join(regressions)}")
+            sys.exit(1)
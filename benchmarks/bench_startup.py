@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import statistics
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# ===================== 启动耗时基准 =====================
+# 在全新的解释器进程中导入各扫描脚本，多次取中位数，衡量每次命令行调用的固定开销
+# （shell 循环里成千上万次 `longN.py -f` 的主要成本）。同时记录导入后已加载的重型依赖，
+# 用 --repo 指向另一份检出（如 git worktree 的旧版本）即可对比改动前后的差异。
+
+SCRIPTS = ['N', 'longN', 'analyze_potential_stocks_simple', 'analyze_potential_stocks_full',
+           'analyze_top_stocks_pattern', 'backtest', 'event_study']
+HEAVY_MODULES = ['matplotlib', 'matplotlib.pyplot', 'openpyxl', 'pyarrow', 'scipy']
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def measure_import(repo_dir, module, repeats=5):
+    """在新进程中导入 module 共 repeats 次，返回 (进程总耗时中位数, 导入耗时中位数, 已加载的重型依赖)"""
+    totals, imports, heavy = [], [], []
+    env = dict(os.environ, MPLBACKEND='Agg')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             cwd=repo_dir, env=env, capture_output=True, text=True, check=True)
+        totals.append(time.perf_counter() - start)
+        elapsed, heavy = json.loads(out.stdout.strip().splitlines()[-1])
+        imports.append(elapsed)
+    return statistics.median(totals), statistics.median(imports), heavy
+
+
+def run_benchmark(repo_dir, scripts=None, repeats=5):
+    """逐个脚本测量，返回 {脚本: {...}}"""
+    result = {}
+    for module in scripts or SCRIPTS:
+        if not os.path.exists(os.path.join(repo_dir, f'{module}.py')):
+            continue
+        total, imported, heavy = measure_import(repo_dir, module, repeats)
+        result[module] = {'process_seconds': round(total, 4), 'import_seconds': round(imported, 4), 'heavy_modules': heavy}
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='扫描脚本启动耗时基准')
+    parser.add_argument('-r', '--repeats', type=int, default=5, help='每个脚本重复次数（取中位数，默认5）')
+    parser.add_argument('--repo', type=str, default=REPO_DIR, help='被测代码目录（默认当前仓库）')
+    parser.add_argument('--baseline-repo', type=str, default=None, help='对比用的另一份代码目录（如旧版本的 git worktree）')
+    parser.add_argument('-o', '--output', type=str, default=None, help='结果JSON保存路径')
+    args = parser.parse_args()
+
+    current = run_benchmark(args.repo, repeats=args.repeats)
+    baseline = run_benchmark(args.baseline_repo, repeats=args.repeats) if args.baseline_repo else {}
+
+    print(f"\n{'脚本':<36}{'进程(s)':>10}{'导入(s)':>10}{'基准导入(s)':>14}  已加载的重型依赖")
+    for module, stage in current.items():
+        base = baseline.get(module)
+        base_text = f"{base['import_seconds']:>14.3f}" if base else f"{'-':>14}"
+        print(f"{module:<36}{stage['process_seconds']:>10.3f}{stage['import_seconds']:>10.3f}{base_text}  "
+              f"{', '.join(stage['heavy_modules']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'current': current, 'baseline': baseline}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至：{args.output}")
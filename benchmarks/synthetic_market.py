@@ -0,0 +1,170 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+# ===================== 合成行情数据生成（通达信导出格式） =====================
+# 随机游走K线中按固定概率植入两类形态，保证各扫描器在基准测试中都有命中：
+#   1. 正N型（与N.py默认CONFIG匹配：S1→H1放量上攻→S2缩量回调→H2放量突破→验证期站稳）
+#   2. 底部横盘（低波动、缩量）+ 放量直接突破上沿（与longN.py默认CONFIG匹配）
+# 同一seed生成的目录逐字节一致，便于不同版本之间对比耗时。
+
+HEADER = "      日期\t    开盘\t    最高\t    最低\t    收盘\t    成交量\t    成交额\n"
+
+# 正N型模板：(开盘, 最高, 最低, 收盘, 成交量倍数)，价格为相对起始价的倍数
+# 依次为 S1, H1, S2, H2前一日, H2, 验证期2天
+N_TEMPLATE = [
+    (1.00, 1.01, 0.95, 0.99, 5.0),
+    (0.99, 1.05, 0.98, 1.04, 1.0),
+    (1.03, 1.04, 1.01, 1.02, 0.5),
+    (1.02, 1.06, 1.02, 1.05, 3.0),
+    (1.05, 1.10, 1.05, 1.09, 3.0),
+    (1.09, 1.11, 1.07, 1.10, 1.5),
+    (1.10, 1.12, 1.08, 1.11, 1.5),
+]
+CONSOLIDATION_DAYS = (100, 160)  # 横盘长度范围（longN 横盘最小天数为90）
+CONSOLIDATION_BAND = 0.08        # 横盘期收盘价围绕中枢的波动幅度
+BREAKOUT_DAYS = 12               # 突破段长度（覆盖横盘后10天量能窗口+验证期）
+
+
+def trading_days(end_date, years):
+    """生成以 end_date 结尾的工作日序列（不考虑节假日）"""
+    start_date = end_date - timedelta(days=int(365 * years))
+    return pd.bdate_range(start_date, end_date)
+
+
+def _random_bars(rng, price, n, base_volume):
+    """随机游走段：返回 (OHLCV数组, 末收盘价)"""
+    close = price * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+    prev_close = np.concatenate([[price], close[:-1]])
+    open_ = prev_close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = base_volume * rng.lognormal(0, 0.3, n)
+    return np.column_stack([open_, high, low, close, volume]), close[-1]
+
+
+def _n_pattern_bars(price, base_volume):
+    """植入一个正N型"""
+    bars = np.array(N_TEMPLATE, dtype=float)
+    bars[:, :4] *= price
+    bars[:, 4] *= base_volume
+    return bars, bars[-1, 3]
+
+
+def _consolidation_bars(rng, price, base_volume):
+    """植入底部横盘 + 放量突破"""
+    n = int(rng.integers(*CONSOLIDATION_DAYS))
+    close = price * (1 + rng.uniform(-CONSOLIDATION_BAND, CONSOLIDATION_BAND, n))
+    open_ = np.concatenate([[price], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    volume = base_volume * 0.5 * rng.lognormal(0, 0.2, n)
+    zone_high = high.max()
+
+    # 突破段：逐日抬升，持续放量，最低价不回落到上沿下方
+    step = np.arange(1, BREAKOUT_DAYS + 1)
+    b_close = zone_high * (1 + 0.03 * step)
+    b_open = zone_high * (1 + 0.03 * (step - 1)) + 0.001 * zone_high
+    b_high = b_close * 1.01
+    b_low = b_open * 0.995
+    b_volume = base_volume * 2.5 * rng.lognormal(0, 0.1, BREAKOUT_DAYS)
+
+    bars = np.column_stack([
+        np.concatenate([open_, b_open]), np.concatenate([high, b_high]),
+        np.concatenate([low, b_low]), np.concatenate([close, b_close]),
+        np.concatenate([volume, b_volume])
+    ])
+    return bars, b_close[-1]
+
+
+def generate_bars(rng, n_days, n_pattern_prob=0.2, consolidation_prob=0.05):
+    """
+    生成一只股票的K线：以60根为一段随机游走，每段之前按概率植入形态；最后一个月保证有一个正N型
+    返回：shape=(n_days, 5) 的 开/高/低/收/量 数组
+    """
+    price = float(rng.uniform(3, 80))
+    base_volume = float(rng.uniform(2e5, 5e6))
+    chunks = []
+    total = 0
+    while total < n_days:
+        remaining = n_days - total
+        r = rng.random()
+        if remaining <= 80:
+            # 末段：随机游走后接一个正N型，再留几根K线
+            head, price = _random_bars(rng, price, max(remaining - 12, 1), base_volume)
+            n_bars, price = _n_pattern_bars(price, base_volume)
+            tail, price = _random_bars(rng, price, 5, base_volume)
+            bars = np.concatenate([head, n_bars, tail])
+        elif r < consolidation_prob:
+            bars, price = _consolidation_bars(rng, price, base_volume)
+        elif r < consolidation_prob + n_pattern_prob:
+            bars, price = _n_pattern_bars(price, base_volume)
+        else:
+            bars, price = _random_bars(rng, price, 60, base_volume)
+        # 价格过低时整体抬回，避免随机游走跌到几分钱
+        if price < 1:
+            bars[:, :4] *= 5
+            price *= 5
+        chunks.append(bars)
+        total += len(bars)
+    return np.concatenate(chunks)[:n_days]
+
+
+def write_tdx_file(file_path, stock_code, stock_name, dates, bars, encoding='gbk', footer=True):
+    """按通达信导出格式写出（首行股票信息、制表符分隔、CRLF换行、末尾数据来源行）"""
+    open_, high, low, close = (np.round(bars[:, k], 2) for k in range(4))
+    # 保证四舍五入后仍满足 最低≤开/收≤最高
+    high = np.maximum.reduce([high, open_, close])
+    low = np.minimum.reduce([low, open_, close])
+    volume = np.round(bars[:, 4]).astype(np.int64)
+    amount = volume * close
+    date_str = dates.strftime('%Y/%m/%d')
+    lines = [f"{stock_code[3:]} {stock_name} 日线 前复权\n", HEADER]
+    lines.extend(
+        f"{d}\t{o:.2f}\t{h:.2f}\t{l:.2f}\t{c:.2f}\t{v}\t{a:.2f}\n"
+        for d, o, h, l, c, v, a in zip(date_str, open_, high, low, close, volume, amount)
+    )
+    if footer:
+        lines.append("数据来源:通达信\n")
+    with open(file_path, 'w', encoding=encoding, newline='\r\n') as f:
+        f.writelines(lines)
+
+
+def generate_market(out_dir, n_stocks=100, years=5, seed=0, end_date=None, footer=True):
+    """
+    生成一个合成行情目录
+    end_date 默认为昨天（与各扫描脚本「当前时间减一天」的筛选口径一致）
+    返回：生成的文件路径列表
+    """
+    if end_date is None:
+        end_date = datetime.now() - timedelta(days=1)
+    dates = trading_days(pd.Timestamp(end_date).normalize(), years)
+    os.makedirs(out_dir, exist_ok=True)
+
+    files = []
+    for k in range(n_stocks):
+        rng = np.random.default_rng([seed, k])  # 每只股票独立的随机流，股票数变化不影响已有股票
+        bars = generate_bars(rng, len(dates))
+        market = 'SH' if k % 2 == 0 else 'SZ'
+        stock_code = f"{market}#{600000 + k:06d}" if market == 'SH' else f"{market}#{k:06d}"
+        file_path = os.path.join(out_dir, f"{stock_code}.txt")
+        write_tdx_file(file_path, stock_code, f"合成{k}", dates, bars,
+                       encoding='gbk' if k % 3 else 'utf-8', footer=footer)
+        files.append(file_path)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='生成合成通达信日线数据目录')
+    parser.add_argument('out_dir', help='输出目录')
+    parser.add_argument('-n', '--stocks', type=int, default=100, help='股票数量（默认100）')
+    parser.add_argument('-y', '--years', type=float, default=5, help='每只股票的年数（默认5）')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='随机种子（默认0）')
+    parser.add_argument('--end-date', type=str, default=None, help='最后一个交易日（默认昨天）')
+    parser.add_argument('--no-footer', action='store_true', help='不写末尾「数据来源」行')
+    args = parser.parse_args()
+
+    files = generate_market(args.out_dir, args.stocks, args.years, args.seed, args.end_date, not args.no_footer)
+    print(f"已生成 {len(files)} 个文件至 {args.out_dir}")
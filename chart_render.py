@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# ===================== 并行图表渲染 =====================
+# 扫描结束后的批量出图统一交给 render_charts：每个任务是 (绘图函数, 参数...)，
+# 参数直接使用扫描阶段已加载的DataFrame，不再重新读文件；任务分发到进程池，
+# 子进程使用无界面的 Agg 后端并行写出PNG。
+# 子进程内同一种图复用一个Figure模板（chart_figure 按名称缓存，复用时只清空子图），
+# 省去每张图重新创建Figure和坐标轴的开销；主进程内调用时行为与 plt.subplots / plt.close 相同。
+# matplotlib 只在第一次绘图时导入（get_pyplot），只扫描不出图的运行不承担它的导入和字体解析开销。
+
+_REUSE_FIGURES = False  # 仅在渲染子进程中为True
+_FIGURES = {}
+_PYPLOT = None
+
+
+def get_pyplot(fonts=None):
+    """
+    首次调用时导入并返回 matplotlib.pyplot
+    fonts：中文字体候选列表，给出时设置 font.sans-serif 并关闭 unicode_minus
+    """
+    global _PYPLOT
+    if _PYPLOT is None:
+        import matplotlib.pyplot as plt
+        _PYPLOT = plt
+    if fonts:
+        _PYPLOT.rcParams['font.sans-serif'] = fonts
+        _PYPLOT.rcParams['axes.unicode_minus'] = False
+    return _PYPLOT
+
+
+def _init_worker():
+    """子进程初始化：切换到Agg后端并启用Figure模板复用"""
+    global _REUSE_FIGURES
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    _REUSE_FIGURES = True
+
+
+def chart_figure(name, nrows=1, ncols=1, **kwargs):
+    """
+    取得名为 name 的图表模板（参数同 plt.subplots）
+    渲染子进程中同名模板只创建一次，之后每次清空子图后复用
+    """
+    plt = get_pyplot()
+    if _REUSE_FIGURES:
+        entry = _FIGURES.get(name)
+        if entry is not None and plt.fignum_exists(entry[0].number):
+            fig, axes = entry
+            for ax in fig.axes:
+                ax.clear()
+            # 恢复默认边距，否则 tight_layout 会从上一张图的布局出发，结果与新建Figure不一致
+            fig.subplots_adjust(**{k: plt.rcParams[f'figure.subplot.{k}']
+                                   for k in ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')})
+            plt.figure(fig.number)  # 设为当前Figure，plt.xticks 等调用作用于它
+            return fig, axes
+    fig, axes = plt.subplots(nrows, ncols, **kwargs)
+    if _REUSE_FIGURES:
+        _FIGURES[name] = (fig, axes)
+    return fig, axes
+
+
+def save_chart(fig, path, dpi=150):
+    """保存图表；模板Figure保留以便复用，其余关闭释放内存"""
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    if not _REUSE_FIGURES:
+        get_pyplot().close(fig)
+    return path
+
+
+def _run_job(job):
+    func, args = job[0], job[1:]
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, str(e)
+
+
+def render_charts(jobs, workers=None):
+    """
+    并行渲染图表
+    jobs：[(绘图函数, 参数1, 参数2, ...), ...]，绘图函数须为模块级函数（可被子进程导入）
+    workers：进程数，默认CPU核数；为1或只有一个任务时在当前进程依次执行
+    返回：与 jobs 顺序一致的 [(返回值, 错误信息或None), ...]
+    """
+    jobs = list(jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [_run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        return list(executor.map(_run_job, jobs))
@@ -0,0 +1,164 @@
+import numpy as np
+
+# ===================== 筹码分布计算（公共模块） =====================
+# analyze_potential_stocks_full.py / analyze_top_stocks_pattern.py 的 calculate_chip_distribution 均基于本模块。
+# 所有K线与价格区间的重叠关系通过一次广播比较得到，区间数可以放大到200档而不引入Python级循环。
+
+
+def price_bins(price_min, price_max, num_bins=20):
+    """等分价格区间，返回 num_bins+1 个边界"""
+    bin_size = (price_max - price_min) / num_bins
+    return price_min + np.arange(num_bins + 1) * bin_size
+
+
+def compute_chip_distribution(low, high, close, volume, num_bins=20, spread_volume=False):
+    """
+    计算筹码分布
+    low/high/close/volume：窗口内逐K线数组
+    spread_volume=False：K线成交量计入其价格区间覆盖的每一档（与原实现口径一致）
+    spread_volume=True：K线成交量按覆盖档数平均分摊，各档之和等于窗口总成交量
+    返回：dict（distribution, concentration, peaks, valleys, total_volume），价格区间为0时返回None
+    """
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    close = np.asarray(close, dtype=float)
+    volume = np.asarray(volume)
+
+    price_min = np.nanmin(low)
+    price_max = np.nanmax(high)
+    if price_max - price_min == 0:
+        return None
+
+    edges = price_bins(price_min, price_max, num_bins)
+    bin_low = edges[:-1]
+    bin_high = edges[1:]
+
+    # K线 × 价格区间 的重叠矩阵：最低价不高于区间上沿，且最高价不低于区间下沿
+    overlap = (low[:, None] <= bin_high[None, :]) & (high[:, None] >= bin_low[None, :])
+
+    # 缺失值不计入（与pandas求和口径一致）
+    if volume.dtype.kind in 'iu':
+        weights = volume
+    else:
+        weights = np.nan_to_num(volume.astype(float))
+    close_volume = np.nan_to_num(close * weights)
+
+    if spread_volume:
+        n_overlap = overlap.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(n_overlap > 0, 1.0 / n_overlap, 0.0)
+        weights = weights * share
+        close_volume = close_volume * share
+
+    bin_volume = weights @ overlap
+    bin_close_volume = close_volume @ overlap
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weighted_price = np.where(bin_volume > 0, bin_close_volume / bin_volume, (bin_low + bin_high) / 2)
+    price_mid = (bin_low + bin_high) / 2
+
+    chip_distribution = [{
+        'price_low': bin_low[i],
+        'price_high': bin_high[i],
+        'price_mid': price_mid[i],
+        'volume': bin_volume[i],
+        'weighted_price': weighted_price[i]
+    } for i in range(num_bins)]
+
+    # 筹码集中度（前3个最大筹码区间的占比）
+    total_volume = bin_volume.sum()
+    top3_volume = np.sort(bin_volume)[::-1][:3].sum()
+    concentration = (top3_volume / total_volume * 100) if total_volume > 0 else 0
+
+    # 筹码峰谷：比左右相邻区间都大/都小
+    mid = bin_volume[1:-1]
+    is_peak = (mid > bin_volume[:-2]) & (mid > bin_volume[2:])
+    is_valley = ~is_peak & (mid < bin_volume[:-2]) & (mid < bin_volume[2:])
+    peaks = [chip_distribution[i + 1] for i in np.flatnonzero(is_peak)]
+    valleys = [chip_distribution[i + 1] for i in np.flatnonzero(is_valley)]
+
+    return {
+        'distribution': chip_distribution,
+        'concentration': round(concentration, 2),
+        'peaks': peaks,
+        'valleys': valleys,
+        'total_volume': total_volume
+    }
+
+
+# ===================== 滚动获利比例 / 平均成本 =====================
+# calculate_chip_profit_ratio 只给出最后一根K线的结果（最近60根K线）。回测筹码条件需要每个交易日的值：
+# 逐日重算窗口是 O(n·w)，这里一次遍历维护窗口内的成本分布——
+# 每根K线的成本 (最高+最低+收盘)/3 按全历史排序后的名次存入树状数组（Fenwick），
+# K线进入窗口时加上成交量、离开时减去，「成本低于当日收盘价的成交量」是一次前缀和查询，整体 O(n log n)。
+# 平均成本只需窗口内 成本×成交量 与 成交量 之和，用累加和的差得到。
+
+CHIP_PROFIT_WINDOW = 60
+CHIP_PROFIT_MIN_PERIODS = 30  # 与 calculate_chip_profit_ratio 一致：不足30根K线不计算
+
+
+def rolling_chip_profit(low, high, close, volume, window=CHIP_PROFIT_WINDOW, min_periods=CHIP_PROFIT_MIN_PERIODS):
+    """
+    每根K线往前 window 根（不足时用已有的全部K线）的筹码获利比例、平均成本、成本偏离度
+    口径同 calculate_chip_profit_ratio（当前价为当日收盘价），缺失的成交量按0计
+    返回：dict（profit_ratio %, avg_cost, cost_deviation %），长度与输入相同，不足 min_periods 根K线处为NaN
+    """
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    close = np.asarray(close, dtype=float)
+    volume = np.asarray(volume)
+    n = len(close)
+    out = {key: np.full(n, np.nan) for key in ('profit_ratio', 'avg_cost', 'cost_deviation')}
+    if n == 0:
+        return out
+
+    cost = (high + low + close) / 3
+    weights = volume if volume.dtype.kind in 'iu' else np.nan_to_num(volume.astype(float))
+
+    # 窗口内成交量、成本×成交量之和
+    cum_volume = np.concatenate([[0], np.cumsum(weights)])
+    cum_cost_volume = np.concatenate([[0.0], np.cumsum(np.nan_to_num(cost * weights))])
+    ends = np.arange(1, n + 1)
+    starts = np.maximum(ends - window, 0)
+    total_volume = (cum_volume[ends] - cum_volume[starts]).astype(float)
+    cost_volume = cum_cost_volume[ends] - cum_cost_volume[starts]
+
+    # 成本名次（1起）与每日收盘价之下的名次上限；成本缺失的K线不入树，永远不算获利
+    levels = np.unique(cost[~np.isnan(cost)])
+    ranks = (np.searchsorted(levels, cost) + 1).tolist()
+    below = np.searchsorted(levels, close, side='left').tolist()
+    has_cost = (~np.isnan(cost)).tolist()
+    w = weights.tolist()  # 整数成交量保持为Python整数，加减不累积误差
+    size = len(levels)
+    tree = [0] * (size + 1)
+    profit_volume = np.zeros(n)
+
+    for t in range(n):
+        if has_cost[t]:
+            i = ranks[t]
+            while i <= size:
+                tree[i] += w[t]
+                i += i & -i
+        old = t - window
+        if old >= 0 and has_cost[old]:
+            i = ranks[old]
+            while i <= size:
+                tree[i] -= w[old]
+                i += i & -i
+        i = below[t]
+        acc = 0
+        while i > 0:
+            acc += tree[i]
+            i -= i & -i
+        profit_volume[t] = acc
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_volume = total_volume > 0
+        profit_ratio = np.where(has_volume, profit_volume / total_volume * 100, 0.0)
+        avg_cost = np.where(has_volume, cost_volume / total_volume, close)
+        cost_deviation = np.where(avg_cost > 0, (close - avg_cost) / avg_cost * 100, 0.0)
+
+    ready = ends >= min_periods
+    out['profit_ratio'][ready] = profit_ratio[ready]
+    out['avg_cost'][ready] = avg_cost[ready]
+    out['cost_deviation'][ready] = cost_deviation[ready]
+    return out
@@ -0,0 +1,186 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import N
+import analyze_top_stocks_pattern as top
+from market_panel import build_market_panel, to_bar_axis, locate_signals, gather_forward, scan_n_patterns
+from result_sinks import read_results
+
+# ===================== 形态事件研究 =====================
+# 输入任意信号表（股票代码 + 日期 + 形态类型），以入场K线（信号日后第「入场延迟」根）的收盘价为基准，
+# 统计之后 1/5/10/20/60 根K线的收益，以及最长周期内的最大不利/有利偏移（MAE/MFE）。
+# 信号日之后还要若干根K线才能确认的形态（如N型的验证期）需设置入场延迟，否则收益统计包含确认用过的K线（前视偏差）。
+# 行情一次性加载为面板，所有信号通过向量化取数计算，不逐个打开文件。
+
+HORIZONS = [1, 5, 10, 20, 60]
+
+# analyze_top_stocks_pattern.py 中的形态检测函数：(名称, 函数, 是否使用极值点)
+DETECTORS = [
+    ('N型', top.detect_n_pattern, True),
+    ('V型反转', top.detect_v_pattern, True),
+    ('W底', top.detect_w_pattern, True),
+    ('头肩底', top.detect_head_shoulder_bottom, True),
+    ('三角形', top.detect_triangle_pattern, False),
+    ('箱体', top.detect_box_pattern, False),
+    ('上升通道', top.detect_rising_channel, False),
+    ('下降通道', top.detect_falling_channel, False),
+    ('圆弧底', top.detect_rounding_bottom, True),
+]
+
+
+def compute_event_returns(signals, bars, date_col='confirm_date', horizons=None, delay=0):
+    """
+    计算每个信号的向后收益与MAE/MFE（单位：%）
+    signals：至少包含 股票代码 和 date_col 两列
+    bars：market_panel.to_bar_axis 的结果
+    delay：入场延迟K线数（整数，或与 signals 逐行对应的数组），以信号日后第 delay 根K线的收盘价入场
+    返回：能在行情中定位到的信号 + ret_N / mae / mfe 列（入场K线超出数据末尾时为NaN）
+    """
+    if horizons is None:
+        horizons = HORIZONS
+    max_horizon = max(horizons)
+
+    rows, cols, found = locate_signals(bars, signals['股票代码'].to_numpy(), signals[date_col])
+    events = signals[found].reset_index(drop=True)
+    rows, cols = rows[found], cols[found]
+    rows = rows + np.broadcast_to(np.asarray(delay, dtype=np.int64), found.shape)[found]
+
+    n_rows = bars['close'].shape[0]
+    base = np.where(rows < n_rows, bars['close'][np.minimum(rows, n_rows - 1), cols], np.nan)[:, None]
+    close = gather_forward(bars['close'], rows, cols, max_horizon)
+    high = gather_forward(bars['high'], rows, cols, max_horizon)
+    low = gather_forward(bars['low'], rows, cols, max_horizon)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forward = (close / base - 1) * 100
+        for h in horizons:
+            events[f'ret_{h}'] = np.round(forward[:, h - 1], 2)
+        # fmin/fmax 忽略数据末尾之后的NaN；没有任何后续K线时结果为NaN
+        events['mae'] = np.round((np.fmin.reduce(low, axis=1) / base[:, 0] - 1) * 100, 2)
+        events['mfe'] = np.round((np.fmax.reduce(high, axis=1) / base[:, 0] - 1) * 100, 2)
+    return events
+
+
+def aggregate_events(events, date_col='confirm_date', group_col='pattern_type', horizons=None):
+    """
+    按形态类型、形态类型×月份汇总：事件数、各周期平均收益与胜率、平均MAE/MFE
+    返回：(按形态汇总, 按形态月份汇总)
+    """
+    if horizons is None:
+        horizons = HORIZONS
+    events = events.assign(month=pd.to_datetime(events[date_col]).dt.strftime('%Y-%m'))
+
+    named = {'事件数': ('股票代码', 'size')}
+    for h in horizons:
+        named[f'{h}日平均收益(%)'] = (f'ret_{h}', 'mean')
+    win = {f'{h}日胜率(%)': (events[f'ret_{h}'] > 0).astype(float).where(events[f'ret_{h}'].notna()) * 100
+           for h in horizons}
+    events = events.assign(**win)
+    for h in horizons:
+        named[f'{h}日胜率(%)'] = (f'{h}日胜率(%)', 'mean')
+    named['平均MAE(%)'] = ('mae', 'mean')
+    named['平均MFE(%)'] = ('mfe', 'mean')
+
+    by_pattern = events.groupby(group_col).agg(**named).round(2).reset_index()
+    by_month = events.groupby([group_col, 'month']).agg(**named).round(2).reset_index()
+    return by_pattern, by_month
+
+
+def event_study(signals, bars, date_col='confirm_date', group_col='pattern_type', horizons=None, delay=0):
+    """一次调用完成事件收益计算与汇总，返回 (逐事件明细, 按形态汇总, 按形态月份汇总)"""
+    events = compute_event_returns(signals, bars, date_col, horizons, delay)
+    by_pattern, by_month = aggregate_events(events, date_col, group_col, horizons)
+    return events, by_pattern, by_month
+
+
+# ===================== 信号来源 =====================
+def n_pattern_signals(panel):
+    """全历史的正/反N型信号（N.py 规则，不限目标月份；confirm_date 为H2，之后还有 验证天数 根K线的验证期）"""
+    config = dict(N.CONFIG, 目标月份=None, 分析周期月数=12 * 100)
+    frames = [scan_n_patterns(panel, pattern_type, config) for pattern_type in ('positive', 'negative')]
+    frames = [df for df in frames if len(df) > 0]
+    if not frames:
+        return pd.DataFrame(columns=['股票代码', 'confirm_date', 'pattern_type'])
+    return pd.concat(frames, ignore_index=True)[['股票代码', 'confirm_date', 'pattern_type']]
+
+
+def detector_signals(bars, window=180, step=20):
+    """
+    在每只股票上按 step 根K线滑动 window 长度的区间，运行 analyze_top_stocks_pattern 的各形态检测函数，
+    检测到的形态以区间最后一根K线为信号日
+    """
+    records = []
+    for j, stock_code in enumerate(bars['codes']):
+        valid = bars['valid'][:, j]
+        df = pd.DataFrame({
+            'date': bars['dates'][valid, j],
+            'open': bars['open'][valid, j],
+            'high': bars['high'][valid, j],
+            'low': bars['low'][valid, j],
+            'close': bars['close'][valid, j],
+            'volume': bars['volume'][valid, j],
+        })
+        for end in range(window, len(df) + 1, step):
+            sub = df.iloc[end - window:end].reset_index(drop=True)
+            pivots = top.find_local_extrema(sub)
+            signal_date = sub['date'].iloc[-1].strftime('%Y-%m-%d')
+            for name, detect, uses_pivots in DETECTORS:
+                if (detect(sub, pivots) if uses_pivots else detect(sub)):
+                    records.append({'股票代码': stock_code, 'confirm_date': signal_date, 'pattern_type': name})
+    return pd.DataFrame(records, columns=['股票代码', 'confirm_date', 'pattern_type'])
+
+
+def load_signal_file(file_path, date_col='confirm_date', group_col='pattern_type'):
+    """读取信号文件（parquet/feather/csv/xlsx，同名的快速格式优先）；没有形态类型列时以文件名作为形态类型"""
+    signals = read_results(file_path, dtype={'股票代码': str})
+    if group_col not in signals.columns:
+        signals[group_col] = os.path.splitext(os.path.basename(file_path))[0]
+    signals[date_col] = pd.to_datetime(signals[date_col]).dt.strftime('%Y-%m-%d')
+    return signals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='形态信号事件研究（向后收益 / MAE / MFE）')
+    parser.add_argument('signal_files', nargs='*', help='信号文件（parquet/feather/csv/xlsx，需含 股票代码 与日期列）')
+    parser.add_argument('--n', action='store_true', help='加入全历史N型信号（N.py 规则）')
+    parser.add_argument('--detectors', action='store_true', help='加入 analyze_top_stocks_pattern 各形态检测信号（较慢）')
+    parser.add_argument('--date-col', default='confirm_date', help='信号文件中的日期列（默认 confirm_date）')
+    parser.add_argument('--step', type=int, default=20, help='形态检测的滑动步长（默认20根K线）')
+    parser.add_argument('--delay', type=int, default=None,
+                        help='入场延迟K线数，对所有信号生效（默认：信号文件和形态检测为0，N型为验证天数）')
+    args = parser.parse_args()
+
+    if not (args.signal_files or args.n or args.detectors):
+        parser.error('请至少指定一个信号文件，或使用 --n / --detectors')
+
+    data_dir = "./data"
+    panel = build_market_panel(data_dir)
+    bars = to_bar_axis(panel)
+    print(f"行情面板：{len(panel['codes'])} 只股票 × {len(panel['dates'])} 个交易日")
+
+    signal_tables = []
+    for file_path in args.signal_files:
+        signals = load_signal_file(file_path, args.date_col)
+        signals = signals[['股票代码', args.date_col, 'pattern_type']].rename(columns={args.date_col: 'confirm_date'})
+        signal_tables.append(signals.assign(entry_delay=0))
+    if args.n:
+        signal_tables.append(n_pattern_signals(panel).assign(entry_delay=N.CONFIG['验证天数']))
+    if args.detectors:
+        signal_tables.append(detector_signals(bars, step=args.step).assign(entry_delay=0))
+    signals = pd.concat(signal_tables, ignore_index=True)
+    if args.delay is not None:
+        signals['entry_delay'] = args.delay
+    print(f"信号总数：{len(signals)}")
+
+    events, by_pattern, by_month = event_study(signals, bars, delay=signals['entry_delay'].to_numpy())
+    print(f"可计算的事件：{len(events)}")
+    print("=" * 60)
+    print(by_pattern.to_string(index=False))
+
+    output_file = "形态事件研究结果.xlsx"
+    with pd.ExcelWriter(output_file) as writer:
+        by_pattern.to_excel(writer, sheet_name='按形态汇总', index=False)
+        by_month.to_excel(writer, sheet_name='按形态月份汇总', index=False)
+        events.to_excel(writer, sheet_name='事件明细', index=False)
+    print(f"\n事件研究结果已保存至：{output_file}")
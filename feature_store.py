@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from tdx_cache import CACHE_ENABLED, cache_paths
+
+# ===================== 每只股票的均线指标存储 =====================
+# ma5/ma10/ma20/ma60 与5日均量在各脚本里反复计算（单股分析、出图、形态细节……），
+# 这里按 FEATURES 声明的指标对每只股票的完整K线向量化计算一次，存放在日线缓存旁：
+#   <数据目录>/.tdx_cache/<代码>.features       行优先的 float64 矩阵（每行一根K线）
+#   <数据目录>/.tdx_cache/<代码>.features.json  源文件 mtime/size、行数、最后一根K线
+# 源文件只在末尾追加了新K线时（原最后一根K线的日期、收盘价、成交量都没变）只计算新增的行并追加写入；
+# 前复权调整等改动了历史数据时整体重算。每个窗口逐个求均值，增量与全量的结果逐位一致。
+# 各脚本的 load_and_clean_data 通过 attach_features 把指标列挂到K线上，之后的切片自带完整历史算出的均线。
+
+FEATURE_VERSION = 1
+
+# 指标名 → (源列, 窗口)
+FEATURES = {
+    'ma5': ('close', 5),
+    'ma10': ('close', 10),
+    'ma20': ('close', 20),
+    'ma60': ('close', 60),
+    'volume_ma5': ('volume', 5),
+}
+FEATURE_NAMES = list(FEATURES)
+
+
+def feature_paths(file_path):
+    """返回 (指标矩阵路径, 元信息路径)"""
+    bars_path, _ = cache_paths(file_path)
+    base = os.path.splitext(bars_path)[0]
+    return f'{base}.features', f'{base}.features.json'
+
+
+def rolling_mean(values, window):
+    """简单移动平均（前 window-1 个为NaN，窗口内有缺失值时为NaN，与 rolling(window).mean() 一致）"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def compute_features(df, names=None, start=0):
+    """
+    计算 df 第 start 行起的指标（向前取窗口所需的历史K线）
+    返回：(len(df) - start) × len(names) 的 float64 矩阵
+    """
+    names = names or FEATURE_NAMES
+    out = np.empty((len(df) - start, len(names)))
+    for j, name in enumerate(names):
+        column, window = FEATURES[name]
+        head = max(start - window + 1, 0)
+        out[:, j] = rolling_mean(df[column].to_numpy()[head:], window)[start - head:]
+    return out
+
+
+def _signature(file_path):
+    st = os.stat(file_path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'version': FEATURE_VERSION}
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _last_bar(df, idx):
+    """用于判断源文件是否只在末尾追加的K线指纹"""
+    row = df.iloc[idx]
+    return [str(row['date'].date()), float(row['close']), float(row['volume'])]
+
+
+def _read_matrix(data_path, meta):
+    rows, cols = meta['rows'], len(meta['names'])
+    if rows == 0:
+        return np.empty((0, cols))
+    return np.memmap(data_path, dtype=np.float64, mode='r', shape=(rows, cols))
+
+
+def _write_store(file_path, df, matrix, signature, append_from=None):
+    """写出指标矩阵；append_from 给出时只把第 append_from 行起的数据追加到已有文件"""
+    data_path, meta_path = feature_paths(file_path)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    if append_from is None:
+        tmp_path = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(matrix).tobytes())
+        os.replace(tmp_path, data_path)
+    else:
+        with open(data_path, 'r+b') as f:
+            # 截掉上次中断留下的多余字节，再在末尾追加
+            f.truncate(append_from * matrix.shape[1] * 8)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(matrix[append_from:]).tobytes())
+
+    # 元信息最后写入：它的存在即代表矩阵完整可用
+    meta = dict(signature, rows=len(df), names=FEATURE_NAMES,
+                last_bar=_last_bar(df, -1) if len(df) else None)
+    tmp_meta = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+
+
+def load_features(file_path, df):
+    """
+    返回与 df（该文件的完整K线）逐行对齐的全部指标矩阵
+    缓存有效时直接读取；源文件只追加了新K线时增量计算并追加；否则全量计算并重写
+    """
+    if not CACHE_ENABLED:
+        return compute_features(df)
+    signature = _signature(file_path)
+    data_path, meta_path = feature_paths(file_path)
+    meta = _read_meta(meta_path)
+    valid = meta is not None and meta.get('version') == FEATURE_VERSION and meta.get('names') == FEATURE_NAMES
+    try:
+        if valid and all(meta.get(k) == v for k, v in signature.items()) and meta['rows'] == len(df):
+            return np.array(_read_matrix(data_path, meta))
+
+        n_old = meta['rows'] if valid else 0
+        if 0 < n_old <= len(df) and meta['last_bar'] == _last_bar(df, n_old - 1):
+            # 先把已有部分复制出来，避免追加写入时文件仍被内存映射占用
+            matrix = np.concatenate([np.array(_read_matrix(data_path, meta)), compute_features(df, start=n_old)])
+            _write_store(file_path, df, matrix, signature, append_from=n_old)
+            return matrix
+    except (OSError, ValueError):
+        pass
+
+    matrix = compute_features(df)
+    try:
+        _write_store(file_path, df, matrix, signature)
+    except OSError:
+        pass  # 数据目录只读等情况下只计算不保存
+    return matrix
+
+
+def load_tail_features(file_path, df, names=None):
+    """
+    返回与 df（该文件最近一段K线）逐行对齐的指标矩阵（列为 names，默认全部）
+    缓存与源文件一致时截取末尾；否则只在 df 上计算所需指标（df 需自带足够的回看K线），不写缓存
+    """
+    names = names or FEATURE_NAMES
+    if CACHE_ENABLED and len(df):
+        meta = _read_meta(feature_paths(file_path)[1])
+        if (meta is not None and meta.get('names') == FEATURE_NAMES and meta['rows'] >= len(df)
+                and all(meta.get(k) == v for k, v in _signature(file_path).items())
+                and meta['last_bar'] == _last_bar(df, -1)):
+            try:
+                matrix = _read_matrix(feature_paths(file_path)[0], meta)[meta['rows'] - len(df):]
+                return np.array(matrix[:, [FEATURE_NAMES.index(name) for name in names]])
+            except (OSError, ValueError):
+                pass
+    return compute_features(df, names)
+
+
+def attach_features(file_path, df, names=None, tail=False):
+    """
+    把指标列挂到K线 DataFrame 上并返回新的 DataFrame（不修改传入的 df）
+    names：需要的指标（默认全部）；tail：df 只是最近一段K线时为 True
+    """
+    names = names or FEATURE_NAMES
+    if tail:
+        matrix = load_tail_features(file_path, df, names)
+    else:
+        matrix = load_features(file_path, df)[:, [FEATURE_NAMES.index(name) for name in names]]
+    features = pd.DataFrame(matrix, index=df.index, columns=names)
+    return pd.concat([df, features], axis=1)
@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+
+# ===================== 进程内K线LRU缓存 =====================
+# tdx_cache 解决的是「每次运行都要解析文本」，这里解决的是「同一次运行里反复读同一只股票」：
+# 扫描、出图、复核都经 load_cached_bars 读取，清洗后的DataFrame按 文件路径 + mtime/size 缓存在内存中，
+# 第二次读取直接返回。总内存按 FRAME_CACHE_MB（默认512MB）限制，超出时淘汰最久未用的条目；
+# 设置 FRAME_CACHE_MB=0 关闭。
+# 返回的是浅拷贝（pandas 写时复制），调用方增删列、修改数值都不会影响缓存中的数据。
+# 读写加锁，预取线程（见 prefetch）可以并发放入。
+
+DEFAULT_LIMIT_MB = 512
+
+
+class FrameCache:
+    """按内存上限淘汰的LRU缓存，带命中/未命中/淘汰计数"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # 路径 → (签名, DataFrame, 字节数)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def signature(file_path):
+        st = os.stat(file_path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, file_path, signature=None):
+        """命中时返回DataFrame的浅拷贝，否则返回None（源文件变动视为未命中）"""
+        key = os.path.abspath(file_path)
+        if signature is None and key in self.entries:
+            signature = self.signature(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] == signature:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1].copy(deep=False)
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, file_path, df, signature=None):
+        """放入缓存；单个条目超过上限时不缓存"""
+        if self.max_bytes <= 0:
+            return
+        key = os.path.abspath(file_path)
+        if signature is None:
+            signature = self.signature(file_path)
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (signature, df.copy(deep=False), nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, nbytes = self.entries.pop(key)
+        self.total_bytes -= nbytes
+
+    def discard(self, file_path):
+        """移除某个文件的条目（不存在时忽略）"""
+        key = os.path.abspath(file_path)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """当前计数：命中、未命中、淘汰、条目数、占用内存（MB）"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'memory_mb': round(self.total_bytes / (1024 * 1024), 1),
+        }
+
+
+FRAME_CACHE = FrameCache(int(float(os.environ.get('FRAME_CACHE_MB', DEFAULT_LIMIT_MB)) * 1024 * 1024))
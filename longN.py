@@ -1,16 +1,23 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 import os
 import glob
 import warnings
 import argparse
 from datetime import datetime, timedelta
+from tdx_cache import load_cached_bars
+from feature_store import attach_features
+from chart_render import get_pyplot, chart_figure, save_chart, render_charts
+from result_sinks import add_output_format_argument, parse_formats, write_results
+from scan_state import load_scan_state, save_scan_state, first_new_index, stock_state
+from profiling import stage, add_profile_argument, start_profiling, finish_profiling
+from prefetch import prefetch
 warnings.filterwarnings('ignore')
 
 # ===================== 设置matplotlib中文字体 =====================
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib中文字体（首次绘图时才导入pyplot并设置，见 chart_render.get_pyplot）
+CHART_FONTS = ['SimHei', 'Microsoft YaHei', 'SimSun']
 
 # ===================== 核心配置（可根据需求调整） =====================
 CONFIG = {
@@ -29,6 +36,7 @@ CONFIG = {
     "止盈倍数": 0.3,            # 止盈位=第一波涨幅×0.3+突破价
     "止损支撑比例": 0.02        # 止损位=横盘上沿×(1-2%)（容错2%）
 }
+POST_ZONE_DAYS = 10  # 横盘结束后观察放量的天数（横盘量能判定用）
 
 # ===================== 数据预处理函数 =====================
 def load_and_clean_data(file_path):
@@ -36,71 +44,11 @@ def load_and_clean_data(file_path):
     读取并标准化日线CSV数据（兼容中英文字段）
     支持常见字段名：日期/Date, 开盘/Open, 最高/High, 最低/Low, 收盘/Close, 成交量/Volume
     """
-    # 读取数据（尝试多种编码和分隔符）
-    encodings = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312']
-    separators = ['\t', ',']  # 优先尝试制表符
-    df = None
-    last_error = None
-    skip_rows = 0
-    temp_df = None
-    
-    # 首先尝试读取文件，检测是否需要跳过第一行（股票信息行）
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                temp_df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, nrows=2)
-                # 检查第一行的第一列是否为日期格式
-                first_col_value = str(temp_df.iloc[0, 0])
-                import re
-                date_pattern = r'^\d{4}[/\-]\d{2}[/\-]\d{2}$'
-                if not re.match(date_pattern, first_col_value):
-                    # 第一行不是日期，说明是股票信息，需要跳过
-                    skip_rows = 1
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if temp_df is not None:
-            break
-    
-    # 正式读取数据（使用检测到的skip_rows）
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding, comment='#', sep=sep, skiprows=skip_rows)
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                last_error = e
-                continue
-        if df is not None:
-            break
-    
-    if df is None:
-        raise ValueError(f"无法读取文件。尝试了以下编码：{encodings}，分隔符：{separators}。最后错误：{last_error}")
-    
-    # 清理列名：去除前后空格
-    df.columns = df.columns.str.strip()
-    
-    # 标准化字段名（兼容中英文）
-    col_mapping = {
-        '日期': 'date', 'Date': 'date',
-        '开盘': 'open', 'Open': 'open',
-        '最高': 'high', 'High': 'high',
-        '最低': 'low', 'Low': 'low',
-        '收盘': 'close', 'Close': 'close',
-        '成交量': 'volume', 'Volume': 'volume'
-    }
-    df.rename(columns=col_mapping, inplace=True)
-    
-    # 必要字段检查
-    required_cols = ['date', 'high', 'low', 'close', 'volume']
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        raise ValueError(f"数据缺少必要字段：{missing_cols}，请检查CSV格式")
+    # 读取数据（编码/分隔符/表头探测与解析见 tdx_loader，解析结果缓存见 tdx_cache）
+    df = load_cached_bars(file_path, required_cols=['date', 'high', 'low', 'close', 'volume'])
     
-    # 日期格式转换 & 排序
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
+    # 5日均量（放量缩量判定）取自指标存储（见 feature_store），按完整历史计算
+    df = attach_features(file_path, df, ['volume_ma5']).rename(columns={'volume_ma5': 'ma5_volume'})
     
     # 过滤最近五年的数据（当前系统时间减一天）
     end_date = datetime.now() - timedelta(days=1)
@@ -108,11 +56,25 @@ def load_and_clean_data(file_path):
     df = df[(df['date'] >= start_date) & (df['date'] <= end_date)].copy()
     df = df.reset_index(drop=True)
     
-    # 计算5日均量（放量缩量判定）
-    df['ma5_volume'] = df['volume'].rolling(window=5).mean()
-    
     return df
 
+def _prefix_volume(volume):
+    """成交量前缀和与有效计数前缀和（缺失值不计入，与pandas均值口径一致）"""
+    volume = np.asarray(volume)
+    if volume.dtype.kind in 'iu':
+        cum_sum = np.concatenate([[0], np.cumsum(volume)])
+        cum_cnt = np.arange(len(volume) + 1)
+    else:
+        valid = ~np.isnan(volume)
+        cum_sum = np.concatenate([[0.0], np.cumsum(np.where(valid, volume, 0.0))])
+        cum_cnt = np.concatenate([[0], np.cumsum(valid)])
+    return cum_sum, cum_cnt
+
+def _window_mean(cum_sum, cum_cnt, start_idx, stop_idx):
+    """半开区间 [start_idx, stop_idx) 的均值"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (cum_sum[stop_idx] - cum_sum[start_idx]) / (cum_cnt[stop_idx] - cum_cnt[start_idx])
+
 # ===================== 第一步：识别底部横盘区间 =====================
 def identify_bottom_consolidation(df):
     """
@@ -121,39 +83,43 @@ def identify_bottom_consolidation(df):
     """
     consolidation_zones = []
     df_len = len(df)
+    window = CONFIG['横盘最小天数']
     
-    # 滑动窗口遍历（窗口≥横盘最小天数）
-    for end_idx in range(CONFIG['横盘最小天数'], df_len):
-        start_idx = end_idx - CONFIG['横盘最小天数']
-        if start_idx < 0:
-            continue
-        
-        # 提取横盘区间数据
-        consolidation_df = df.iloc[start_idx:end_idx+1]
-        # 计算横盘关键指标
-        zone_low = consolidation_df['low'].min()    # 横盘下沿
-        zone_high = consolidation_df['high'].max()  # 横盘上沿
-        zone_mid = (zone_low + zone_high) / 2      # 横盘中轴
+    # 所有结束位置一次性计算（窗口 [end_idx-横盘最小天数, end_idx]，共 横盘最小天数+1 根K线）
+    end_idx_arr = np.arange(window, df_len)
+    if len(end_idx_arr) > 0:
+        start_idx_arr = end_idx_arr - window
+        # 横盘上下沿：滚动最值（单调队列，O(n)）
+        zone_low_arr = df['low'].rolling(window + 1, min_periods=1).min().to_numpy()[end_idx_arr]
+        zone_high_arr = df['high'].rolling(window + 1, min_periods=1).max().to_numpy()[end_idx_arr]
         # 波动幅度 = (上沿-下沿)/下沿
-        volatility = (zone_high - zone_low) / zone_low
-        # 横盘期日均量
-        avg_vol_consolidation = consolidation_df['volume'].mean()
-        # 后续10天日均量（对比量能）
-        post_zone_end = end_idx + 10 if end_idx + 10 < df_len else df_len
-        avg_vol_post = df.iloc[end_idx:post_zone_end]['volume'].mean() if post_zone_end > end_idx else avg_vol_consolidation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volatility_arr = (zone_high_arr - zone_low_arr) / zone_low_arr
+        # 横盘期日均量 & 后续10天日均量（前缀和求区间均值）
+        cum_sum, cum_cnt = _prefix_volume(df['volume'].to_numpy())
+        avg_vol_consolidation_arr = _window_mean(cum_sum, cum_cnt, start_idx_arr, end_idx_arr + 1)
+        post_zone_end_arr = np.minimum(end_idx_arr + POST_ZONE_DAYS, df_len)
+        avg_vol_post_arr = _window_mean(cum_sum, cum_cnt, end_idx_arr, post_zone_end_arr)
         
         # 横盘判定条件
-        if (volatility <= CONFIG['横盘最大波动幅度'] and
-            avg_vol_consolidation <= avg_vol_post * CONFIG['横盘量能阈值']):
+        hit = ((volatility_arr <= CONFIG['横盘最大波动幅度']) &
+               (avg_vol_consolidation_arr <= avg_vol_post_arr * CONFIG['横盘量能阈值']))
+        
+        date_str = df['date'].dt.strftime('%Y-%m-%d').to_numpy()
+        for k in np.flatnonzero(hit):
+            start_idx = int(start_idx_arr[k])
+            end_idx = int(end_idx_arr[k])
+            zone_low = zone_low_arr[k]
+            zone_high = zone_high_arr[k]
             # 记录横盘区间
             consolidation_info = {
-                'zone_start_date': df.iloc[start_idx]['date'].strftime('%Y-%m-%d'),
-                'zone_end_date': df.iloc[end_idx]['date'].strftime('%Y-%m-%d'),
+                'zone_start_date': date_str[start_idx],
+                'zone_end_date': date_str[end_idx],
                 'zone_low': round(zone_low, 2),
                 'zone_high': round(zone_high, 2),
-                'zone_mid': round(zone_mid, 2),
-                'volatility': round(volatility * 100, 2),
-                'avg_vol_consolidation': round(avg_vol_consolidation, 0),
+                'zone_mid': round((zone_low + zone_high) / 2, 2),
+                'volatility': round(volatility_arr[k] * 100, 2),
+                'avg_vol_consolidation': round(avg_vol_consolidation_arr[k], 0),
                 'start_idx': start_idx,
                 'end_idx': end_idx
             }
@@ -190,156 +156,160 @@ def identify_bottom_consolidation(df):
         return pd.DataFrame()
 
 # ===================== 第二步：识别横盘后的N型突破 =====================
-def identify_consolidation_n_breakout(df, consolidation_df):
+def _n_structure_features(df):
+    """
+    计算与横盘区间无关的逐K线N型特征（每只股票只算一次）
+    第k个元素对应 i=k+2：S1=i-2, H1=i-1, S2=i, H2=i+验证天数，且要求 H2+验证天数 < len(df)
+    """
+    verify_days = CONFIG['验证天数']
+    df_len = len(df)
+    idx = np.arange(2, max(2, df_len - 2 * verify_days))
+    
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
+    volume = df['volume'].to_numpy()
+    day_numbers = df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    
+    S1, H1, S2, H2 = low[idx - 2], high[idx - 1], low[idx], high[idx + verify_days]
+    first_wave = H1 - S1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retracement = (H1 - S2) / first_wave
+        break_through_rate = (H2 - H1) / H1
+    retracement_days = day_numbers[idx] - day_numbers[idx - 1]
+    
+    # 量能：前缀和求区间成交量（缺失值按0计）
+    if volume.dtype.kind in 'iu':
+        cum_volume = np.concatenate([[0], np.cumsum(volume)])
+    else:
+        cum_volume = np.concatenate([[0.0], np.nancumsum(volume)])
+    vol1 = cum_volume[idx] - cum_volume[idx - 2]                          # S1..H1
+    vol2 = cum_volume[idx + 1] - cum_volume[idx - 1]                      # H1..S2
+    vol3 = cum_volume[idx + verify_days + 1] - cum_volume[idx]            # S2..H2
+    ma5_vol_H1 = df['ma5_volume'].to_numpy()[idx - 1]
+    
+    # 验证期：H2起 验证天数+1 根K线的最低价
+    if len(idx) > 0:
+        verify_low = np.fmin.reduce(sliding_window_view(low, verify_days + 1)[idx + verify_days], axis=-1)
+    else:
+        verify_low = np.empty(0)
+    
+    # 与横盘区间无关的规则（第二、三、五、六、七步）
+    base_mask = ((S2 > S1) & (H2 > H1) &
+                 ~(first_wave <= 0) &
+                 ~(retracement > CONFIG['回调幅度阈值']) & ~(retracement_days > CONFIG['最大回调天数']) &
+                 ~(vol1 < ma5_vol_H1 * CONFIG['放量倍数']) &
+                 ~(vol2 > vol1 * CONFIG['缩量倍数']) &
+                 ~(vol3 < vol1) &
+                 ~(break_through_rate < CONFIG['突破确认幅度']) &
+                 ~(verify_low < H1))
+    
+    return {
+        'idx': idx, 'S1': S1, 'H1': H1, 'S2': S2, 'H2': H2,
+        'first_wave': first_wave, 'retracement': retracement, 'break_through_rate': break_through_rate,
+        'vol1': vol1, 'vol2': vol2, 'vol3': vol3, 'base_mask': base_mask
+    }
+
+def identify_consolidation_n_breakout(df, consolidation_df, new_from_idx=0):
     """
     在横盘区间基础上，识别后续的正N型突破
+    new_from_idx：新增K线的起始位置，只输出验证期用到新K线、或所在横盘区间用到新K线的形态（增量模式用，0为全量）
     返回：包含完整形态信息+入场/止损/止盈的DataFrame
     """
     breakout_results = []
     if consolidation_df.empty:
         return pd.DataFrame()
     
+    df_len = len(df)
+    verify_days = CONFIG['验证天数']
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
+    volume = df['volume'].to_numpy()
+    ma5_volume = df['ma5_volume'].to_numpy()
+    date_str = df['date'].dt.strftime('%Y-%m-%d').to_numpy()
+    features = _n_structure_features(df)
+    
     # 遍历每个横盘区间
     for _, zone in consolidation_df.iterrows():
         zone_end_idx = zone['end_idx']
         zone_high = zone['zone_high']
         zone_low = zone['zone_low']
+        support = zone_high * (1 - CONFIG['止损支撑比例'])
         # 只看横盘结束后的走势（预留验证天数）
         start_check_idx = zone_end_idx + 1
-        if start_check_idx + CONFIG['验证天数'] + 3 >= len(df):
+        if start_check_idx + verify_days + 3 >= df_len:
             continue
         
+        # 增量模式：横盘后量能窗口用到新增K线的区间可能是本次才成立、或被合并延长/抬高上沿的，
+        # 上次运行没有按现在的区间判定过，整段重新判定；其余区间与上次完全相同，只判定用到新K线的形态
+        zone_new_from = new_from_idx if zone_end_idx + POST_ZONE_DAYS <= new_from_idx else 0
+        
         # ===================== 新增：检测直接突破（不要求N型结构） =====================
-        for i in range(start_check_idx, len(df) - CONFIG['验证天数']):
-            # 检查当天是否突破横盘上沿
-            current_high = df.iloc[i]['high']
-            current_close = df.iloc[i]['close']
-            current_date = df.iloc[i]['date']
-            
-            # 突破条件：最高价突破横盘上沿，且突破幅度≥3%
-            if current_high > zone_high:
-                break_through_rate = (current_high - zone_high) / zone_high
-                if break_through_rate >= CONFIG['突破确认幅度']:
-                    # 新增检查：从横盘结束到突破前一天，不能有过失败的突破
-                    # 即：之前的最高价不能超过横盘上沿
-                    pre_breakout_high = df.iloc[start_check_idx:i]['high'].max()
-                    if pre_breakout_high >= zone_high:
-                        # 之前已经有过突破，跳过这次突破
-                        continue
-                    
-                    # 检查量能：突破当天放量
-                    current_volume = df.iloc[i]['volume']
-                    ma5_volume = df.iloc[i]['ma5_volume']
-                    
-                    if current_volume >= ma5_volume * CONFIG['放量倍数']:
-                        # 检查验证期是否站稳
-                        verify_end_idx = i + CONFIG['验证天数']
-                        if verify_end_idx >= len(df):
-                            continue
-                        verify_low = df.iloc[i:verify_end_idx+1]['low'].min()
-                        
-                        if verify_low >= zone_high * (1 - CONFIG['止损支撑比例']):
-                            # 计算第一波涨幅（从横盘低点到突破高点）
-                            first_wave = current_high - zone_low
-                            
-                            # 计算交易点位
-                            entry_price = round(current_high, 2)
-                            stop_loss_price = round(zone_high * (1 - CONFIG['止损支撑比例']), 2)
-                            take_profit_price = round(entry_price + first_wave * CONFIG['止盈倍数'], 2)
-                            
-                            # 记录直接突破信息
-                            breakout_info = {
-                                # 横盘区间信息
-                                'consolidation_start': zone['zone_start_date'],
-                                'consolidation_end': zone['zone_end_date'],
-                                'zone_low': zone['zone_low'],
-                                'zone_high': zone['zone_high'],
-                                # 直接突破关键点位（N型点位设为空或相同）
-                                'S1': round(zone_low, 2),  # 横盘低点作为S1
-                                'H1': round(current_high, 2),  # 突破高点作为H1
-                                'S2': round(zone_low, 2),  # 无回调，设为横盘低点
-                                'H2': round(current_high, 2),  # 突破高点作为H2
-                                'first_wave': round(first_wave, 2),
-                                'retracement_rate': 0.0,  # 直接突破无回调
-                                'break_through_rate': round(break_through_rate * 100, 2),
-                                # 量能信息
-                                'vol1': round(current_volume, 0),  # 突破量能
-                                'vol2': 0,  # 无回调量能
-                                'vol3': round(current_volume, 0),  # 突破量能
-                                # 交易点位
-                                'entry_price': entry_price,
-                                'stop_loss_price': stop_loss_price,
-                                'take_profit_price': take_profit_price,
-                                'profit_loss_ratio': round((take_profit_price - entry_price) / (entry_price - stop_loss_price), 2),
-                                # 确认日期
-                                'confirm_date': current_date.strftime('%Y-%m-%d')
-                            }
-                            breakout_results.append(breakout_info)
-                            break  # 找到一个直接突破后，跳出循环，避免重复
+        # 横盘结束后第一次触及上沿的K线是唯一候选：之后的K线都会因「之前已有过突破」被排除
+        touched = np.flatnonzero(high[start_check_idx:df_len - verify_days] >= zone_high)
+        # 验证期最后一根K线（i+验证天数）早于新增K线的，上次运行已经判定过
+        if len(touched) > 0 and start_check_idx + touched[0] + verify_days >= zone_new_from:
+            i = start_check_idx + touched[0]
+            current_high = high[i]
+            break_through_rate = (current_high - zone_high) / zone_high
+            # 突破条件：最高价突破横盘上沿且幅度达标，突破当天放量，验证期站稳
+            if (current_high > zone_high and
+                break_through_rate >= CONFIG['突破确认幅度'] and
+                volume[i] >= ma5_volume[i] * CONFIG['放量倍数'] and
+                np.fmin.reduce(low[i:i + verify_days + 1]) >= support):
+                # 计算第一波涨幅（从横盘低点到突破高点）
+                first_wave = current_high - zone_low
+                
+                # 计算交易点位
+                entry_price = round(current_high, 2)
+                stop_loss_price = round(support, 2)
+                take_profit_price = round(entry_price + first_wave * CONFIG['止盈倍数'], 2)
+                
+                # 记录直接突破信息
+                breakout_info = {
+                    # 横盘区间信息
+                    'consolidation_start': zone['zone_start_date'],
+                    'consolidation_end': zone['zone_end_date'],
+                    'zone_low': zone['zone_low'],
+                    'zone_high': zone['zone_high'],
+                    # 直接突破关键点位（N型点位设为空或相同）
+                    'S1': round(zone_low, 2),  # 横盘低点作为S1
+                    'H1': round(current_high, 2),  # 突破高点作为H1
+                    'S2': round(zone_low, 2),  # 无回调，设为横盘低点
+                    'H2': round(current_high, 2),  # 突破高点作为H2
+                    'first_wave': round(first_wave, 2),
+                    'retracement_rate': 0.0,  # 直接突破无回调
+                    'break_through_rate': round(break_through_rate * 100, 2),
+                    # 量能信息
+                    'vol1': round(volume[i], 0),  # 突破量能
+                    'vol2': 0,  # 无回调量能
+                    'vol3': round(volume[i], 0),  # 突破量能
+                    # 交易点位
+                    'entry_price': entry_price,
+                    'stop_loss_price': stop_loss_price,
+                    'take_profit_price': take_profit_price,
+                    'profit_loss_ratio': round((take_profit_price - entry_price) / (entry_price - stop_loss_price), 2),
+                    # 确认日期
+                    'confirm_date': date_str[i]
+                }
+                breakout_results.append(breakout_info)
         
-        # 滑动窗口找N型结构（S1→H1→S2→H2）
-        for i in range(start_check_idx, len(df) - CONFIG['验证天数']):
-            # 定义N型关键点位索引
-            S1_idx = i - 2
-            H1_idx = i - 1
-            S2_idx = i
-            H2_idx = i + CONFIG['验证天数']
-            if H2_idx >= len(df):
-                continue
-            
-            # 提取关键点位价格
-            S1 = df.iloc[S1_idx]['low']    # 波谷1（横盘突破后的回调低点）
-            H1 = df.iloc[H1_idx]['high']    # 波峰1（横盘突破后的第一高点）
-            S2 = df.iloc[S2_idx]['low']    # 波谷2（回调低点）
-            H2 = df.iloc[H2_idx]['high']    # 波峰2（突破高点）
-            
-            # 第一步：判定是否突破横盘上沿
-            if H1 <= zone_high:
-                continue  # 未突破横盘上沿，跳过
-            
-            # 第二步：正N型高低点规则
-            if not (S2 > S1 and H2 > H1):
-                continue
-            
-            # 第三步：回调幅度&时间规则
-            first_wave = H1 - S1  # 第一波涨幅
-            if first_wave <= 0:
-                continue
-            retracement = (H1 - S2) / first_wave  # 回调幅度
-            retracement_days = (df.iloc[S2_idx]['date'] - df.iloc[H1_idx]['date']).days  # 回调天数
-            if retracement > CONFIG['回调幅度阈值'] or retracement_days > CONFIG['最大回调天数']:
-                continue
-            
-            # 第四步：回调不跌破横盘上沿（核心支撑）
-            if S2 < zone_high * (1 - CONFIG['止损支撑比例']):
-                continue
-            
-            # 第五步：量能规则（放量突破→缩量回调→再次放量）
-            vol1 = df.iloc[S1_idx:H1_idx+1]['volume'].sum()  # 第一波量能
-            vol2 = df.iloc[H1_idx:S2_idx+1]['volume'].sum()  # 回调量能
-            vol3 = df.iloc[S2_idx:H2_idx+1]['volume'].sum()  # 突破量能
-            ma5_vol_H1 = df.iloc[H1_idx]['ma5_volume']       # 波峰1的5日均量
-            if (vol1 < ma5_vol_H1 * CONFIG['放量倍数'] or
-                vol2 > vol1 * CONFIG['缩量倍数'] or
-                vol3 < vol1):
-                continue
-            
-            # 第六步：突破确认幅度（H2突破H1≥3%）
-            break_through_rate = (H2 - H1) / H1
-            if break_through_rate < CONFIG['突破确认幅度']:
-                continue
-            
-            # 第七步：验证期站稳（H2后3天不跌破H1）
-            verify_end_idx = H2_idx + CONFIG['验证天数']
-            if verify_end_idx >= len(df):
-                continue
-            verify_low = df.iloc[H2_idx:verify_end_idx+1]['low'].min()
-            if verify_low < H1:
-                continue
+        # 正N型结构（S1→H1→S2→H2）：在预先算好的逐K线特征上叠加区间相关规则
+        # 形态最后一根K线为 H2+验证天数 = k+2+2×验证天数
+        k0 = max(start_check_idx - 2, zone_new_from - 2 - 2 * verify_days, 0)
+        H1 = features['H1'][k0:]
+        S2 = features['S2'][k0:]
+        zone_mask = (features['base_mask'][k0:] &
+                     ~(H1 <= zone_high) &     # 第一步：H1突破横盘上沿
+                     ~(S2 < support))         # 第四步：回调不跌破横盘上沿（核心支撑）
+        
+        for k in k0 + np.flatnonzero(zone_mask):
+            H2_idx = features['idx'][k] + verify_days
+            S1, H1, S2, H2 = features['S1'][k], features['H1'][k], features['S2'][k], features['H2'][k]
+            first_wave = features['first_wave'][k]
             
             # ===================== 计算入场/止损/止盈点位 =====================
             entry_price = round(H2, 2)                          # 入场价（突破确认价）
-            stop_loss_price = round(zone_high * (1 - CONFIG['止损支撑比例']), 2)  # 止损价（横盘上沿-1%）
+            stop_loss_price = round(support, 2)                 # 止损价（横盘上沿-1%）
             take_profit_price = round(entry_price + first_wave * CONFIG['止盈倍数'], 2)  # 止盈价
             
             # 记录完整形态信息
@@ -355,19 +325,19 @@ def identify_consolidation_n_breakout(df, consolidation_df):
                 'S2': round(S2, 2),
                 'H2': round(H2, 2),
                 'first_wave': round(first_wave, 2),
-                'retracement_rate': round(retracement * 100, 2),
-                'break_through_rate': round(break_through_rate * 100, 2),
+                'retracement_rate': round(features['retracement'][k] * 100, 2),
+                'break_through_rate': round(features['break_through_rate'][k] * 100, 2),
                 # 量能信息
-                'vol1': round(vol1, 0),
-                'vol2': round(vol2, 0),
-                'vol3': round(vol3, 0),
+                'vol1': round(features['vol1'][k], 0),
+                'vol2': round(features['vol2'][k], 0),
+                'vol3': round(features['vol3'][k], 0),
                 # 交易点位
                 'entry_price': entry_price,
                 'stop_loss_price': stop_loss_price,
                 'take_profit_price': take_profit_price,
                 'profit_loss_ratio': round((take_profit_price - entry_price) / (entry_price - stop_loss_price), 2),
                 # 确认日期
-                'confirm_date': df.iloc[H2_idx]['date'].strftime('%Y-%m-%d')
+                'confirm_date': date_str[H2_idx]
             }
             breakout_results.append(breakout_info)
     
@@ -378,8 +348,8 @@ def identify_consolidation_n_breakout(df, consolidation_df):
         return pd.DataFrame()
 
 # ===================== 可视化函数（标注横盘+N型+交易点位） =====================
-def plot_consolidation_n_breakout(df, breakout_df):
-    """可视化识别到的「底部横盘+N型突破」形态（展示第一个有效形态）"""
+def plot_consolidation_n_breakout(df, breakout_df, output_path=None):
+    """可视化识别到的「底部横盘+N型突破」形态（展示第一个有效形态；给出 output_path 时保存为图片而不弹窗）"""
     if breakout_df.empty:
         print("无有效「底部横盘+N型突破」形态，跳过可视化")
         return
@@ -392,7 +362,8 @@ def plot_consolidation_n_breakout(df, breakout_df):
     plot_df = df[(df['date'] >= consolidation_start) & (df['date'] <= confirm_date)].copy()
     
     # 绘图
-    fig, ax = plt.subplots(figsize=(14, 8))
+    plt = get_pyplot(CHART_FONTS)
+    fig, ax = chart_figure('consolidation_n_breakout', figsize=(14, 8))
     
     # 1. 绘制价格走势
     ax.plot(plot_df['date'], plot_df['close'], color='black', linewidth=1, label='收盘价')
@@ -439,6 +410,8 @@ def plot_consolidation_n_breakout(df, breakout_df):
     ax.grid(True, alpha=0.3)
     plt.xticks(rotation=45)
     plt.tight_layout()
+    if output_path:
+        return save_chart(fig, output_path)
     plt.show()
 
 # ===================== 主函数（执行流程） =====================
@@ -446,7 +419,17 @@ if __name__ == "__main__":
     # -------------------- 命令行参数解析 --------------------
     parser = argparse.ArgumentParser(description='底部横盘+N型突破形态识别程序')
     parser.add_argument('-f', '--file', type=str, help='指定要处理的单个文件（文件名，如：000001.txt）')
+    parser.add_argument('-i', '--incremental', action='store_true', help='增量模式：只扫描上次运行后新增的K线，只输出新确认的形态')
+    parser.add_argument('--charts', type=int, default=0, help='把前N个突破形态并行渲染为PNG（保存到 breakout_charts/，不弹窗）')
+    add_output_format_argument(parser)
+    add_profile_argument(parser)
     args = parser.parse_args()
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.profile:
+        start_profiling()
     
     # -------------------- 获取要处理的文件列表 --------------------
     data_dir = "./data"
@@ -467,24 +450,41 @@ if __name__ == "__main__":
             exit(1)
         print(f"找到{len(txt_files)}个数据文件")
     
+    # 增量模式：读取上次扫描到的日期（横盘区间每次基于完整数据重新识别，只有突破判定限定在新增K线及用到新K线的横盘区间上）
+    scan_state = load_scan_state(data_dir, 'longN') if args.incremental else {}
+    if args.incremental:
+        print(f"增量模式：{len(scan_state)} 只股票有扫描记录")
+    
     print("=" * 60)
     
     # -------------------- 循环处理所有文件 --------------------
     all_breakout_results = []
+    breakout_frames = {}  # --charts 出图用的K线，避免重新读取文件
     success_count = 0
     
-    for idx, file_path in enumerate(txt_files, 1):
+    for idx, (file_path, loaded) in enumerate(prefetch(txt_files, load_and_clean_data), 1):
         stock_code = os.path.basename(file_path).replace('.txt', '')
         print(f"\n[{idx}/{len(txt_files)}] 处理文件：{stock_code}.txt")
         print("-" * 60)
         
+        new_state = None  # 本只股票处理完且未出错时才写入扫描记录，出错的股票下次仍从原日期重扫
         try:
             # 步骤1：读取并清洗数据
-            df = load_and_clean_data(file_path)
+            with stage('load_and_clean_data', stock_code):
+                df = loaded.result()
             print(f"  数据读取完成，共{len(df)}条日线记录")
             
+            new_from_idx = 0
+            if args.incremental:
+                new_from_idx = first_new_index(df, scan_state.get(stock_code, {}).get('last_date'))
+                print(f"  新增{len(df) - new_from_idx}条日线记录")
+                new_state = stock_state(df)
+                if new_from_idx >= len(df):
+                    continue
+            
             # 步骤2：识别底部横盘区间
-            consolidation_df = identify_bottom_consolidation(df)
+            with stage('identify_bottom_consolidation', stock_code):
+                consolidation_df = identify_bottom_consolidation(df)
             if consolidation_df.empty:
                 print(f"  未识别到符合条件的底部横盘区间")
                 continue
@@ -492,7 +492,8 @@ if __name__ == "__main__":
             print(f"  识别到{len(consolidation_df)}个底部横盘区间")
             
             # 步骤3：识别横盘后的N型突破
-            breakout_df = identify_consolidation_n_breakout(df, consolidation_df)
+            with stage('identify_consolidation_n_breakout', stock_code):
+                breakout_df = identify_consolidation_n_breakout(df, consolidation_df, new_from_idx)
             if breakout_df.empty:
                 print(f"  未识别到有效「底部横盘+N型突破」形态")
                 continue
@@ -504,11 +505,20 @@ if __name__ == "__main__":
             
             # 收集结果
             all_breakout_results.append(breakout_df)
+            if args.charts:
+                breakout_frames[stock_code] = df
             success_count += 1
             
         except Exception as e:
             print(f"  处理失败：{str(e)}")
+            new_state = None
             continue
+        finally:
+            if new_state is not None:
+                scan_state[stock_code] = new_state
+    
+    if args.incremental:
+        save_scan_state(data_dir, 'longN', scan_state)
     
     # -------------------- 汇总并保存结果 --------------------
     print("\n" + "=" * 60)
@@ -549,13 +559,33 @@ if __name__ == "__main__":
         print("\n前10个突破形态：")
         print(all_breakout_df[core_fields].head(10).to_string(index=False))
         
-        # 保存结果到Excel
+        # 保存结果（格式由 --output-format 指定，默认xlsx）
         output_file = "底部横盘+N型突破识别结果.xlsx"
-        all_breakout_df.to_excel(output_file, index=False)
-        print(f"\n识别结果已保存至：{output_file}")
+        if args.incremental:
+            # 增量结果单独保存，不覆盖全量结果
+            output_file = f"底部横盘+N型突破识别结果_增量_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        with stage('write_results'):
+            output_files = write_results(all_breakout_df, output_file, output_formats)
+        print(f"\n识别结果已保存至：{'、'.join(output_files)}")
         
-        # 可视化第一个有效形态
-        if not all_breakout_df.empty:
+        if args.charts:
+            # 并行渲染前N个形态的图表
+            charts_dir = 'breakout_charts'
+            os.makedirs(charts_dir, exist_ok=True)
+            jobs = []
+            for k in range(min(args.charts, len(all_breakout_df))):
+                row = all_breakout_df.iloc[[k]]
+                stock_code = row['股票代码'].iloc[0]
+                chart_path = os.path.join(charts_dir, f"{stock_code.replace('#', '_')}_{row['confirm_date'].iloc[0]}.png")
+                jobs.append((plot_consolidation_n_breakout, breakout_frames[stock_code], row, chart_path))
+            with stage('render_charts'):
+                results = render_charts(jobs)
+            failed = [(job[2]['股票代码'].iloc[0], error) for job, (_, error) in zip(jobs, results) if error is not None]
+            for stock_code, error in failed:
+                print(f"  {stock_code}: 图表生成失败 - {error}")
+            print(f"已生成 {len(jobs) - len(failed)} 张形态图表，保存在 {charts_dir}/ 目录")
+        elif not all_breakout_df.empty:
+            # 可视化第一个有效形态
             first_stock_code = all_breakout_df.iloc[0]['股票代码']
             first_file = os.path.join(data_dir, f"{first_stock_code}.txt")
             df_first = load_and_clean_data(first_file)
@@ -564,4 +594,7 @@ if __name__ == "__main__":
             first_breakout = all_breakout_df[all_breakout_df['股票代码'] == first_stock_code].iloc[[0]]
             plot_consolidation_n_breakout(df_first, first_breakout)
     else:
-        print("\n未在任何股票中识别到有效「底部横盘+N型突破」形态")
\ No newline at end of file
+        print("\n未在任何股票中识别到有效「底部横盘+N型突破」形态")
+    
+    if args.profile:
+        print(f"\n性能剖析结果：{'、'.join(finish_profiling(args.profile))}")
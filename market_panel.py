@@ -0,0 +1,288 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+from tdx_cache import load_cached_bars
+import N
+import longN
+from rolling_channel import CHANNEL_WINDOW, CHANNEL_MAX_STD_RATIO, rolling_channel, channel_mask
+
+# ===================== 全市场面板（日期 × 股票） =====================
+# 把 ./data 下所有股票按共同交易日历对齐为二维数组（行=交易日，列=股票），停牌/未上市处为NaN，valid 标记有效K线。
+# N.py / longN.py 的核心规则在面板上沿股票轴一次性向量化计算，替代逐只股票的 DataFrame 调用。
+# 形态规则按「相邻K线」定义（停牌日不算K线），因此扫描前先用 to_bar_axis 把每只股票的K线连续排列，
+# 结果与逐股扫描完全一致。
+
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+KEY_STRIDE = 1 << 32  # (列, 日期) 组合编码的列间距
+
+
+def build_market_panel(data_dir='./data', start_date=None, end_date=None, files=None):
+    """
+    读取所有股票并按共同交易日历对齐
+    start_date/end_date：可选的日期范围（闭区间）
+    返回：dict（dates[T], codes[S], open/high/low/close/volume[T×S] 浮点数组, valid[T×S] 布尔数组）
+    """
+    if files is None:
+        files = sorted(glob.glob(os.path.join(data_dir, "*.txt")))
+
+    codes, frames = [], []
+    for file_path in files:
+        try:
+            df = load_cached_bars(file_path, required_cols=['date', 'high', 'low', 'close', 'volume'])
+        except (ValueError, pd.errors.ParserError):
+            continue
+        if start_date is not None:
+            df = df[df['date'] >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            df = df[df['date'] <= pd.Timestamp(end_date)]
+        if len(df) == 0:
+            continue
+        codes.append(os.path.basename(file_path).replace('.txt', ''))
+        frames.append(df)
+
+    if frames:
+        dates = np.unique(np.concatenate([df['date'].to_numpy() for df in frames]))
+    else:
+        dates = np.empty(0, dtype='datetime64[ns]')
+    shape = (len(dates), len(frames))
+    panel = {'dates': dates, 'codes': np.array(codes, dtype=object), 'valid': np.zeros(shape, dtype=bool)}
+    for field in PANEL_FIELDS:
+        panel[field] = np.full(shape, np.nan)
+
+    for j, df in enumerate(frames):
+        rows = np.searchsorted(dates, df['date'].to_numpy())
+        panel['valid'][rows, j] = True
+        for field in PANEL_FIELDS:
+            if field in df.columns:
+                panel[field][rows, j] = df[field].to_numpy()
+    return panel
+
+
+def to_bar_axis(panel):
+    """
+    把日历对齐的面板转换为按K线序号对齐：每只股票的有效K线连续排列并靠下对齐（最后一根K线都在最后一行），
+    上方空位为NaN/NaT；dates 变为 T×S 二维数组
+    """
+    valid = panel['valid']
+    # 稳定排序：无效行排在前面，有效行保持原有先后顺序
+    order = np.argsort(valid, axis=0, kind='stable')
+    bars = {'codes': panel['codes'], 'valid': np.take_along_axis(valid, order, axis=0)}
+    for field in PANEL_FIELDS:
+        bars[field] = np.take_along_axis(panel[field], order, axis=0)
+    bars['dates'] = np.where(bars['valid'], panel['dates'][order], np.datetime64('NaT'))
+    return bars
+
+
+def _mask_bars(bars, keep):
+    """只保留 keep 为True的K线（其余置为NaN/NaT），返回新的dict"""
+    out = dict(bars, valid=bars['valid'] & keep)
+    for field in PANEL_FIELDS:
+        out[field] = np.where(out['valid'], bars[field], np.nan)
+    out['dates'] = np.where(out['valid'], bars['dates'], np.datetime64('NaT'))
+    return out
+
+
+def _shift_down(arr, k):
+    """沿第0轴下移k行，上方补NaN"""
+    shifted = np.full_like(arr, np.nan)
+    shifted[k:] = arr[:-k]
+    return shifted
+
+
+def rolling_extreme(arr, window, reducer=np.fmin):
+    """
+    沿第0轴的滚动最值（缺失值忽略，与 rolling(window, min_periods=1) 一致）
+    倍增法：log2(window) 次整块数组比较，不逐列循环
+    """
+    out = arr
+    span = 1
+    while span * 2 <= window:
+        out = reducer(out, _shift_down(out, span))
+        span *= 2
+    if span < window:
+        out = reducer(out, _shift_down(out, window - span))
+    return out
+
+
+def rolling_mean(arr, window):
+    """沿第0轴的滚动均值（窗口内有缺失值时为NaN，与 rolling(window).mean() 一致）"""
+    valid = ~np.isnan(arr)
+    zeros = np.zeros((1,) + arr.shape[1:])
+    cum_sum = np.concatenate([zeros, np.cumsum(np.where(valid, arr, 0.0), axis=0)])
+    cum_cnt = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    out = np.full(arr.shape, np.nan)
+    window_sum = cum_sum[window:] - cum_sum[:-window]
+    window_cnt = cum_cnt[window:] - cum_cnt[:-window]
+    out[window - 1:] = np.where(window_cnt == window, window_sum / window, np.nan)
+    return out
+
+
+# ===================== 信号定位与向后取数 =====================
+def locate_signals(bars, codes, dates):
+    """
+    把 (股票代码, 日期) 映射到按K线序号对齐的面板位置（一次二分查找完成全部信号）
+    返回：(行号, 列号, 是否找到)
+    """
+    code_index = {code: j for j, code in enumerate(bars['codes'])}
+    cols = np.array([code_index.get(code, -1) for code in codes], dtype=np.int64)
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    # 有效K线按 (列, 日期) 编码，按列优先展开后天然有序
+    valid_cols, valid_rows = np.nonzero(bars['valid'].T)
+    valid_days = bars['dates'][valid_rows, valid_cols].astype('datetime64[D]').astype(np.int64)
+    keys = valid_cols * KEY_STRIDE + valid_days
+    signal_keys = cols * KEY_STRIDE + days
+
+    pos = np.minimum(np.searchsorted(keys, signal_keys), max(len(keys) - 1, 0))
+    found = (cols >= 0) & (len(keys) > 0)
+    if len(keys):
+        found &= keys[pos] == signal_keys
+        rows = valid_rows[pos]
+    else:
+        rows = np.zeros(len(cols), dtype=np.int64)
+    return rows, cols, found
+
+
+def gather_forward(arr, rows, cols, horizon):
+    """取出每个信号之后 1..horizon 根K线的数据，超出数据末尾的位置为NaN；返回 (信号数 × horizon)"""
+    offsets = np.arange(1, horizon + 1)
+    fwd_rows = rows[:, None] + offsets
+    in_range = fwd_rows < arr.shape[0]
+    values = arr[np.minimum(fwd_rows, arr.shape[0] - 1), cols[:, None]]
+    return np.where(in_range, values, np.nan)
+
+
+# ===================== N型（N.py 规则） =====================
+def scan_n_patterns(panel, pattern_type='positive', config=None):
+    """
+    全市场识别正N型（positive）/反N型（negative），口径与 N.identify_n_pattern 逐股扫描一致：
+    每只股票只看自身最后一根K线往前 分析周期月数 的数据，5日均量用区间之前的K线补足窗口
+    返回：包含股票代码的N型结果DataFrame（按股票、确认日期排序）
+    """
+    if config is None:
+        config = N.CONFIG
+    bars = to_bar_axis(panel)
+
+    # 5日均量在截取前计算（与 N.load_and_clean_data 的回看一致），再每只股票截取最近N个月
+    ma5_volume = rolling_mean(bars['volume'], N.MA_VOLUME_WINDOW)
+    last_date = pd.DatetimeIndex(bars['dates'][-1]) if len(bars['dates']) else pd.DatetimeIndex([])
+    start_date = (last_date - pd.DateOffset(months=config['分析周期月数'])).to_numpy()
+    bars = _mask_bars(bars, bars['dates'] >= start_date)
+    ma5_volume = np.where(bars['valid'], ma5_volume, np.nan)
+    features = N.compute_n_pattern_features(
+        bars['low'], bars['high'], bars['close'], bars['volume'], ma5_volume, bars['dates'],
+        pattern_type=pattern_type, verify_days=config['验证天数'])
+    # 窗口起点必须是有效K线（有效K线靠下连续排列，起点有效即整段有效）
+    mask = N.n_pattern_mask(features, pattern_type, config) & bars['valid'][features['S1_idx']]
+
+    cols, rows = np.nonzero(mask.T)  # 按股票、窗口先后排列
+    if len(rows) == 0:
+        return pd.DataFrame()
+    pick = {k: (v[rows] if v.ndim == 1 else v[rows, cols]) for k, v in features.items()}
+    dates = bars['dates']
+    n_patterns = N.build_n_pattern_frame(
+        pick, dates[pick['H1_idx'], cols], dates[pick['H2_idx'], cols],
+        dates[pick['S2_idx'], cols], bars['close'][pick['S2_idx'], cols], pattern_type)
+    n_patterns['股票代码'] = bars['codes'][cols]
+    return n_patterns
+
+
+# ===================== 底部横盘（longN.py 规则） =====================
+def scan_bottom_consolidation(panel, config=None):
+    """
+    全市场识别底部横盘区间，口径与 longN.identify_bottom_consolidation 逐股扫描一致
+    （面板应按 longN 的五年区间构建）；start_idx/end_idx 为股票自身K线序号，可直接用于逐股突破判定
+    返回：包含股票代码的横盘区间DataFrame（按股票、开始日期排序，重叠区间已合并）
+    """
+    if config is None:
+        config = longN.CONFIG
+    bars = to_bar_axis(panel)
+    window = config['横盘最小天数']
+    n_rows = len(bars['dates'])
+    first_row = n_rows - bars['valid'].sum(axis=0)  # 每只股票第一根K线所在行
+    pos = np.arange(n_rows)[:, None] - first_row    # 股票自身K线序号
+
+    # 横盘上下沿与波动幅度（窗口 [t-横盘最小天数, t]）
+    zone_low = rolling_extreme(bars['low'], window + 1, np.fmin)
+    zone_high = rolling_extreme(bars['high'], window + 1, np.fmax)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility = (zone_high - zone_low) / zone_low
+
+    # 横盘期日均量 & 后续10天日均量（缺失值不计入均值，与 longN._window_mean 一致）
+    volume = bars['volume']
+    has_volume = ~np.isnan(volume)
+    zeros = np.zeros((1, volume.shape[1]))
+    cum_volume = np.concatenate([zeros, np.cumsum(np.where(has_volume, volume, 0.0), axis=0)])
+    cum_count = np.concatenate([zeros, np.cumsum(has_volume, axis=0)])
+    end_rows = np.arange(n_rows)
+    start_rows = np.maximum(end_rows - window, 0)
+    post_rows = np.minimum(end_rows + longN.POST_ZONE_DAYS, n_rows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_vol_consolidation = ((cum_volume[end_rows + 1] - cum_volume[start_rows]) /
+                                 (cum_count[end_rows + 1] - cum_count[start_rows]))
+        avg_vol_post = ((cum_volume[post_rows] - cum_volume[end_rows]) /
+                        (cum_count[post_rows] - cum_count[end_rows]))
+
+    hit = ((pos >= window) &
+           (volatility <= config['横盘最大波动幅度']) &
+           (avg_vol_consolidation <= avg_vol_post * config['横盘量能阈值']))
+
+    cols, rows = np.nonzero(hit.T)
+    if len(rows) == 0:
+        return pd.DataFrame()
+
+    # 合并重叠区间：同一股票内，后一区间开始（t-横盘最小天数）不晚于前一区间结束即合并
+    new_zone = np.ones(len(rows), dtype=bool)
+    new_zone[1:] = (cols[1:] != cols[:-1]) | (rows[1:] - window > rows[:-1])
+    starts = np.flatnonzero(new_zone)
+    ends = np.append(starts[1:], len(rows)) - 1
+    merged = ends > starts
+
+    low_hit = np.round(zone_low[rows, cols], 2)
+    high_hit = np.round(zone_high[rows, cols], 2)
+    z_low = np.minimum.reduceat(low_hit, starts)
+    z_high = np.maximum.reduceat(high_hit, starts)
+    first_rows, first_cols = rows[starts], cols[starts]
+    last_rows = rows[ends]
+    single_mid = np.round((zone_low[first_rows, first_cols] + zone_high[first_rows, first_cols]) / 2, 2)
+    single_volatility = np.round(volatility[first_rows, first_cols] * 100, 2)
+
+    dates = bars['dates']
+    return pd.DataFrame({
+        '股票代码': bars['codes'][first_cols],
+        'zone_start_date': pd.DatetimeIndex(dates[first_rows - window, first_cols]).strftime('%Y-%m-%d'),
+        'zone_end_date': pd.DatetimeIndex(dates[last_rows, first_cols]).strftime('%Y-%m-%d'),
+        'zone_low': z_low,
+        'zone_high': z_high,
+        'zone_mid': np.where(merged, (z_low + z_high) / 2, single_mid),
+        'volatility': np.where(merged, np.round((z_high - z_low) / z_low * 100, 2), single_volatility),
+        'avg_vol_consolidation': np.round(avg_vol_consolidation[first_rows, first_cols], 0),
+        'start_idx': (first_rows - window - first_row[first_cols]).astype(int),
+        'end_idx': (last_rows - first_row[first_cols]).astype(int),
+    })
+
+
+# ===================== 上升/下降通道（rolling_channel） =====================
+def scan_channels(panel, direction='rising', window=CHANNEL_WINDOW, max_std_ratio=CHANNEL_MAX_STD_RATIO):
+    """
+    全市场、全历史的通道进入点：每根K线往前 window 根的收盘价回归，
+    前一根K线的窗口不是通道、这一根是，记为一次进入（判定口径同各脚本的 detect_rising_channel）
+    返回：DataFrame（股票代码, date, close, slope, resid_std, std_ratio），按股票、日期排序
+    """
+    bars = to_bar_axis(panel)
+    fit = rolling_channel(bars['close'], window)
+    mask = channel_mask(fit, direction, max_std_ratio)
+    entry = mask & ~np.concatenate([np.zeros((1, mask.shape[1]), dtype=bool), mask[:-1]])
+
+    cols, rows = np.nonzero(entry.T)
+    if len(rows) == 0:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        '股票代码': bars['codes'][cols],
+        'date': pd.DatetimeIndex(bars['dates'][rows, cols]).strftime('%Y-%m-%d'),
+        'close': bars['close'][rows, cols],
+        'slope': fit['slope'][rows, cols],
+        'resid_std': fit['resid_std'][rows, cols],
+        'std_ratio': fit['resid_std'][rows, cols] / fit['mean'][rows, cols],
+    })
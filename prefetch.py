@@ -0,0 +1,62 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ===================== 读数预取流水线 =====================
+# 逐文件循环原本是「读一个 → 算一个 → 再读下一个」，磁盘/网络与CPU交替空闲。
+# prefetch 用线程池提前读取并解析后面的文件，主线程同时跑识别逻辑：
+#   按输入顺序逐个交出 (文件, Future)，调用方在自己的 try 中调用 .result() 取数，
+#   读取出错时异常在 .result() 处抛出，与直接调用读取函数的行为一致；
+#   同时在途（已提交未取走）的任务数不超过 depth，主线程处理慢时不再提交新任务，内存有上界。
+# 适合网络盘等延迟高、带宽够的数据目录。线程数由 PREFETCH_WORKERS 控制（默认4），
+# 设置为0关闭预取，退化为在 .result() 时同步读取。
+
+DEFAULT_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 4))
+_DONE = object()
+
+
+class _Deferred:
+    """关闭预取时的占位：result() 时才同步读取"""
+
+    def __init__(self, loader, item):
+        self.loader = loader
+        self.item = item
+
+    def result(self):
+        return self.loader(self.item)
+
+
+def prefetch(items, loader, workers=None, depth=None):
+    """
+    按顺序交出 (item, future)，future.result() 为 loader(item) 的结果
+    workers：读取线程数（默认 PREFETCH_WORKERS）；depth：最多提前读取的文件数（默认线程数的2倍）
+    """
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    if workers <= 0:
+        for item in items:
+            yield item, _Deferred(loader, item)
+        return
+    if depth is None:
+        depth = workers * 2
+
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+    try:
+        for item in items:
+            pending.append((item, executor.submit(loader, item)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            item, future = pending.popleft()
+            # 先补上一个新任务再交出当前结果，保持在途任务数为 depth
+            nxt = next(items, _DONE)
+            if nxt is not _DONE:
+                pending.append((nxt, executor.submit(loader, nxt)))
+            yield item, future
+    finally:
+        # 调用方中途退出循环时取消未开始的任务
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
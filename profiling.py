@@ -0,0 +1,151 @@
+import json
+import time
+import cProfile
+from contextlib import contextmanager, nullcontext
+
+# ===================== 分阶段计时与性能剖析 =====================
+# 各脚本用 stage('阶段名', 股票代码) 包住读数、识别、筹码、写文件等步骤：
+#   关闭时（默认）stage 直接返回一个共享的空上下文，只多一次属性判断，可以常驻在生产代码里；
+#   --profile 打开后记录每只股票每个阶段的耗时，并用 cProfile 采集函数级调用数据。
+# 运行结束 finish_profiling 写出：
+#   <前缀>.prof         cProfile 原始数据（python -m pstats / snakeviz 查看）
+#   <前缀>_summary.json 各阶段总耗时、最慢的股票
+#   <前缀>_stocks.csv   每只股票 × 阶段 的耗时明细
+# 阶段可以嵌套（如筹码计算在单股分析之内）：占比按整次运行的墙钟时间计算，
+# 每只股票的总耗时只累加最外层阶段，避免重复计入。
+# 多进程扫描时各进程的阶段耗时相加，占比可能超过100%；cProfile 只覆盖主进程。
+
+DEFAULT_PREFIX = 'profile'
+TOP_N = 20  # 汇总里列出的最慢股票数
+_NULL_STAGE = nullcontext()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.records = []  # (股票代码, 阶段, 秒, 是否嵌套在其他阶段内)
+        self.depth = 0
+        self.profile = None
+        self.started = None
+
+    def stage(self, name, stock=None):
+        """阶段计时的上下文管理器；未启用时几乎没有开销"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed(name, stock)
+
+    @contextmanager
+    def _timed(self, name, stock):
+        nested = self.depth > 0
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.records.append((stock, name, time.perf_counter() - start, nested))
+
+    def drain(self):
+        """取出并清空已记录的耗时（子进程把记录随结果带回主进程）"""
+        records, self.records = self.records, []
+        return records
+
+    def extend(self, records):
+        if self.enabled and records:
+            self.records.extend(records)
+
+
+PROFILER = Profiler()
+stage = PROFILER.stage
+
+
+def add_profile_argument(parser):
+    """给命令行解析器加上 --profile [前缀] 参数"""
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PREFIX, default=None, metavar='前缀',
+                        help=f'记录各阶段耗时并用cProfile剖析，结果写入 <前缀>.prof / _summary.json / _stocks.csv（默认前缀 {DEFAULT_PREFIX}）')
+
+
+def start_profiling(use_cprofile=True):
+    """开启阶段计时（以及cProfile）"""
+    PROFILER.enabled = True
+    PROFILER.records = []
+    PROFILER.started = time.perf_counter()
+    if use_cprofile:
+        PROFILER.profile = cProfile.Profile()
+        PROFILER.profile.enable()
+
+
+def summarize(records, wall_seconds=None, top_n=TOP_N):
+    """按阶段、按股票汇总耗时记录；wall_seconds 为整次运行耗时（用于计算占比）"""
+    stages, stocks, totals = {}, {}, {}
+    for stock, name, seconds, nested in records:
+        s = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'max_stock': None})
+        s['calls'] += 1
+        s['seconds'] += seconds
+        if seconds > s['max_seconds']:
+            s['max_seconds'], s['max_stock'] = seconds, stock
+        if stock is not None:
+            per_stock = stocks.setdefault(stock, {})
+            per_stock[name] = per_stock.get(name, 0.0) + seconds
+            if not nested:
+                totals[stock] = totals.get(stock, 0.0) + seconds
+
+    stage_rows = []
+    for name, s in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        stage_rows.append({
+            'stage': name,
+            'calls': s['calls'],
+            'seconds': round(s['seconds'], 4),
+            'share': round(s['seconds'] / wall_seconds, 4) if wall_seconds else None,
+            'mean_ms': round(s['seconds'] / s['calls'] * 1000, 3),
+            'max_ms': round(s['max_seconds'] * 1000, 3),
+            'max_stock': s['max_stock'],
+        })
+    stock_rows = sorted(({'stock': stock, 'seconds': round(totals.get(stock, 0.0), 4),
+                          'stages': {k: round(v, 4) for k, v in t.items()}}
+                         for stock, t in stocks.items()), key=lambda row: -row['seconds'])
+    summary = {'wall_seconds': round(wall_seconds, 4) if wall_seconds else None, 'stages': stage_rows,
+               'slowest_stocks': stock_rows[:top_n], 'stock_count': len(stock_rows)}
+    return summary, stocks, totals
+
+
+def finish_profiling(prefix=DEFAULT_PREFIX):
+    """停止剖析并写出结果文件，返回写出的路径列表；未启用时什么也不做"""
+    if not PROFILER.enabled:
+        return []
+    paths = []
+    if PROFILER.profile is not None:
+        PROFILER.profile.disable()
+        PROFILER.profile.dump_stats(f'{prefix}.prof')
+        paths.append(f'{prefix}.prof')
+
+    summary, stocks, totals = summarize(PROFILER.records, time.perf_counter() - PROFILER.started)
+    with open(f'{prefix}_summary.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    paths.append(f'{prefix}_summary.json')
+
+    per_stock_stages = {name for t in stocks.values() for name in t}
+    stage_names = [row['stage'] for row in summary['stages'] if row['stage'] in per_stock_stages]
+    with open(f'{prefix}_stocks.csv', 'w', encoding='utf-8-sig') as f:
+        f.write(','.join(['stock', 'total'] + stage_names) + '\n')
+        for stock, t in sorted(stocks.items(), key=lambda item: -totals.get(item[0], 0.0)):
+            f.write(','.join([str(stock), f'{totals.get(stock, 0.0):.6f}'] + [f"{t.get(name, 0.0):.6f}" for name in stage_names]) + '\n')
+    paths.append(f'{prefix}_stocks.csv')
+
+    PROFILER.enabled = False
+    PROFILER.profile = None
+    print_summary(summary)
+    return paths
+
+
+def print_summary(summary, limit=10):
+    """在终端打印阶段耗时表和最慢的几只股票"""
+    print(f"\n总耗时 {summary['wall_seconds']:.3f}s")
+    print(f"{'阶段':<36}{'次数':>8}{'耗时(s)':>10}{'占比':>8}{'平均(ms)':>10}{'最慢(ms)':>10}")
+    for row in summary['stages']:
+        share = f"{row['share'] * 100:.1f}%" if row['share'] is not None else '-'
+        print(f"{row['stage']:<36}{row['calls']:>8}{row['seconds']:>10.3f}{share:>8}{row['mean_ms']:>10.2f}{row['max_ms']:>10.2f}")
+    if summary['slowest_stocks']:
+        print("\n最慢的股票：")
+        for row in summary['slowest_stocks'][:limit]:
+            print(f"  {row['stock']}: {row['seconds']:.3f}s")
@@ -0,0 +1,125 @@
+import os
+import importlib.util
+import pandas as pd
+
+# parquet / feather 需要 pyarrow；只检查是否安装，真正的导入推迟到 pandas 读写时
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# ===================== 结果表输出（可插拔格式） =====================
+# 各扫描脚本的结果表统一经 write_results 写出，格式按运行参数选择：
+#   parquet / feather：列式二进制，写入和读回都远快于xlsx，供下游脚本读取（需安装 pyarrow）
+#   csv：无额外依赖的文本格式（utf-8-sig，Excel可直接打开）
+#   xlsx：给人看的导出，openpyxl 写入最慢，作为可选步骤
+# 同一结果的各种格式只有扩展名不同；read_results 按 快→慢 的顺序读取已存在的那一个。
+
+DEFAULT_FORMATS = ['xlsx']
+READ_PREFERENCE = ['parquet', 'feather', 'csv', 'xlsx']
+SAME_RUN_SECONDS = 60  # 修改时间相差在此范围内的结果文件视为同一次运行写出
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+
+def _write_feather(df, path):
+    df.reset_index(drop=True).to_feather(path)
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def _write_xlsx(df, path):
+    df.to_excel(path, index=False, engine='openpyxl')
+
+
+# 格式 → (扩展名, 写入函数, 是否需要pyarrow)
+SINKS = {
+    'parquet': ('.parquet', _write_parquet, True),
+    'feather': ('.feather', _write_feather, True),
+    'csv': ('.csv', _write_csv, False),
+    'xlsx': ('.xlsx', _write_xlsx, False),
+}
+
+
+def parse_formats(value):
+    """解析 --output-format 参数（逗号分隔，可重复给出），返回去重后的格式列表"""
+    if not value:
+        return list(DEFAULT_FORMATS)
+    if isinstance(value, str):
+        value = [value]
+    formats = []
+    for item in value:
+        for fmt in item.split(','):
+            fmt = fmt.strip().lower()
+            if not fmt:
+                continue
+            if fmt not in SINKS:
+                raise ValueError(f"不支持的输出格式：{fmt}（可选：{', '.join(SINKS)}）")
+            if SINKS[fmt][2] and not HAS_PYARROW:
+                raise ValueError(f"输出格式 {fmt} 需要安装 pyarrow")
+            if fmt not in formats:
+                formats.append(fmt)
+    return formats or list(DEFAULT_FORMATS)
+
+
+def add_output_format_argument(parser):
+    """给命令行解析器加上 --output-format 参数"""
+    parser.add_argument('--output-format', action='append', default=None,
+                        help=f"结果输出格式，逗号分隔或重复给出（{'/'.join(SINKS)}，默认 {','.join(DEFAULT_FORMATS)}）")
+
+
+def result_path(base_path, fmt):
+    """把结果路径的扩展名换成指定格式的扩展名"""
+    return os.path.splitext(base_path)[0] + SINKS[fmt][0]
+
+
+def write_results(df, base_path, formats=None):
+    """
+    按给定格式写出结果表
+    base_path：结果文件路径（扩展名会按格式替换）
+    返回：写出的文件路径列表
+    """
+    paths = []
+    for fmt in parse_formats(formats):
+        path = result_path(base_path, fmt)
+        SINKS[fmt][1](df, path)
+        paths.append(path)
+    return paths
+
+
+def find_results(base_path):
+    """
+    返回已存在的结果文件 (路径, 格式)；都不存在时返回 (None, None)
+    只在最近一次运行写出的文件中（与最新文件的修改时间相差 SAME_RUN_SECONDS 以内）按 READ_PREFERENCE 选取，
+    避免之前运行留下的旧 parquet 盖过新的 xlsx
+    """
+    candidates = []
+    for fmt in READ_PREFERENCE:
+        if SINKS[fmt][2] and not HAS_PYARROW:
+            continue
+        path = result_path(base_path, fmt)
+        if os.path.exists(path):
+            candidates.append((path, fmt, os.path.getmtime(path)))
+    if not candidates:
+        return None, None
+    newest = max(mtime for _, _, mtime in candidates)
+    for path, fmt, mtime in candidates:
+        if mtime >= newest - SAME_RUN_SECONDS:
+            return path, fmt
+
+
+def read_results(base_path, dtype=None):
+    """
+    读取结果表，优先使用列式格式
+    dtype：{列名: 类型}，读回后统一转换（csv/xlsx 会把 000001 之类的代码读成数字，需指定为 str）
+    """
+    path, fmt = find_results(base_path)
+    if path is None:
+        raise FileNotFoundError(f"未找到结果文件：{os.path.splitext(base_path)[0]}.{{{','.join(READ_PREFERENCE)}}}")
+    if fmt == 'csv':
+        return pd.read_csv(path, encoding='utf-8-sig', dtype=dtype)
+    if fmt == 'xlsx':
+        return pd.read_excel(path, dtype=dtype)
+    df = pd.read_parquet(path) if fmt == 'parquet' else pd.read_feather(path)
+    return df.astype(dtype) if dtype else df
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# ===================== 滚动通道回归（闭式解） =====================
+# 通道判定 = 收盘价对 K线序号 做一元线性回归：斜率定方向，残差标准差 / 均价 衡量通道宽度。
+# 原先每次只对一个窗口调用 np.polyfit；这里用 x、y、x·y、y² 的累加和，
+# 一次求出每根K线往前 window 根（窗口内 x 取 0..window-1）的斜率、截距和残差标准差，O(n)。
+# 沿第0轴计算，y 可以是单只股票的一维数组，也可以是 market_panel.to_bar_axis 的 T×S 数组（逐列独立）；
+# 窗口内有缺失值时结果为NaN。每列先减去首个有效值再累加，斜率和残差不变，长历史上的累加误差更小。
+
+CHANNEL_WINDOW = 30       # 通道判定的默认窗口（根K线）
+CHANNEL_MAX_STD_RATIO = 0.1  # 残差标准差 / 均价 低于此值才算通道
+
+
+def rolling_channel(y, window):
+    """
+    每根K线往前 window 根的线性回归
+    返回：dict（slope 斜率, intercept 截距（窗口第一根处）, resid_std 残差标准差（ddof=0，同 np.std）, mean 均价），
+          形状与 y 相同，前 window-1 行为NaN
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[0]
+    out = {key: np.full(y.shape, np.nan) for key in ('slope', 'intercept', 'resid_std', 'mean')}
+    if n < window or window < 2:
+        return out
+
+    valid = ~np.isnan(y)
+    first = np.argmax(valid, axis=0)
+    offset = np.take_along_axis(y, np.expand_dims(first, 0), axis=0) if y.ndim > 1 else y[first]
+    offset = np.where(np.isnan(offset), 0.0, offset)
+    yc = np.where(valid, y - offset, 0.0)
+    idx = np.arange(n, dtype=np.float64).reshape((n,) + (1,) * (y.ndim - 1))
+
+    zeros = np.zeros((1,) + y.shape[1:])
+
+    def window_sum(values):
+        cum = np.concatenate([zeros, np.cumsum(values, axis=0)])
+        return cum[window:] - cum[:-window]
+
+    count = window_sum(valid.astype(np.float64))
+    sy = window_sum(yc)
+    syy = window_sum(yc * yc)
+    # 窗口内 x = i - start：Σx·y = Σi·y - start·Σy
+    start = idx[:n - window + 1]
+    sxy = window_sum(idx * yc) - start * sy
+
+    sx = window * (window - 1) / 2
+    sxx = (window - 1) * window * (2 * window - 1) / 6
+    var_x = sxx - sx * sx / window
+    slope = (sxy - sx * sy / window) / var_x
+    intercept = (sy - slope * sx) / window
+    ssr = np.maximum(syy - sy * sy / window - slope * slope * var_x, 0.0)
+
+    full = count == window
+    tail = slice(window - 1, None)
+    out['slope'][tail] = np.where(full, slope, np.nan)
+    out['intercept'][tail] = np.where(full, intercept + offset, np.nan)
+    out['resid_std'][tail] = np.where(full, np.sqrt(ssr / window), np.nan)
+    out['mean'][tail] = np.where(full, sy / window + offset, np.nan)
+    return out
+
+
+def fit_channel(y):
+    """对整段 y 做一次回归，返回 (斜率, 截距, 残差标准差, 均价)；y 含缺失值时均为NaN"""
+    fit = rolling_channel(y, len(y))
+    return fit['slope'][-1], fit['intercept'][-1], fit['resid_std'][-1], fit['mean'][-1]
+
+
+def channel_mask(fit, direction='rising', max_std_ratio=CHANNEL_MAX_STD_RATIO):
+    """按 rolling_channel 的结果判定每个窗口是否为上升（rising）/ 下降（falling）通道"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trend = fit['slope'] > 0 if direction == 'rising' else fit['slope'] < 0
+        return trend & (fit['resid_std'] / fit['mean'] < max_std_ratio)
+
+
+def channel_entries(df, window=CHANNEL_WINDOW, direction='rising', max_std_ratio=CHANNEL_MAX_STD_RATIO):
+    """
+    单只股票全历史的通道进入点：前一根K线的窗口不是通道、这一根是
+    返回：DataFrame（date, close, slope, intercept, resid_std, std_ratio）
+    """
+    fit = rolling_channel(df['close'].to_numpy(), window)
+    mask = channel_mask(fit, direction, max_std_ratio)
+    entry = mask & ~np.concatenate([[False], mask[:-1]])
+    rows = np.flatnonzero(entry)
+    return pd.DataFrame({
+        'date': df['date'].to_numpy()[rows],
+        'close': df['close'].to_numpy()[rows],
+        'slope': fit['slope'][rows],
+        'intercept': fit['intercept'][rows],
+        'resid_std': fit['resid_std'][rows],
+        'std_ratio': fit['resid_std'][rows] / fit['mean'][rows],
+    })
@@ -0,0 +1,51 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from tdx_cache import CACHE_DIR_NAME
+
+# ===================== 增量扫描状态 =====================
+# 每个扫描脚本一份状态文件：<数据目录>/.tdx_cache/scan_state_<脚本名>.json
+# 内容为 {股票代码: {"last_date": "YYYY-MM-DD", "bars": 上次扫描时的K线数}}
+# 增量模式下只评估需要用到新K线的窗口，只输出新确认的信号。
+
+
+def state_path(data_dir, scanner):
+    return os.path.join(data_dir, CACHE_DIR_NAME, f'scan_state_{scanner}.json')
+
+
+def load_scan_state(data_dir, scanner):
+    """读取扫描状态，不存在或损坏时返回空dict（即全量扫描）"""
+    try:
+        with open(state_path(data_dir, scanner), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_scan_state(data_dir, scanner, state):
+    """原子写入扫描状态"""
+    path = state_path(data_dir, scanner)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def first_new_index(df, last_date):
+    """
+    返回第一根晚于 last_date 的K线位置（上次扫描后新增K线的起点）
+    last_date 为空时返回0，即全部K线都视为新K线
+    """
+    if not last_date:
+        return 0
+    dates = df['date'].to_numpy()
+    return int(np.searchsorted(dates, np.datetime64(pd.Timestamp(last_date)), side='right'))
+
+
+def stock_state(df):
+    """本次扫描完成后应记录的状态"""
+    if len(df) == 0:
+        return None
+    return {'last_date': df['date'].iloc[-1].strftime('%Y-%m-%d'), 'bars': len(df)}
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from tdx_loader import read_tdx_bars, read_tdx_tail, tail_start_index
+from frame_cache import FRAME_CACHE
+
+# ===================== 日线二进制列式缓存 =====================
+# 每只股票一个缓存条目：<数据目录>/.tdx_cache/<代码>.bars + <代码>.json
+# .bars 为按列连续存放的原始数组（日期int32 / 价格float32 / 成交量int64），通过内存映射读取；
+# .json 记录源文件的 mtime/size，源文件变动后自动失效并重新解析。
+# 设置环境变量 TDX_CACHE=0 可关闭缓存。
+
+CACHE_DIR_NAME = '.tdx_cache'
+CACHE_VERSION = 1
+CACHE_ENABLED = os.environ.get('TDX_CACHE', '1') != '0'
+
+# 列名 → 存储类型（日期存为自1970-01-01起的天数）
+BAR_COLUMNS = [
+    ('date', np.int32),
+    ('open', np.float32),
+    ('high', np.float32),
+    ('low', np.float32),
+    ('close', np.float32),
+    ('volume', np.int64),
+]
+PRICE_DECIMALS = 3  # float32 读回时按3位小数还原，避免 16.87 → 16.8700008 之类的尾差
+
+
+def cache_paths(file_path):
+    """返回 (数据文件路径, 元信息路径)"""
+    data_dir, file_name = os.path.split(os.path.abspath(file_path))
+    stock_code = os.path.splitext(file_name)[0]
+    cache_dir = os.path.join(data_dir, CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f'{stock_code}.bars'), os.path.join(cache_dir, f'{stock_code}.json')
+
+
+def _source_signature(file_path):
+    st = os.stat(file_path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'version': CACHE_VERSION}
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_cached_arrays(file_path, signature=None):
+    """
+    以内存映射方式读取缓存的列数组
+    返回：{列名: ndarray(只读)} 及元信息；缓存缺失或已失效时返回 (None, None)
+    """
+    bars_path, meta_path = cache_paths(file_path)
+    meta = _read_meta(meta_path)
+    if meta is None:
+        return None, None
+    if signature is None:
+        signature = _source_signature(file_path)
+    if any(meta.get(k) != v for k, v in signature.items()):
+        return None, None
+
+    n_rows = meta['rows']
+    if n_rows == 0:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in BAR_COLUMNS}, meta
+    try:
+        mm = np.memmap(bars_path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError):
+        return None, None
+
+    arrays = {}
+    offset = 0
+    for name, dtype in BAR_COLUMNS:
+        nbytes = n_rows * np.dtype(dtype).itemsize
+        arrays[name] = mm[offset:offset + nbytes].view(dtype)
+        offset += nbytes
+    return arrays, meta
+
+
+def write_cache(file_path, df, signature=None):
+    """把已解析的日线写入缓存（成交量含小数/缺失值，或价格无法用float32无损还原时不缓存）"""
+    if signature is None:
+        signature = _source_signature(file_path)
+    if 'volume' not in df.columns:
+        return False
+    volume = df['volume'].to_numpy()
+    if volume.dtype.kind not in 'iu':
+        return False
+
+    prices = {}
+    for name in ('open', 'high', 'low', 'close'):
+        if name in df.columns:
+            original = df[name].to_numpy(dtype=np.float64)
+            values = original.astype(np.float32)
+            if not np.array_equal(np.round(values.astype(np.float64), PRICE_DECIMALS), original, equal_nan=True):
+                return False
+        else:
+            values = np.full(len(df), np.nan, dtype=np.float32)
+        prices[name] = values
+
+    bars_path, meta_path = cache_paths(file_path)
+    os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+
+    days = df['date'].to_numpy().astype('datetime64[D]').astype(np.int32)
+    columns = [c for c in ('open', 'high', 'low', 'close') if c in df.columns]
+    tmp_path = f'{bars_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(days.tobytes())
+        for name in ('open', 'high', 'low', 'close'):
+            f.write(prices[name].tobytes())
+        f.write(volume.astype(np.int64).tobytes())
+    os.replace(tmp_path, bars_path)
+
+    # 元信息最后写入：它的存在即代表缓存完整可用
+    meta = dict(signature, rows=len(df), columns=['date'] + columns + ['volume'])
+    tmp_meta = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+    return True
+
+
+def arrays_to_frame(arrays, columns=None):
+    """把缓存列数组还原为与 read_tdx_bars 一致的DataFrame"""
+    data = {'date': pd.DatetimeIndex(arrays['date'].astype('datetime64[D]').astype('datetime64[ns]'))}
+    for name in ('open', 'high', 'low', 'close'):
+        if columns is None or name in columns:
+            data[name] = np.round(arrays[name].astype(np.float64), PRICE_DECIMALS)
+    data['volume'] = np.array(arrays['volume'])
+    return pd.DataFrame(data)
+
+
+def _check_required_cols(columns, required_cols):
+    if required_cols is None:
+        required_cols = ['date', 'high', 'low', 'close', 'volume']
+    missing_cols = [col for col in required_cols if col not in columns]
+    if missing_cols:
+        raise ValueError(f"数据缺少必要字段：{missing_cols}，请检查CSV格式")
+
+
+def load_cached_bars(file_path, required_cols=None):
+    """
+    读取日线数据：本进程已读过且文件未变时直接返回内存中的结果（见 frame_cache），
+    否则磁盘缓存命中时内存映射读取，都未命中时解析源文件并回写缓存
+    返回字段与 tdx_loader.read_tdx_bars 一致（不含成交额）
+    """
+    signature = _source_signature(file_path)
+    frame_signature = (signature['mtime_ns'], signature['size'])
+    df = FRAME_CACHE.get(file_path, frame_signature)
+    if df is not None:
+        _check_required_cols(df.columns, required_cols)
+        return df
+
+    df = _load_bars(file_path, required_cols, signature)
+    FRAME_CACHE.put(file_path, df, frame_signature)
+    return df
+
+
+def _load_bars(file_path, required_cols, signature):
+    """磁盘缓存 → 源文件解析"""
+    if not CACHE_ENABLED:
+        return read_tdx_bars(file_path, required_cols).drop(columns=['amount'], errors='ignore')
+
+    arrays, meta = read_cached_arrays(file_path, signature)
+    if arrays is not None:
+        _check_required_cols(meta['columns'], required_cols)
+        return arrays_to_frame(arrays, meta['columns'])
+
+    df = read_tdx_bars(file_path, required_cols)
+    try:
+        write_cache(file_path, df, signature)
+    except OSError:
+        pass  # 数据目录只读等情况下退化为直接解析
+    return df.drop(columns=['amount'], errors='ignore')
+
+
+def load_tail_bars(file_path, bars=None, months=None, start_date=None, lookback=0, required_cols=None):
+    """
+    只读取最近一段K线（区间参数见 tdx_loader.tail_start_index）
+    内存/磁盘缓存命中时直接截取末尾（内存映射只触及末尾的页），否则从源文件末尾向前读取；
+    截取的结果不放入缓存
+    """
+    signature = _source_signature(file_path)
+    df = FRAME_CACHE.get(file_path, (signature['mtime_ns'], signature['size']))
+    if df is not None:
+        _check_required_cols(df.columns, required_cols)
+        start = tail_start_index(df['date'].to_numpy(), bars, months, start_date, lookback)
+        return df.iloc[start:].reset_index(drop=True)
+
+    if CACHE_ENABLED:
+        arrays, meta = read_cached_arrays(file_path, signature)
+        if arrays is not None:
+            _check_required_cols(meta['columns'], required_cols)
+            start = tail_start_index(arrays['date'].astype('datetime64[D]'), bars, months, start_date, lookback)
+            return arrays_to_frame({name: values[start:] for name, values in arrays.items()}, meta['columns'])
+
+    df = read_tdx_tail(file_path, bars, months, start_date, lookback, required_cols)
+    return df.drop(columns=['amount'], errors='ignore')
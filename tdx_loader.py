@@ -0,0 +1,197 @@
+import io
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# ===================== 通达信日线导出文件读取（公共模块） =====================
+# 一次读取原始字节，在同一份缓冲区上完成编码/分隔符/表头探测，然后只解析一次。
+# 各脚本的 load_and_clean_data 均基于本模块，再做各自的日期筛选和指标计算。
+
+ENCODINGS = ['utf-8-sig', 'gbk', 'gb18030']  # utf-8-sig 同时兼容带/不带BOM的UTF-8
+SEPARATORS = ['\t', ',']  # 优先尝试制表符
+DATE_PATTERN = re.compile(r'^\d{4}[/\-]\d{2}[/\-]\d{2}$')
+
+# 标准化字段名（兼容中英文）
+COL_MAPPING = {
+    '日期': 'date', 'Date': 'date',
+    '开盘': 'open', 'Open': 'open',
+    '最高': 'high', 'High': 'high',
+    '最低': 'low', 'Low': 'low',
+    '收盘': 'close', 'Close': 'close',
+    '成交量': 'volume', 'Volume': 'volume',
+    '成交额': 'amount', 'Amount': 'amount'
+}
+PRICE_COLS = ['open', 'high', 'low', 'close']
+
+
+def decode_bytes(raw):
+    """按候选编码依次解码原始字节，返回 (文本, 编码)"""
+    last_error = None
+    for encoding in ENCODINGS:
+        try:
+            return raw.decode(encoding), encoding
+        except UnicodeDecodeError as e:
+            last_error = e
+    raise ValueError(f"无法识别文件编码。尝试了以下编码：{ENCODINGS}。最后错误：{last_error}")
+
+
+def _first_field(line, sep):
+    return line.split(sep, 1)[0].strip()
+
+
+def sniff_layout(text):
+    """
+    探测分隔符与表头位置
+    返回：(分隔符, 需要跳过的行数)
+    通达信导出首行为「代码 名称 日线 前复权」之类的股票信息，第二行才是表头
+    """
+    lines = [line for line in text.splitlines()[:3] if line.strip() and not line.lstrip().startswith('#')]
+    if not lines:
+        raise ValueError("文件为空")
+
+    skip_rows = 0
+    # 第二行第一列不是日期，说明第一行是股票信息，需要跳过
+    if len(lines) >= 2:
+        second = lines[1]
+        sep_guess = '\t' if '\t' in second else ','
+        if not DATE_PATTERN.match(_first_field(second, sep_guess)):
+            skip_rows = 1
+
+    header = lines[skip_rows] if skip_rows < len(lines) else lines[0]
+    sep = next((s for s in SEPARATORS if s in header), SEPARATORS[0])
+    return sep, skip_rows
+
+
+def _strip_footer(text, sep):
+    """去掉末尾「数据来源:通达信」之类的非数据行，避免整列被解析成字符串"""
+    body = text.rstrip()
+    cut = body.rfind('\n')
+    if cut >= 0 and not DATE_PATTERN.match(_first_field(body[cut + 1:], sep)):
+        return body[:cut]
+    return body
+
+
+def parse_bars(text, sep, skip_rows, required_cols=None):
+    """在已解码的文本上解析日线数据并标准化字段名与类型"""
+    text = _strip_footer(text, sep)
+    df = pd.read_csv(io.StringIO(text), comment='#', sep=sep, skiprows=skip_rows)
+
+    # 清理列名：去除前后空格
+    df.columns = df.columns.str.strip()
+    df.rename(columns=COL_MAPPING, inplace=True)
+
+    # 必要字段检查
+    if required_cols is None:
+        required_cols = ['date', 'high', 'low', 'close', 'volume']
+    missing_cols = [col for col in required_cols if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"数据缺少必要字段：{missing_cols}，请检查CSV格式")
+
+    # 日期格式转换（无法解析的行直接丢弃）& 排序
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+    df['date'] = df['date'].astype('datetime64[ns]')
+    for col in PRICE_COLS:
+        if col in df.columns and df[col].dtype != 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    if 'volume' in df.columns and df['volume'].dtype == 'object':
+        df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date')
+    return df.reset_index(drop=True)
+
+
+def read_tdx_bars(file_path, required_cols=None):
+    """
+    读取通达信日线导出文件（单次读取 + 单次解析）
+    返回：字段已标准化为 date/open/high/low/close/volume(/amount) 的DataFrame
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    text, _ = decode_bytes(raw)
+    sep, skip_rows = sniff_layout(text)
+    return parse_bars(text, sep, skip_rows, required_cols)
+
+
+# ===================== 只读取文件末尾 =====================
+# 通达信导出按日期升序排列，只需要最近一段K线时从文件末尾向前按块读取，
+# 读够「所需区间 + 回看根数」就停下，只解析这些行；短周期扫描每只股票只读几KB。
+# 回看根数（lookback）保证区间开头的滚动指标（如5日均量）有足够的历史数据。
+
+HEAD_BYTES = 4096       # 探测编码/分隔符/表头读取的文件开头字节数
+TAIL_BLOCK_SIZE = 16384  # 从末尾向前读取的首个块大小，不够时逐次翻倍
+
+
+def tail_start_index(dates, bars=None, months=None, start_date=None, lookback=0):
+    """
+    在升序日期数组上计算末尾区间的起始下标
+    bars：最近N根K线；months：最后一根K线往前N个月（含当天）；start_date：指定起始日期
+    同时给出时取范围更大的一个，再向前多留 lookback 根
+    """
+    n = len(dates)
+    if n == 0:
+        return 0
+    starts = []
+    if bars is not None:
+        starts.append(max(n - bars, 0))
+    if months is not None:
+        starts.append(_search_date(dates, pd.Timestamp(dates[-1]) - pd.DateOffset(months=months)))
+    if start_date is not None:
+        starts.append(_search_date(dates, start_date))
+    if not starts:
+        return 0
+    return max(min(starts) - lookback, 0)
+
+
+def _search_date(dates, date):
+    return int(np.searchsorted(dates, np.datetime64(pd.Timestamp(date).date()), side='left'))
+
+
+def _line_dates(lines, sep):
+    """数据行首列日期 → datetime64[D] 数组（行已按 DATE_PATTERN 过滤）"""
+    return np.array([_first_field(line, sep).replace('/', '-') for line in lines], dtype='datetime64[D]')
+
+
+def read_tdx_tail(file_path, bars=None, months=None, start_date=None, lookback=0, required_cols=None):
+    """
+    只读取文件末尾的K线（区间参数见 tail_start_index）
+    返回与 read_tdx_bars 相同格式的DataFrame；区间覆盖到文件开头时退化为整文件读取
+    """
+    if bars is None and months is None and start_date is None:
+        df = read_tdx_bars(file_path, required_cols)
+        return df.iloc[tail_start_index(df['date'].to_numpy(), lookback=lookback):].reset_index(drop=True)
+
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        f.seek(0)
+        head_text, encoding = decode_bytes(f.read(min(HEAD_BYTES, file_size)))
+        sep, skip_rows = sniff_layout(head_text)
+        head_lines = [line for line in head_text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+        header = head_lines[skip_rows]
+
+        block = TAIL_BLOCK_SIZE
+        while block < file_size:
+            f.seek(file_size - block)
+            raw = f.read(block)
+            # 块的开头通常落在某一行中间，丢弃到第一个换行为止（换行字节不会出现在多字节字符内部）
+            try:
+                text = raw[raw.index(b'\n') + 1:].decode(encoding)
+            except (ValueError, UnicodeDecodeError):
+                break
+            lines = [line for line in text.splitlines() if DATE_PATTERN.match(_first_field(line, sep))]
+            try:
+                dates = _line_dates(lines, sep)
+            except ValueError:
+                break
+            start = tail_start_index(dates, bars, months, start_date, lookback)
+            # start > 0 说明所需区间之前还有已读到的行，区间完整落在这个块里
+            if start > 0:
+                return parse_bars(header + '\n' + '\n'.join(lines[start:]), sep, 0, required_cols)
+            block *= 2
+
+    df = read_tdx_bars(file_path, required_cols)
+    start = tail_start_index(df['date'].to_numpy(), bars, months, start_date, lookback)
+    return df.iloc[start:].reset_index(drop=True)
@@ -0,0 +1,75 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# 在导入扫描脚本（会导入pyplot）之前切换到无界面后端
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+import longN
+from feature_store import rolling_mean
+from synthetic_market import generate_bars, trading_days
+
+# ===================== longN 增量扫描与全量扫描一致性 =====================
+# 模拟「上次全量扫描到第 cut 根K线，本次追加了新K线后增量扫描」：
+# 两次输出合起来（按 股票+confirm_date 去重，与 longN 主流程一致）应覆盖本次全量扫描的全部形态，
+# 且增量输出的每个形态都出现在全量扫描中。
+
+
+def _synthetic_df(seed, years=5):
+    rng = np.random.default_rng([seed, 0])
+    dates = trading_days(pd.Timestamp('2025-06-30'), years)
+    bars = generate_bars(rng, len(dates), consolidation_prob=0.3)
+    df = pd.DataFrame({
+        'date': dates,
+        'high': np.round(bars[:, 1], 2),
+        'low': np.round(bars[:, 2], 2),
+        'close': np.round(bars[:, 3], 2),
+        'volume': np.round(bars[:, 4]),
+    })
+    df['ma5_volume'] = rolling_mean(df['volume'].to_numpy(), 5)
+    return df
+
+
+def _scan(df, new_from_idx=0):
+    consolidation_df = longN.identify_bottom_consolidation(df)
+    breakout_df = longN.identify_consolidation_n_breakout(df, consolidation_df, new_from_idx)
+    if breakout_df.empty:
+        return set()
+    return set(breakout_df['confirm_date'])
+
+
+# (seed, cut)：追加K线后新成立或被合并延长的横盘区间上，突破验证期在 cut 之前就已结束的情形
+ZONE_CHANGED_CASES = [(1, 625), (6, 481), (26, 997), (27, 1273), (33, 775), (35, 1300)]
+
+
+def _assert_adds_up(df, cut, end):
+    current = df.iloc[:end]
+    expected = _scan(current)
+    previous = _scan(df.iloc[:cut])
+    incremental = _scan(current, cut)
+    assert incremental <= expected, f'cut={cut} end={end}'
+    assert expected <= previous | incremental, f'cut={cut} end={end} 漏报 {sorted(expected - previous - incremental)}'
+
+
+@pytest.mark.parametrize('seed,cut', ZONE_CHANGED_CASES)
+def test_incremental_covers_changed_zones(seed, cut):
+    df = _synthetic_df(seed)
+    # 截断点附近逐根覆盖，新增1根到一个月
+    for c in range(cut - 12, cut + 1, 3):
+        for added in (1, 5, 10, 22):
+            _assert_adds_up(df, c, min(c + added, len(df)))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_incremental_matches_full_scan(seed):
+    df = _synthetic_df(seed)
+    assert _scan(df), '合成数据应至少识别到一个形态'
+    for cut in range(400, len(df), 37):
+        for added in (1, 10, 22):
+            _assert_adds_up(df, cut, min(cut + added, len(df)))